@@ -1,5 +1,7 @@
 import abc
+import contextlib
 import json
+import mmap
 import multiprocessing
 import os
 import socket
@@ -8,14 +10,24 @@ import sys
 import threading
 import time
 from ._WinBot import WinBotMain
-from ast import literal_eval
 from datetime import datetime
-from typing import Optional, Dict, List, Tuple, Union
+from typing import Any, Optional, Dict, List, Tuple, Union, BinaryIO, Iterable, NamedTuple
 
 from loguru import logger
 
-# from ._multiprocess import multiprocess
-
+from ._multiprocess import close_connections, multiprocess, stop_on_signals
+from ._registry import device_registry
+from ._logging import PAYLOAD_LIMIT, configure_bot_logging, payload, session_logger
+from ._metrics import metrics_registry
+from ._profiler import SamplingProfiler, start_profiling, stop_profiling
+from ._recording import FLAG_REQUEST_TRUNCATED, SessionRecorder
+from ._trace import Tracer, sleep as _traced_sleep
+from ._frame import Frame, FrameCache, decode_image
+from ._ocr import OcrCache, OcrData, OcrResult, parse_ocr
+from ._ocr_backend import OcrBackend
+from ._conditions import Element, Text, WaitResult, _Condition, as_conditions, check_frame, needs_frame
+from ._wait import Notifier, deadline, Waiter
+from ._codec import encode_request, encode_request_prefix, stream_size, FrameReader, FILE_CHUNK_SIZE, _Progress
 from ._utils import _protect, _Region, _Algorithm, _SubColors
 
 spawn = multiprocessing.get_context("spawn")
@@ -45,12 +57,20 @@ Log_Format = "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | " \
              "<level>{level: <8}</level> | " \
              "{process.id} - {thread.id: <8} | " \
              "<cyan>{module}:{line}</cyan> | " \
+             "<magenta>{extra[session]}</magenta> | " \
              "<level>{message}</level>"  # 日志内容
 
-_AndroidId = ''
 _AndroidIds = ''
 _WindowsBot = ''
 
+# 会改变屏幕内容的命令，执行后截图缓存失效
+_SCREEN_COMMANDS = frozenset((
+    "click", "doubleClick", "longClick", "swipe", "dispatchGesture", "dispatchGestures", "press", "move", "release",
+    "sendKeys", "sendVk", "back", "home", "recents", "powerDialog", "clickElement", "setElementText",
+    "scrollElement", "startApp", "startActivity", "openUri", "callPhone", "sendMsg", "showToast",
+    "createTextView", "createEditText", "createCheckBox", "createWebView", "clearScriptControl",
+))
+
 class Point:
     def __init__(self, x: float, y: float, driver: "AndroidBotMain"):
         self.x = x
@@ -130,6 +150,317 @@ class Point2s:
 
 _Point_Tuple = Union[Point, Tuple[float, float]]
 
+
+def _sub_colors_text(sub_colors: _SubColors) -> str:
+    """
+    将辅助颜色转换为协议格式，``offset_x/offset_y/color`` 每行一个
+
+    :param sub_colors: 辅助定位的其他颜色
+    :return:
+    """
+    if not sub_colors:
+        return "null"
+    return "\n".join([f"{offset_x}/{offset_y}/{color_str}" for offset_x, offset_y, color_str in sub_colors])
+
+
+def _algorithm_args(algorithm: _Algorithm) -> Tuple[int, int, int]:
+    """
+    处理图片所用算法的参数，自适应阈值算法固定使用 127 和 255
+
+    :param algorithm: (algorithm_type, threshold, max_val)
+    :return:
+    """
+    if not algorithm:
+        return 0, 0, 0
+    algorithm_type, threshold, max_val = algorithm
+    if algorithm_type in (5, 6):
+        threshold = 127
+        max_val = 255
+    return algorithm_type, threshold, max_val
+
+
+def _parse_point(response: str, driver) -> Optional[Point]:
+    """
+    解析 ``x|y`` 格式的坐标，失败返回 None
+
+    :param response: 响应文本
+    :param driver: 坐标绑定的驱动
+    :return:
+    """
+    if response in ("-1.0|-1.0", "-1|-1"):
+        return None
+    x, y = response.split("|")
+    return Point(x=float(x), y=float(y), driver=driver)
+
+
+def _parse_points(response: str, driver) -> List[Point]:
+    """
+    解析 ``x|y/x|y`` 格式的多个坐标，失败返回空列表
+
+    :param response: 响应文本
+    :param driver: 坐标绑定的驱动
+    :return:
+    """
+    if response in ("-1.0|-1.0", "-1|-1"):
+        return []
+    point_list = []
+    for point_str in response.split("/"):
+        x, y = point_str.split("|")
+        point_list.append(Point(x=float(x), y=float(y), driver=driver))
+    return point_list
+
+
+def _parse_rect(response: str, driver) -> Optional[Point2s]:
+    """
+    解析 ``x1|y1|x2|y2`` 格式的矩形，失败返回 None
+
+    :param response: 响应文本
+    :param driver: 坐标绑定的驱动
+    :return:
+    """
+    if response == "-1|-1|-1|-1":
+        return None
+    start_x, start_y, end_x, end_y = response.split("|")
+    return Point2s(p1=Point(x=float(start_x), y=float(start_y), driver=driver),
+                   p2=Point(x=float(end_x), y=float(end_y), driver=driver))
+
+
+def _parse_bool(response: str) -> bool:
+    return response == "true"
+
+
+def _parse_optional(response: str) -> Optional[str]:
+    if response == "null":
+        return None
+    return response
+
+
+def _open_binary(path_or_file: Union[str, BinaryIO], mode: str):
+    """路径则打开文件，文件对象则原样使用且不关闭"""
+    if isinstance(path_or_file, (str, os.PathLike)):
+        return open(path_or_file, mode)
+    return contextlib.nullcontext(path_or_file)
+
+
+class PushResult(NamedTuple):
+    """
+    broadcast_push 单台设备的推送结果
+
+    :param device: 设备对应的脚本实例
+    :param success: 是否推送成功
+    :param elapsed: 耗时(秒)
+    :param error: 推送异常，成功时为 None
+    """
+    device: "AndroidBotMain"
+    success: bool
+    elapsed: float
+    error: Optional[Exception] = None
+
+
+class BatchResult:
+    """
+    批量命令的结果，批量命令发送并读取响应后才可获取
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.__done = False
+        self.__value = None
+
+    def _resolve(self, value) -> None:
+        self.__value = value
+        self.__done = True
+
+    def done(self) -> bool:
+        return self.__done
+
+    def result(self):
+        """
+        获取命令结果
+
+        :return: 与对应的同步方法返回值相同
+        """
+        if not self.__done:
+            raise RuntimeError(f"`{self.name}` 尚未执行，请先调用 flush() 或退出 with 语句")
+        return self.__value
+
+    def __repr__(self):
+        if self.__done:
+            return f"BatchResult({self.name}={self.__value!r})"
+        return f"BatchResult({self.name}=<pending>)"
+
+
+class AndroidBatch:
+    """
+    批量发送命令，减少网络往返次数
+
+    队列中的命令在 flush 时通过一次 sendall 发送，再按顺序读取所有响应，解析为与同步方法相同的返回值。
+    批量中的命令只执行一次，不会轮询等待。
+
+    >>> with self.batch() as batch:
+    ...     color = batch.get_color((100, 100))
+    ...     exists = batch.element_exists("com.aibot.client/android.widget.Button@text=确定")
+    >>> color.result(), exists.result()
+    """
+
+    def __init__(self, driver: "AndroidBotMain"):
+        self._driver = driver
+        self._commands = []
+
+    def __len__(self):
+        return len(self._commands)
+
+    def __enter__(self) -> "AndroidBatch":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._commands.clear()
+
+    def _queue(self, parser, *args) -> BatchResult:
+        result = BatchResult(str(args[0]))
+        self._commands.append((args, parser, result))
+        return result
+
+    def flush(self) -> list:
+        """
+        发送队列中的所有命令并读取响应
+
+        :return: 按顺序排列的命令结果
+        """
+        commands, self._commands = self._commands, []
+        if not commands:
+            return []
+
+        responses = self._driver._send_batch([args for args, _, _ in commands])
+        values = []
+        for (_, parser, result), response in zip(commands, responses):
+            value = parser(response.decode("utf8").strip())
+            result._resolve(value)
+            values.append(value)
+        return values
+
+    # #############
+    #   色值相关   #
+    # #############
+    def get_color(self, point: _Point_Tuple) -> BatchResult:
+        return self._queue(_parse_optional, "getColor", point[0], point[1])
+
+    def find_color(self, color: str, sub_colors: _SubColors = None, region: _Region = None,
+                   similarity: float = 0.9) -> BatchResult:
+        if not region:
+            region = [0, 0, 0, 0]
+        return self._queue(lambda response: _parse_point(response, self._driver),
+                           "findColor", color, _sub_colors_text(sub_colors), *region, similarity)
+
+    def compare_color(self, main_x: float, main_y: float, color: str, sub_colors: _SubColors = None,
+                      region: _Region = None, similarity: float = 0.9) -> BatchResult:
+        if not region:
+            region = [0, 0, 0, 0]
+        return self._queue(_parse_bool, "compareColor", main_x, main_y, color, _sub_colors_text(sub_colors),
+                           *region, similarity)
+
+    # #############
+    #   找图相关   #
+    # #############
+    def find_images(self, image_name: str, region: _Region = None, algorithm: _Algorithm = None,
+                    similarity: float = 0.9, multi: int = 1) -> BatchResult:
+        if not region:
+            region = [0, 0, 0, 0]
+        return self._queue(lambda response: _parse_points(response, self._driver),
+                           "findImage", self._driver._base_path + image_name, *region, similarity,
+                           *_algorithm_args(algorithm), multi)
+
+    def find_image(self, image_name: str, region: _Region = None, algorithm: _Algorithm = None,
+                   similarity: float = 0.9) -> BatchResult:
+        if not region:
+            region = [0, 0, 0, 0]
+        return self._queue(lambda response: next(iter(_parse_points(response, self._driver)), None),
+                           "findImage", self._driver._base_path + image_name, *region, similarity,
+                           *_algorithm_args(algorithm), 1)
+
+    # ################
+    #   坐标操作相关   #
+    # ################
+    def click(self, point: _Point_Tuple, offset_x: float = 0, offset_y: float = 0) -> BatchResult:
+        return self._queue(_parse_bool, "click", point[0] + offset_x, point[1] + offset_y)
+
+    def double_click(self, point: _Point_Tuple, offset_x: float = 0, offset_y: float = 0) -> BatchResult:
+        return self._queue(_parse_bool, "doubleClick", point[0] + offset_x, point[1] + offset_y)
+
+    def long_click(self, point: _Point_Tuple, duration: float, offset_x: float = 0,
+                   offset_y: float = 0) -> BatchResult:
+        return self._queue(_parse_bool, "longClick", point[0] + offset_x, point[1] + offset_y, duration * 1000)
+
+    def swipe(self, start_point: _Point_Tuple, end_point: _Point_Tuple, duration: float) -> BatchResult:
+        return self._queue(_parse_bool, "swipe", start_point[0], start_point[1], end_point[0], end_point[1],
+                           duration * 1000)
+
+    def press(self, point: _Point_Tuple, duration: float) -> BatchResult:
+        return self._queue(_parse_bool, "press", point[0], point[1], duration * 1000)
+
+    def move(self, point: _Point_Tuple, duration: float) -> BatchResult:
+        return self._queue(_parse_bool, "move", point[0], point[1], duration * 1000)
+
+    def release(self) -> BatchResult:
+        return self._queue(_parse_bool, "release")
+
+    # #############
+    #   元素操作   #
+    # #############
+    def get_element_rect(self, xpath: str) -> BatchResult:
+        return self._queue(lambda response: _parse_rect(response, self._driver), "getElementRect", xpath)
+
+    def get_element_desc(self, xpath: str) -> BatchResult:
+        return self._queue(_parse_optional, "getElementDescription", xpath)
+
+    def get_element_text(self, xpath: str) -> BatchResult:
+        return self._queue(_parse_optional, "getElementText", xpath)
+
+    def set_element_text(self, xpath: str, text: str) -> BatchResult:
+        return self._queue(_parse_bool, "setElementText", xpath, text)
+
+    def click_element(self, xpath: str) -> BatchResult:
+        return self._queue(_parse_bool, "clickElement", xpath)
+
+    def scroll_element(self, xpath: str, direction: int = 0) -> BatchResult:
+        return self._queue(_parse_bool, "scrollElement", xpath, direction)
+
+    def element_exists(self, xpath: str) -> BatchResult:
+        return self._queue(_parse_bool, "existsElement", xpath)
+
+    def element_is_selected(self, xpath: str) -> BatchResult:
+        return self._queue(_parse_bool, "isSelectedElement", xpath)
+
+    # #############
+    #   设备操作   #
+    # #############
+    def send_keys(self, text: str) -> BatchResult:
+        return self._queue(_parse_bool, "sendKeys", text)
+
+    def send_vk(self, vk: int) -> BatchResult:
+        return self._queue(_parse_bool, "sendVk", vk)
+
+    def back(self) -> BatchResult:
+        return self._queue(_parse_bool, "back")
+
+    def home(self) -> BatchResult:
+        return self._queue(_parse_bool, "home")
+
+    def show_toast(self, text: str, duration: float = 3) -> BatchResult:
+        return self._queue(_parse_bool, "showToast", text, duration * 1000)
+
+    def get_activity(self) -> BatchResult:
+        return self._queue(str, "getActivity")
+
+    def get_package(self) -> BatchResult:
+        return self._queue(str, "getPackage")
+
+    def get_android_id(self) -> BatchResult:
+        return self._queue(str, "getAndroidId")
+
 class CustomWinScript(WinBotMain):
     log_level = "DEBUG"
 
@@ -147,6 +478,7 @@ class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
     daemon_threads = True
     allow_reuse_address = True
 
+
     def server_bind(self) -> None:
         """Called by constructor to bind the socket.
         May be overridden.
@@ -162,52 +494,115 @@ class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
 Count = 0
 
 
-class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "execute")):
+def _serve(handler_class: type, socket_address: tuple, profile: str = None) -> None:
+    """
+    启动 Socket 服务，多进程模式下作为子进程入口
+
+    :param handler_class: 脚本类
+    :param socket_address: 监听地址
+    :param profile: 性能分析结果的输出目录
+    :return:
+    """
+    sock = _ThreadingTCPServer(socket_address, handler_class, bind_and_activate=False)
+    sock.request_queue_size = int(getattr(handler_class, "request_queue_size", 5))
+    try:
+        sock.server_bind()
+        sock.server_activate()
+    except BaseException:
+        sock.server_close()
+        raise
+    print(f"Server stared on {socket_address[0]}:{socket_address[1]}")
+    print("服务已启动")
+    print("等待设备连接...")
+
+    configure_bot_logging(handler_class)
+    # 多进程模式下父进程用 SIGTERM 停止子进程，停止后仍然断开连接并输出性能分析结果
+    with stop_on_signals(sock):
+        profiling = start_profiling(handler_class, profile)
+        try:
+            sock.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_connections(sock)
+            sock.server_close()
+            stop_profiling(profiling)
+
+
+class AndroidBotMain(socketserver.BaseRequestHandler, Waiter, metaclass=_protect("handle", "execute")):
     raise_err = False
+    identify_on_connect = False  # 连接后是否自动获取 android_id、投屏组号和编号登记到 device_registry
+    frame_cache_ttl = 0  # 截图缓存有效期(秒)，大于 0 时取色、找色、比色、本地找图共用一次截图，输入命令后自动失效
+    adaptive_wait = True  # 等待类方法是否自适应退避轮询，False 时按 interval_timeout 固定间隔轮询
+    ocr_cache: Optional[OcrCache] = None  # OCR 结果缓存，设置后识别区域截图未变化时不再请求 OCR 服务
+    ocr_backend: Optional[OcrBackend] = None  # 脚本端 OCR 后端，设置后截图在脚本端识别，不再经过设备的 OCR 服务
     wait_timeout = 3  # seconds
     interval_timeout = 0.5  # seconds
 
+    collect_metrics = True  # 是否按命令统计次数、字节数、错误和耗时，见 metrics_registry
+    tracer: Optional[Tracer] = None  # 命令追踪，设置后记录每个方法调用、收发数据和等待休眠的耗时
+    profiler: Optional[SamplingProfiler] = None  # 采样分析器，execute(profile=...) 时自动设置
+    record_dir: Optional[str] = None  # 录制目录，设置后每个连接的请求和响应写入录制文件，可用 ReplaySimulator 回放
     log_storage = False
     log_level = "INFO"
     log_size = 10  # MB
+    log_format = Log_Format
+    log_payload_limit = PAYLOAD_LIMIT  # 收发数据日志最多显示的字节数
+    log_payload_sample = 1.0  # 收发数据日志的采样比例，0-1
+    log_enqueue = True  # 是否在后台线程写入日志
 
     log = logger
 
-    if log_storage:
-        log.add("./runtime.log", level=log_level.upper(), format=Log_Format,
-                rotation=f'{log_size} MB',
-                retention='0 days')
-
     # 基础存储路径
     _base_path = "/storage/emulated/0/Android/data/com.aibot.client/files/"
 
     def __init__(self, request, client_address, server):
         self._lock = threading.Lock()
-
-        super().__init__(request, client_address, server)
+        self._reader = FrameReader(request, client_address)
+        self._frame_cache = FrameCache()
+        self._notifier = Notifier()
+
+        self._session = device_registry.register(self, "android", client_address)
+        self.log = session_logger("android", self._session.address)
+        self._wire_log = self.log.bind(payload=True)
+        self._metrics = metrics_registry.device("android", self._session.address) if self.collect_metrics else None
+        self._recorder = SessionRecorder.create(self.record_dir, "android", self._session.address) \
+            if self.record_dir else None
+        if self.tracer is not None:
+            self.tracer.instrument(self, self._session.address)
+        try:
+            super().__init__(request, client_address, server)
+        finally:
+            if self._recorder is not None:
+                self._recorder.close()
+            device_registry.unregister(self)
+            if self._metrics is not None:
+                metrics_registry.release(self._metrics)
+            if self.tracer is not None:
+                self.tracer.flush()
 
     def __send_data_return_bytes(self, *args) -> bytes:
-        args_len = ""
-        args_text = ""
-
-        for argv in args:
-            argv = str(argv)
-            args_text += argv
-            args_len += str(len(bytes(argv, 'utf8'))) + "/"
-
-        data = (args_len.strip("/") + "\n" + args_text).encode("utf8")
+        request_data = encode_request(args)
         try:
             with self._lock:
-                self.log.debug(rf"---> {data}")
-                self.request.sendall(data)
-                response = self.request.recv(65535)
-                if response == b"":
-                    raise ConnectionAbortedError(f"{self.client_address[0]}:{self.client_address[1]} 客户端断开链接")
-                data_length, data = response.split(b"/", 1)
-                while int(data_length) > len(data):
-                    data += self.request.recv(65535)
-                self.log.debug(rf"<--- {data}")
+                start = time.perf_counter()
+                self._wire_log.debug("---> {}", payload(request_data))
+                self.request.sendall(request_data)
+                data = self._reader.read_frame()
+                self._session.touch()
+                if args[0] in _SCREEN_COMMANDS:
+                    self._frame_cache.invalidate()
+                    # 输入失败时屏幕没有变化，不唤醒等待中的方法
+                    if data != b"false":
+                        self._notifier.notify()
+                self._wire_log.debug("<--- {}", payload(data))
+                if self._metrics is not None:
+                    self._metrics.record(args[0], start, len(request_data), len(data))
+                if self._recorder is not None:
+                    self._recorder.record(request_data, data, start, time.perf_counter())
         except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record(args[0], start, len(request_data), 0, True)
             self.log.error("send/read tcp data error: " + str(e))
             raise e
         return data
@@ -216,56 +611,159 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         data = self.__send_data_return_bytes(*args)
         return data.decode("utf8").strip()
 
-    def __push_file(self, func_name: str, to_path: str, file: bytes):
-        func_name = bytes(func_name, "utf8")
-        to_path = bytes(to_path, "utf8")
-
-        str_data = ""
-        str_data += str(len(func_name)) + "/"  # func_name 字节长度
-        str_data += str(len(to_path)) + "/"  # to_path 字节长度
-        str_data += str(len(file)) + "\n"  # file 字节长度
-
-        bytes_data = bytes(str_data, "utf8")
-        bytes_data += func_name
-        bytes_data += to_path
-        bytes_data += file
-
-        with self._lock:
-            self.log.debug(rf"---> {bytes_data}")
-            self.request.sendall(bytes_data)
-            response = self.request.recv(65535)
-            if response == b"":
-                raise ConnectionAbortedError(f"{self.client_address[0]}:{self.client_address[1]} 客户端断开链接")
-            data_length, data = response.split(b"/", 1)
-            while int(data_length) > len(data):
-                data += self.request.recv(65535)
-            self.log.debug(rf"<--- {data}")
+    def __push_file(self, func_name: str, to_path: str, source: Union[BinaryIO, memoryview],
+                    progress: _Progress = None) -> str:
+        """
+        发送文件，source 为文件对象时从当前位置发送到末尾，为内存视图(如 mmap)时直接发送
+
+        :param func_name: 命令名称
+        :param to_path: 目标存储路径
+        :param source: 文件对象或内存视图
+        :param progress: 进度回调
+        :return:
+        """
+        if isinstance(source, memoryview):
+            size = source.nbytes
+            start = 0
+        else:
+            size = stream_size(source)
+            start = source.tell()
+        data = request_prefix = encode_request_prefix((func_name, to_path), size)
+        request_size = len(data) + size
+
+        try:
+            with self._lock:
+                began = time.perf_counter()
+                self._wire_log.debug("---> {}<{} bytes>", payload(data), size)
+                self.request.sendall(data)
+                # 分块发送文件，支持时使用 sendfile 零拷贝
+                sent = 0
+                while sent < size:
+                    count = min(FILE_CHUNK_SIZE, size - sent)
+                    if isinstance(source, memoryview):
+                        # 分块的视图用完立即释放，发送失败时异常信息中也不会留下对 mmap 的引用
+                        with source[sent:sent + count] as chunk:
+                            self.request.sendall(chunk)
+                    else:
+                        count = self.request.sendfile(source, start + sent, count)
+                        if count == 0:
+                            raise EOFError(f"文件长度不足，预期 {size} 字节，实际 {sent} 字节")
+                    sent += count
+                    if progress:
+                        progress(sent, size)
+                data = self._reader.read_frame()
+                self._session.touch()
+                self._wire_log.debug("<--- {}", payload(data))
+                if self._metrics is not None:
+                    self._metrics.record(func_name, began, request_size, len(data))
+                if self._recorder is not None:
+                    # 只录制请求帧头，不保存上传的文件内容
+                    self._recorder.record(request_prefix, data, began, time.perf_counter(), FLAG_REQUEST_TRUNCATED)
+        except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record(func_name, began, request_size, 0, True)
+            self.log.error("send/read tcp data error: " + str(e))
+            raise e
 
         return data.decode("utf8").strip()
 
-    def __pull_file(self, *args) -> bytes:
-        args_len = ""
-        args_text = ""
+    def __pull_file(self, local_path: Union[str, BinaryIO], progress: _Progress, *args) -> bool:
+        data = encode_request(args)
 
-        for argv in args:
-            argv = str(argv)
-            args_text += argv
-            args_len += str(len(bytes(argv, 'utf8'))) + "/"
+        try:
+            with self._lock:
+                start = time.perf_counter()
+                self._wire_log.debug("---> {}", payload(data))
+                self.request.sendall(data)
+                length = self._reader.read_length()
+                head = b""
+                if length == 4:
+                    # 文件不存在时返回 null
+                    head = bytearray(4)
+                    self._reader.read_exactly_into(memoryview(head))
+                    if head == b"null":
+                        self._session.touch()
+                        self._wire_log.debug("<--- {}", payload(head))
+                        if self._metrics is not None:
+                            self._metrics.record(args[0], start, len(data), length)
+                        if self._recorder is not None:
+                            self._recorder.record(data, head, start, time.perf_counter())
+                        return False
+
+                with _open_binary(local_path, "wb") as file:
+                    if head:
+                        file.write(head)
+                        if progress:
+                            progress(length, length)
+                    else:
+                        self._reader.read_into_file(file, length, progress=progress)
+                self._session.touch()
+                self._wire_log.debug("<--- <{} bytes>", length)
+                if self._metrics is not None:
+                    self._metrics.record(args[0], start, len(data), length)
+                if self._recorder is not None:
+                    # 下载的文件内容不保存，回放时用同样长度的数据代替
+                    self._recorder.record(data, None, start, time.perf_counter(), response_size=length)
+        except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record(args[0], start, len(data), 0, True)
+            self.log.error("send/read tcp data error: " + str(e))
+            raise e
+        return True
 
-        data = (args_len.strip("/") + "\n" + args_text).encode("utf8")
+    def _send_batch(self, commands: List[tuple]) -> List[bytearray]:
+        """
+        一次性发送多条命令，再按顺序读取所有响应
 
-        with self._lock:
-            self.log.debug(rf"---> {data}")
-            self.request.sendall(data)
-            response = self.request.recv(65535)
-            if response == b"":
-                raise ConnectionAbortedError(f"{self.client_address[0]}:{self.client_address[1]} 客户端断开链接")
-            data_length, data = response.split(b"/", 1)
-            while int(data_length) > len(data):
-                data += self.request.recv(65535)
-            self.log.debug(rf"<--- {data}")
+        :param commands: 命令参数列表
+        :return: 响应数据列表
+        """
+        frames = [encode_request(args) for args in commands]
+        data = b"".join(frames)
+        try:
+            with self._lock:
+                start = time.perf_counter()
+                self._wire_log.debug("---> {}", payload(data))
+                self.request.sendall(data)
+                responses = []
+                received = []
+                for _ in commands:
+                    responses.append(self._reader.read_frame())
+                    received.append(time.perf_counter())
+                self._session.touch()
+                screen_responses = [response for args, response in zip(commands, responses)
+                                    if args[0] in _SCREEN_COMMANDS]
+                if screen_responses:
+                    self._frame_cache.invalidate()
+                    if any(response != b"false" for response in screen_responses):
+                        self._notifier.notify()
+                self._wire_log.debug("<--- {}", payload(responses))
+                # 批量请求作为一次往返记录，不拆分到各个命令
+                if self._metrics is not None:
+                    self._metrics.record("batch", start, len(data), sum(len(response) for response in responses))
+                if self._recorder is not None:
+                    # 设备按顺序处理批量命令，每条命令从上一条响应到达时开始计时，回放时延迟不会重复累加
+                    began = start
+                    for frame, response, end in zip(frames, responses, received):
+                        self._recorder.record(frame, response, began, end)
+                        began = end
+        except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record("batch", start, len(data), 0, True)
+            self.log.error("send/read tcp data error: " + str(e))
+            raise e
+        return responses
 
-        return data
+    def batch(self) -> AndroidBatch:
+        """
+        批量发送命令，多条命令只需一次网络往返
+
+        :return: AndroidBatch，在 with 语句中使用，退出时自动发送
+
+        .. seealso::
+            :class:`AndroidBatch`
+        """
+        return AndroidBatch(self)
 
     def save_screenshot(self, image_name: str, region: _Region = None, algorithm: _Algorithm = None) -> Optional[str]:
         """
@@ -305,13 +803,7 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if not algorithm:
-            algorithm_type, threshold, max_val = [0, 0, 0]
-        else:
-            algorithm_type, threshold, max_val = algorithm
-            if algorithm_type in (5, 6):
-                threshold = 127
-                max_val = 255
+        algorithm_type, threshold, max_val = _algorithm_args(algorithm)
 
         response = self.__send_data("saveScreenshot", self._base_path + image_name, *region,
                                     algorithm_type, threshold, max_val)
@@ -369,19 +861,130 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if not algorithm:
-            algorithm_type, threshold, max_val = [0, 0, 0]
-        else:
-            algorithm_type, threshold, max_val = algorithm
-            if algorithm_type in (5, 6):
-                threshold = 127
-                max_val = 255
+        algorithm_type, threshold, max_val = _algorithm_args(algorithm)
 
         response = self.__send_data_return_bytes("takeScreenshot", *region, algorithm_type, threshold, max_val, scale)
         if response == b'null':
             return None
         return response
 
+    def capture(self, region: _Region = None, scale: float = 1.0) -> Optional[Frame]:
+        """
+        截图并在本地解码为 :class:`Frame`，之后的取色、比色、找色都在本地完成，一次传输代替逐点的网络请求
+
+        需要安装 numpy 和 opencv-python（或 Pillow）
+
+        设置了 ``frame_cache_ttl`` 时从有效期内缓存的全屏原图截图中截取 ``region``，``scale`` 不为 1.0 时不使用缓存，
+        Frame 的坐标都是屏幕坐标，调用方式不变。
+
+        :param region: 截图区域，默认全屏
+        :param scale: 图片缩放率, 默认为 1.0 原大小
+        :return: Frame 或者 None
+
+        Examples:
+
+        >>> frame = self.capture()
+        >>> frame.get_color((100, 200))
+        >>> frame.check_colors([(100, 200, "#008577"), (300, 400, "#FFFFFF")])
+        """
+        if self.frame_cache_ttl > 0 and scale == 1.0:
+            frame = self._frame_cache.get(self.frame_cache_ttl, lambda: self.__capture(None, 1.0))
+            if frame is not None and region and any(region):
+                return frame.sub_frame(region)
+            return frame
+        return self.__capture(region, scale)
+
+    def __capture(self, region: _Region, scale: float) -> Optional[Frame]:
+        data = self.take_screenshot(region, None, scale)
+        if data is None:
+            return None
+        origin = (region[0], region[1]) if region else (0, 0)
+        return Frame.from_bytes(data, origin, scale, lambda x, y: Point(x=x, y=y, driver=self))
+
+    def invalidate_frame_cache(self) -> None:
+        """
+        使缓存的截图失效，下一次取色、找色、找图重新截图；输入命令会自动调用
+
+        :return:
+        """
+        self._frame_cache.invalidate()
+
+    # #############
+    #   等待相关   #
+    # #############
+    def wait_any(self, conditions: Iterable[_Condition], wait_time: float = None,
+                 interval_time: float = None) -> Optional[WaitResult]:
+        """
+        等待任意一个条件满足，条件可以是元素、图片、颜色、OCR 文字的组合
+
+        每轮轮询将元素、OCR 命令和截图合并为一次批量请求，图片和颜色条件在同一张截图上本地判断；
+        设置了 ``frame_cache_ttl`` 时图片和颜色条件使用缓存的截图。
+
+        :param conditions: 条件列表，字符串为元素 xpath，其他为 :class:`AiBote.Image`、:class:`AiBote.Color`、
+            :class:`AiBote.Text`
+        :param wait_time: 等待时间，默认取 self.wait_timeout
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout
+        :return: WaitResult(下标, 条件, 结果) 或者 None
+
+        Examples:
+
+        >>> result = self.wait_any(["com.aibot.client/android.widget.Button@text=确定", Image("img/close.png")])
+        >>> if result and result.index == 1:
+        ...     self.click(result.value)
+        """
+        conditions = as_conditions(conditions)
+        return self.wait_until(lambda: self.__check_conditions(conditions), wait_time, interval_time)
+
+    def __check_conditions(self, conditions: list) -> Optional[WaitResult]:
+        # 设置了脚本端 OCR 后端时文字条件不随批量请求发送
+        remote_types = (Element, Text) if self.ocr_backend is None else Element
+        commands = [self.__condition_command(condition) for condition in conditions
+                    if isinstance(condition, remote_types)]
+        local_frame = needs_frame(conditions) and self.frame_cache_ttl <= 0
+        if local_frame:
+            commands.append(("takeScreenshot", 0, 0, 0, 0, 0, 0, 0, 1.0))
+        responses = self._send_batch(commands) if commands else []
+
+        remote_responses = iter(responses)
+        frames = []
+        for index, condition in enumerate(conditions):
+            if isinstance(condition, remote_types):
+                value = self.__condition_value(condition, next(remote_responses).decode("utf8").strip())
+            elif isinstance(condition, Text):
+                points = self.find_text(condition.text, condition.region, condition.algorithm, condition.scale)
+                value = points[0] if points else None
+            else:
+                # 截图只在需要时解码一次
+                if not frames:
+                    if not local_frame:
+                        frames.append(self.capture())
+                    elif responses[-1] == b"null":
+                        frames.append(None)
+                    else:
+                        frames.append(Frame.from_bytes(responses[-1], (0, 0), 1.0,
+                                                       lambda x, y: Point(x=x, y=y, driver=self)))
+                value = check_frame(condition, frames[0])
+            if value:
+                return WaitResult(index, condition, value)
+        return None
+
+    @staticmethod
+    def __condition_command(condition: Union[Element, Text]) -> tuple:
+        if isinstance(condition, Element):
+            return "existsElement", condition.xpath
+        region = condition.region or [0, 0, 0, 0]
+        # scale 仅支持区域识别
+        scale = condition.scale if region[2] != 0 else 1.0
+        return ("ocr", *region, *_algorithm_args(condition.algorithm), scale)
+
+    def __condition_value(self, condition: Union[Element, Text], response: str) -> Any:
+        if isinstance(condition, Element):
+            return _parse_bool(response)
+        region = condition.region or [0, 0, 0, 0]
+        scale = condition.scale if region[2] != 0 else 1.0
+        points = self._ocr_result(parse_ocr(response), region, scale).find(condition.text)
+        return points[0] if points else None
+
     # #############
     #   色值相关   #
     # #############
@@ -393,6 +996,12 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: 色值字符串(例如: #008577)或者 None
 
         """
+        if self.frame_cache_ttl > 0:
+            frame = self.capture()
+            # 坐标不在截图范围内时向设备请求
+            if frame is not None and frame.contains(point):
+                return frame.get_color(point)
+
         response = self.__send_data("getColor", point[0], point[1])
         if response == "null":
             return None
@@ -431,26 +1040,23 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if sub_colors:
-            sub_colors_str = ""
-            for sub_color in sub_colors:
-                offset_x, offset_y, color_str = sub_color
-                sub_colors_str += f"{offset_x}/{offset_y}/{color_str}\n"
-            # 去除最后一个 \n
-            sub_colors_str = sub_colors_str.strip()
-        else:
-            sub_colors_str = "null"
-
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findColor", color, sub_colors_str, *region, similarity)
-            # 找色失败
-            if response == "-1.0|-1.0":
-                time.sleep(interval_time)
+        sub_colors_str = _sub_colors_text(sub_colors)
+
+        def find() -> Optional[Point]:
+            frame = self.capture() if self.frame_cache_ttl > 0 else None
+            if frame is not None:
+                found = frame.find_color(color, sub_colors, region, similarity)
             else:
-                # 找色成功
-                x, y = response.split("|")
-                return Point(x=float(x), y=float(y), driver=self)
+                found = _parse_point(self.__send_data("findColor", color, sub_colors_str, *region, similarity), self)
+            if found is None:
+                # 找色失败，下一轮重新截图
+                self._frame_cache.invalidate()
+            return found
+
+        point = self.wait_until(find, wait_time, interval_time)
+        if point is not None:
+            # 找色成功
+            return point
         # 超时
         if raise_err:
             raise TimeoutError("`find_color` 操作超时")
@@ -469,6 +1075,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         """
         比较指定坐标点的颜色值
 
+        在 wait_time 内轮询，直到颜色一致或超时；wait_time 为 0 时只比较一次
+
         :param main_x: 主颜色所在的X坐标；
         :param main_y: 主颜色所在的Y坐标；
         :param color: 颜色字符串，必须以 # 开头，例如：#008577；
@@ -493,23 +1101,22 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if sub_colors:
-            sub_colors_str = ""
-            for sub_color in sub_colors:
-                offset_x, offset_y, color_str = sub_color
-                sub_colors_str += f"{offset_x}/{offset_y}/{color_str}\n"
-            # 去除最后一个 \n
-            sub_colors_str = sub_colors_str.strip()
-        else:
-            sub_colors_str = "null"
+        sub_colors_str = _sub_colors_text(sub_colors)
+
+        def compare() -> bool:
+            frame = self.capture() if self.frame_cache_ttl > 0 else None
+            if frame is not None:
+                return frame.compare_color(main_x, main_y, color, sub_colors, similarity)
+            return self.__send_data("compareColor", main_x, main_y, color, sub_colors_str, *region,
+                                    similarity) == "true"
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            return self.__send_data("compareColor", main_x, main_y, color, sub_colors_str, *region, similarity) == "true"
+        # 成功
+        if self.wait_until(compare, wait_time, interval_time):
+            return True
         # 超时
         if raise_err:
             raise TimeoutError("`compare_color` 操作超时")
-        return None
+        return False
 
     # #############
     #   找图相关   #
@@ -617,35 +1224,103 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if not algorithm:
-            algorithm_type, threshold, max_val = [0, 0, 0]
-        else:
-            algorithm_type, threshold, max_val = algorithm
-            if algorithm_type in (5, 6):
-                threshold = 127
-                max_val = 255
-
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findImage", self._base_path + image_name, *region, similarity,
-                                        algorithm_type, threshold, max_val, multi)
-            # 找图失败
-            if response == "-1.0|-1.0":
-                time.sleep(interval_time)
-            else:
-                # 找图成功，返回图片左上角坐标
-                # 分割出多个图片的坐标
-                image_points = response.split("/")
-                point_list = []
-                for point_str in image_points:
-                    x, y = point_str.split("|")
-                    point_list.append(Point(x=float(x), y=float(y), driver=self))
-                return point_list
+        algorithm_type, threshold, max_val = _algorithm_args(algorithm)
+
+        point_list = self.wait_until(
+            lambda: _parse_points(self.__send_data("findImage", self._base_path + image_name, *region, similarity,
+                                                   algorithm_type, threshold, max_val, multi), self),
+            wait_time, interval_time)
+        if point_list:
+            # 找图成功，返回图片左上角坐标
+            return point_list
         # 超时
         if raise_err:
             raise TimeoutError("`find_images` 操作超时")
         return []
 
+    def find_local_images(self,
+                          template,
+                          region: _Region = None,
+                          algorithm: _Algorithm = None,
+                          similarity: float = 0.9,
+                          multi: int = 1,
+                          wait_time: float = None,
+                          interval_time: float = None,
+                          raise_err: bool = None) -> List[Point]:
+        """
+        本地找图，截图传回本机后做模板匹配，模板图片无需放在手机中，参数语义同 :meth:`find_images`
+
+        需要安装 numpy 和 opencv-python（或 Pillow）
+
+        :param template: 模板图片路径（本机）或 BGR/灰度数组，与屏幕原始分辨率一致
+        :param region: 截图区域，默认全屏，只传输该区域的截图
+        :param algorithm: 处理截图和模板所用的算法，说明见 :meth:`find_images`
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :param multi: 目标数量，默认为 1
+        :param wait_time: 等待时间，默认取 self.wait_timeout
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout
+        :param raise_err: 超时是否抛出异常
+        :return: 图片中心点坐标列表
+        """
+        result = self.match_images({"": template}, region, algorithm, similarity, multi, wait_time, interval_time,
+                                   raise_err)
+        return result.get("", [])
+
+    def match_images(self,
+                     templates: Dict[str, object],
+                     region: _Region = None,
+                     algorithm: _Algorithm = None,
+                     similarity: float = 0.9,
+                     multi: int = 1,
+                     wait_time: float = None,
+                     interval_time: float = None,
+                     raise_err: bool = None) -> Dict[str, List[Point]]:
+        """
+        一次截图同时查找多个模板，任一模板找到即返回，轮询时每轮只截图一次
+
+        :param templates: {名称: 模板图片路径（本机）或数组}
+        :param region: 截图区域，默认全屏
+        :param algorithm: 处理截图和模板所用的算法，说明见 :meth:`find_images`
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :param multi: 每个模板最多返回的数量，默认为 1
+        :param wait_time: 等待时间，默认取 self.wait_timeout
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout
+        :param raise_err: 超时是否抛出异常
+        :return: {名称: 中心点坐标列表}，超时返回空字典
+
+        Examples:
+
+        >>> found = self.match_images({"ok": "img/ok.png", "close": "img/close.png"})
+        >>> if found.get("close"):
+        ...     self.click(found["close"][0])
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        def match() -> Optional[Dict[str, List[Point]]]:
+            frame = self.capture(region)
+            if frame is not None:
+                found = frame.match_images(templates, region, algorithm, similarity, multi)
+                if any(found.values()):
+                    return found
+            # 下一轮重新截图
+            self._frame_cache.invalidate()
+            return None
+
+        result = self.wait_until(match, wait_time, interval_time)
+        if result:
+            return result
+        # 超时
+        if raise_err:
+            raise TimeoutError("`match_images` 操作超时")
+        return {}
+
     def find_dynamic_image(self,
                            interval_ti: int,
                            region: _Region = None,
@@ -675,21 +1350,11 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findAnimation", interval_ti, *region)
-            # 找图失败
-            if response == "-1.0|-1.0":
-                time.sleep(interval_time)
-            else:
-                # 找图成功，返回图片左上角坐标
-                # 分割出多个图片的坐标
-                image_points = response.split("/")
-                point_list = []
-                for point_str in image_points:
-                    x, y = point_str.split("|")
-                    point_list.append(Point(x=float(x), y=float(y), driver=self))
-                return point_list
+        point_list = self.wait_until(lambda: _parse_points(self.__send_data("findAnimation", interval_ti, *region), self),
+                                     wait_time, interval_time)
+        if point_list:
+            # 找图成功，返回图片左上角坐标
+            return point_list
         # 超时
         if raise_err:
             raise TimeoutError("`find_dynamic_image` 操作超时")
@@ -813,7 +1478,7 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         result = self.press(point, duration)
         if not result:
             return False
-        time.sleep(duration)
+        _traced_sleep(duration)
         result2 = self.release()
         if not result2:
             return False
@@ -838,28 +1503,7 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
     # ##############
     #   OCR 相关   #
     ################
-    @staticmethod
-    def __parse_ocr(text: str) -> list:
-        """
-        解析 OCR 识别出出来的信息
-
-        :param text:
-        :return:
-        """
-        # pattern = re.compile(r'(\[\[\[).+?(\)])')
-        # matches = pattern.finditer(text)
-        #
-        # text_info_list = []
-        # for match in matches:
-        #     result_str = match.group()
-        #     text_info = literal_eval(result_str)
-        #     text_info_list.append(text_info)
-        #
-        # return text_info_list
-
-        return literal_eval(text)
-
-    def __ocr_server(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0) -> list:
+    def __ocr_server(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0) -> OcrData:
         """
         OCR 服务，通过 OCR 识别屏幕中文字
 
@@ -871,22 +1515,33 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not region:
             region = [0, 0, 0, 0]
 
-        if not algorithm:
-            algorithm_type, threshold, max_val = [0, 0, 0]
-        else:
-            algorithm_type, threshold, max_val = algorithm
-            if algorithm_type in (5, 6):
-                threshold = 127
-                max_val = 255
+        algorithm_type, threshold, max_val = _algorithm_args(algorithm)
 
         # scale 仅支持区域识别
         if region[2] == 0:
             scale = 1.0
 
-        response = self.__send_data("ocr", *region, algorithm_type, threshold, max_val, scale)
-        if response == "null" or response == "[]":
-            return []
-        return self.__parse_ocr(response)
+        if self.ocr_backend is not None:
+            # 脚本端识别：按 algorithm 和 scale 截图后交给 OCR 后端
+            data = self.take_screenshot(region, algorithm, scale)
+            if data is None:
+                return OcrData()
+            image = decode_image(data)
+            if self.ocr_cache is None:
+                return self.ocr_backend.recognize(image)
+            return self.ocr_cache.get(image, ("local", scale), lambda: self.ocr_backend.recognize(image))
+
+        def recognize() -> OcrData:
+            return parse_ocr(self.__send_data("ocr", *region, algorithm_type, threshold, max_val, scale))
+
+        if self.ocr_cache is None:
+            return recognize()
+
+        # 区域截图未变化时使用缓存的识别结果
+        frame = self.capture(region if region[2] else None)
+        if frame is None:
+            return recognize()
+        return self.ocr_cache.get(frame.crop(region), (algorithm_type, threshold, max_val, scale), recognize)
 
     def init_ocr_server(self, ip: str, port: int = 9752) -> bool:
         """
@@ -898,30 +1553,47 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         """
         return self.__send_data("initOcr", ip, port) == "true"
 
-    def get_text(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0) -> List[str]:
+    def _ocr_result(self, ocr_data: OcrData, region: _Region, scale: float) -> OcrResult:
+        return OcrResult(ocr_data, region, scale, lambda x, y: Point(x=x, y=y, driver=self))
+
+    def get_text(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0,
+                 as_result: bool = False) -> Union[List[str], OcrResult]:
         """
         通过 OCR 识别屏幕中的文字，返回文字列表
 
         :param region: 识别区域，默认全屏；
         :param algorithm: 处理图片/屏幕所用算法和参数，默认保存原图；
         :param scale: 图片缩放率, 默认为 1.0 原大小。大于1.0放大，小于1.0缩小，不能为负数。仅在区域识别有效
-        :return: 文字列表
+        :param as_result: 是否返回 :class:`OcrResult`，保留文本框坐标，可多次查询而不重新识别
+        :return: 文字列表或者 OcrResult
+
+        Examples:
+
+        >>> result = self.get_text(as_result=True)
+        >>> result.find("确定"), result.find_regex(r"\\d+元"), result.nearest((500, 800))
 
         .. seealso::
             :meth:`find_image`: ``region`` 和 ``algorithm`` 的参数说明
         """
-        text_info_list = self.__ocr_server(region, algorithm, scale)
-        text_list = []
-        for text_info in text_info_list:
-            text = text_info[-1][0]
-            text_list.append(text)
-        return text_list
+        if not region:
+            region = [0, 0, 0, 0]
+
+        # scale 仅支持区域识别
+        if region[2] == 0:
+            scale = 1.0
+
+        ocr_data = self.__ocr_server(region, algorithm, scale)
+        if as_result:
+            return self._ocr_result(ocr_data, region, scale)
+        return list(ocr_data.texts)
 
     def find_text(self, text: str, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0) -> \
             List[Point]:
         """
         查找文字所在的坐标，返回坐标列表（坐标是文本区域中心位置）
 
+        同一屏幕需要查找多个文字时，使用 ``get_text(as_result=True)`` 识别一次再查询。
+
         :param text: 要查找的文字；
         :param region: 识别区域，默认全屏；
         :param algorithm: 处理图片/屏幕所用算法和参数，默认保存原图；
@@ -931,48 +1603,7 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         .. seealso::
             :meth:`find_image`: ``region`` 和 ``algorithm`` 的参数说明
         """
-        if not region:
-            region = [0, 0, 0, 0]
-
-        text_info_list = self.__ocr_server(region, algorithm, scale)
-
-        text_points = []
-        for text_info in text_info_list:
-            if text in text_info[-1][0]:
-                points, words_tuple = text_info
-
-                left, top, right, bottom = points
-
-                # 文本区域起点坐标
-                start_x = left[0]
-                start_y = left[1]
-                # 文本区域终点坐标
-                end_x = right[0]
-                end_y = right[1]
-                # 文本区域中心点据左上角的偏移量
-                # 可能指定文本只是部分文本，要计算出实际位置(x轴)
-                words: str = words_tuple[0]
-                width = end_x - start_x
-
-                # 单字符宽度
-                single_word_width = width / len(words)
-                # 文本在整体文本的起始位置
-                pos = words.find(text)
-
-                offset_x = pos * single_word_width + len(text) * single_word_width / 2
-                offset_y = (end_y - start_y) / 2
-
-                # [ { x: 108, y: 1153 } ]
-
-                # 计算文本区域中心坐标
-                text_point = Point(
-                    x=float(region[0] + (start_x + offset_x) / scale),
-                    y=float(region[1] + (start_y + offset_y) / scale),
-                    driver=self
-                )
-                text_points.append(text_point)
-
-        return text_points
+        return self.get_text(region, algorithm, scale, as_result=True).find(text)
 
     # #############
     #   元素操作   #
@@ -997,17 +1628,11 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            data = self.__send_data("getElementRect", xpath)
-            # 失败
-            if data == "-1|-1|-1|-1":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                start_x, start_y, end_x, end_y = data.split("|")
-                return Point2s(p1=Point(x=float(start_x), y=float(start_y), driver=self),
-                               p2=Point(x=float(end_x), y=float(end_y), driver=self))
+        rect = self.wait_until(lambda: _parse_rect(self.__send_data("getElementRect", xpath), self), wait_time,
+                               interval_time)
+        # 成功
+        if rect is not None:
+            return rect
         # 超时
         if raise_err:
             raise TimeoutError("`get_element_rect` 操作超时")
@@ -1033,15 +1658,11 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            data = self.__send_data("getElementDescription", xpath)
-            # 失败
-            if data == "null":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return data
+        data = self.wait_until(lambda: self.__send_data("getElementDescription", xpath), wait_time, interval_time,
+                               lambda response: response != "null")
+        # 成功
+        if data != "null":
+            return data
         # 超时
         if raise_err:
             raise TimeoutError("`get_element_desc` 操作超时")
@@ -1067,15 +1688,11 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            data = self.__send_data("getElementText", xpath)
-            # 失败
-            if data == "null":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return data
+        data = self.wait_until(lambda: self.__send_data("getElementText", xpath), wait_time, interval_time,
+                               lambda response: response != "null")
+        # 成功
+        if data != "null":
+            return data
         # 超时
         if raise_err:
             raise TimeoutError("`get_element_text` 操作超时")
@@ -1102,14 +1719,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            # 失败
-            if self.__send_data("setElementText", xpath, text) != "true":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return True
+        # 成功
+        if self.wait_until(lambda: self.__send_data("setElementText", xpath, text) == "true", wait_time, interval_time):
+            return True
         # 超时
         if raise_err:
             raise TimeoutError("`set_element_text` 操作超时")
@@ -1135,14 +1747,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            # 失败
-            if self.__send_data("clickElement", xpath) != "true":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return True
+        # 成功
+        if self.wait_until(lambda: self.__send_data("clickElement", xpath) == "true", wait_time, interval_time):
+            return True
         # 超时
         if raise_err:
             raise TimeoutError("`click_element` 操作超时")
@@ -1168,13 +1775,13 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if raise_err is None:
             raise_err = self.raise_err
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            for xpath in xpath_list:
-                result = self.click_element(xpath, wait_time=0.05, interval_time=0.01, raise_err=False)
-                if result:
-                    return True
-            time.sleep(interval_time)
+        def click_any() -> bool:
+            # 一次批量请求找到第一个存在的元素再点击，每轮两次网络往返
+            found = self.wait_any(xpath_list, wait_time=0)
+            return found is not None and self.click_element(found.condition.xpath, wait_time=0, raise_err=False)
+
+        if self.wait_until(click_any, wait_time, interval_time):
+            return True
 
         if raise_err:
             raise TimeoutError("`click_any_elements` 操作超时")
@@ -1205,15 +1812,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            # 存在
-            if self.__send_data("existsElement", xpath) == "true":
-                time.sleep(interval_time)
-            # 不存在
-            else:
-                return True
-        return False
+        # 不存在
+        return self.wait_until(lambda: self.__send_data("existsElement", xpath) != "true", wait_time, interval_time)
 
     def element_exists(self, xpath: str, wait_time: float = None, interval_time: float = None) -> bool:
         """
@@ -1230,15 +1830,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            # 失败
-            if self.__send_data("existsElement", xpath) != "true":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return True
-        return False
+        # 存在
+        return self.wait_until(lambda: self.__send_data("existsElement", xpath) == "true", wait_time, interval_time)
 
     def any_elements_exists(self, xpath_list: List[str], wait_time: float = None, interval_time: float = None) -> \
             Optional[str]:
@@ -1256,14 +1849,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            for xpath in xpath_list:
-                result = self.element_exists(xpath, wait_time=0.05, interval_time=0.01)
-                if result:
-                    return xpath
-            time.sleep(interval_time)
-        return None
+        # 每轮一次批量请求检查所有元素
+        found = self.wait_any(xpath_list, wait_time, interval_time)
+        return found.condition.xpath if found else None
 
     def element_is_selected(self, xpath: str) -> bool:
         """
@@ -1303,19 +1891,20 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         else:
             raise RuntimeError(f"未知方向：{direction}")
 
-        end_time = time.time() + wait_time
         current_count = 0
-        while time.time() < end_time and current_count < count:
-            current_count += 1
+        # 每次查找不超过剩余的等待时间
+        with deadline(wait_time) as limit:
+            while not limit.expired and current_count < count:
+                current_count += 1
 
-            if self.click_element(xpath, wait_time=1, interval_time=0.5, raise_err=False):
-                return True
+                if self.click_element(xpath, wait_time=1, interval_time=0.5, raise_err=False):
+                    return True
 
-            if end_flag_xpath and self.element_exists(end_flag_xpath, wait_time=1, interval_time=0.5):
-                return False
+                if end_flag_xpath and self.element_exists(end_flag_xpath, wait_time=1, interval_time=0.5):
+                    return False
 
-            self.swipe(_start_point, _end_point, duration)
-            time.sleep(interval_time)
+                self.swipe(_start_point, _end_point, duration)
+                _traced_sleep(min(interval_time, limit.remaining()))
 
         if raise_err:
             raise TimeoutError("`click_element_by_slide` 操作超时")
@@ -1324,12 +1913,15 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
     # #############
     #   文件传输   #
     # #############
-    def push_file(self, origin_path: str, to_path: str) -> bool:
+    def push_file(self, origin_path: Union[str, BinaryIO], to_path: str, progress: _Progress = None) -> bool:
         """
         将电脑文件传输到手机端
 
-        :param origin_path: 源文件路径
+        文件分块流式发送，内存占用与文件大小无关
+
+        :param origin_path: 源文件路径，或者以二进制模式打开的文件对象（从当前位置发送到末尾）
         :param to_path: 目标存储路径
+        :param progress: 进度回调 ``progress(已发送字节数, 总字节数)``
         :return:
 
         ex:
@@ -1339,18 +1931,19 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not to_path.startswith("/storage/emulated/0/"):
             to_path = "/storage/emulated/0/" + to_path
 
-        with open(origin_path, "rb") as file:
-            data = file.read()
-
-        return self.__push_file("pushFile", to_path, data) == "true"
+        with _open_binary(origin_path, "rb") as file:
+            return self.__push_file("pushFile", to_path, file, progress) == "true"
 
-    def pull_file(self, remote_path: str, local_path: str) -> bool:
+    def pull_file(self, remote_path: str, local_path: Union[str, BinaryIO], progress: _Progress = None) -> bool:
         """
         将手机文件传输到电脑端
 
+        数据分块直接写入本地文件，内存占用与文件大小无关
+
         :param remote_path: 手机端文件路径
-        :param local_path: 电脑本地文件存储路径
-        :return:
+        :param local_path: 电脑本地文件存储路径，或者以二进制模式打开的文件对象
+        :param progress: 进度回调 ``progress(已接收字节数, 总字节数)``
+        :return: 手机端文件不存在时返回 False，本地文件不会被创建
 
         ex:
         remote_path: /storage/emulated/0/Android/data/com.aibot.client/files/code479259.png
@@ -1359,13 +1952,64 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if not remote_path.startswith("/storage/emulated/0/"):
             remote_path = "/storage/emulated/0/" + remote_path
 
-        data = self.__pull_file("pullFile", remote_path)
-        if data == b"null":
-            return False
+        return self.__pull_file(local_path, progress, "pullFile", remote_path)
 
-        with open(local_path, "wb") as file:
-            file.write(data)
-        return True
+    def connected_devices(self) -> List["AndroidBotMain"]:
+        """
+        当前服务连接的所有设备对应的脚本实例，多进程模式下只包含本进程的设备
+
+        :return:
+
+        .. seealso::
+            :data:`AiBote.device_registry`: 按 android_id、投屏组号等查找设备
+        """
+        return [device for device in device_registry.devices("android") if device.server is self.server]
+
+    def broadcast_push(self, origin_path: str, to_path: str, devices: Iterable["AndroidBotMain"] = None,
+                       concurrency: int = 8) -> List[PushResult]:
+        """
+        将同一个文件并发推送到多台设备，文件只映射(mmap)一次，所有设备共享同一块内存发送
+
+        :param origin_path: 源文件路径
+        :param to_path: 目标存储路径
+        :param devices: 目标设备的脚本实例，默认当前服务连接的所有设备
+        :param concurrency: 最大并发推送数量，默认 8
+        :return: 每台设备的推送结果，顺序与 devices 一致
+
+        .. seealso::
+            :meth:`push_file`
+        """
+        if concurrency < 1:
+            raise ValueError("`concurrency` must be >= 1.")
+
+        if not to_path.startswith("/storage/emulated/0/"):
+            to_path = "/storage/emulated/0/" + to_path
+
+        devices = self.connected_devices() if devices is None else list(devices)
+        if not devices:
+            return []
+
+        with open(origin_path, "rb") as file:
+            # 空文件无法 mmap
+            if os.fstat(file.fileno()).st_size:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                buffer = b""
+
+        def push(device: AndroidBotMain) -> bool:
+            view = memoryview(buffer)
+            try:
+                return device.__push_file("pushFile", to_path, view) == "true"
+            finally:
+                # 推送失败时异常的 traceback 仍引用着这个视图，显式释放后 mmap 才能关闭
+                view.release()
+
+        try:
+            results = device_registry.dispatch(devices, push, concurrency=concurrency)
+            return [PushResult(result.device, bool(result.result), result.elapsed, result.error) for result in results]
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
 
     # #############
     #   投屏相关   #
@@ -1376,7 +2020,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
 
         :return:
         """
-        return self.__send_data("getGroup")
+        group_id = self.__send_data("getGroup")
+        device_registry.update(self, group_id=group_id)
+        return group_id
 
     def get_identifier(self) -> str:
         """
@@ -1384,7 +2030,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
 
         :return:
         """
-        return self.__send_data("get_identifier")
+        identifier = self.__send_data("get_identifier")
+        device_registry.update(self, identifier=identifier)
+        return identifier
 
     def get_title(self) -> str:
         """
@@ -1413,16 +2061,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            # 失败
-            if self.__send_data("startApp", name) != "true":
-                time.sleep(interval_time)
-            # 成功
-            else:
-                return True
-        # 超时
-        return False
+        # 成功
+        return self.wait_until(lambda: self.__send_data("startApp", name) == "true", wait_time, interval_time)
 
     def app_is_running(self, app_name: str) -> bool:
         """
@@ -1464,7 +2104,24 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         获取 Android 设备 ID
         :return: Android 设备 ID 字符串
         """
-        return self.__send_data("getAndroidId")
+        android_id = self.__send_data("getAndroidId")
+        device_registry.update(self, android_id=android_id)
+        return android_id
+
+    def identify(self) -> Dict[str, str]:
+        """
+        一次网络往返获取 android_id、投屏组号和投屏编号，并登记到设备注册表
+
+        :return: {"android_id": ..., "group_id": ..., "identifier": ...}
+
+        .. seealso::
+            :data:`AiBote.device_registry`
+        """
+        responses = self._send_batch([("getAndroidId",), ("getGroup",), ("get_identifier",)])
+        keys = dict(zip(("android_id", "group_id", "identifier"),
+                        [response.decode("utf8").strip() for response in responses]))
+        device_registry.update(self, **keys)
+        return keys
 
     def get_window_size(self) -> Dict[str, float]:
         """
@@ -1506,7 +2163,7 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         end_time = datetime.now().timestamp() + wait_time
         while datetime.now().timestamp() < end_time:
             self.show_toast("等待中...", 1)
-            time.sleep(interval_time)
+            _traced_sleep(interval_time)
 
     def send_keys(self, text: str) -> bool:
         """
@@ -1871,10 +2528,9 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         
         
         # 获取AndroidId 用作hid相关函数区分手机设备
-        global _AndroidId
-        _AndroidId = self.get_android_id()
+        android_id = self.get_android_id()
         for AndroidId in _AndroidIds:
-            if AndroidId == _AndroidId:
+            if AndroidId == android_id:
                 return True
 
         return False
@@ -1896,7 +2552,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_press(_AndroidId, angle, x, y) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_press(self._session.android_id, angle, x, y) == "true"
 
     def hid_move(self, x: float, y: float, duration: float) -> bool:
         """
@@ -1908,7 +2565,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_move(_AndroidId, angle, x, y, duration) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_move(self._session.android_id, angle, x, y, duration) == "true"
 
     def hid_release(self) -> bool:
         """
@@ -1917,7 +2575,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_release(_AndroidId, angle) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_release(self._session.android_id, angle) == "true"
     
     def hid_click(self, x: float, y: float) -> bool:
         """
@@ -1928,7 +2587,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_click(_AndroidId, angle, x, y) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_click(self._session.android_id, angle, x, y) == "true"
     
     def hid_double_click(self, x: float, y: float) -> bool:
         """
@@ -1939,7 +2599,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_double_click(_AndroidId, angle, x, y) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_double_click(self._session.android_id, angle, x, y) == "true"
     
     def hid_long_click(self, x: float, y: float, duration: float) -> bool:
         """
@@ -1951,7 +2612,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_long_click(_AndroidId, angle, x, y, duration) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_long_click(self._session.android_id, angle, x, y, duration) == "true"
     
     def hid_swipe(self, startX: float, startY: float, endX: float, endY: float, duration: float) -> bool:
         """
@@ -1965,7 +2627,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return: True或者False
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_swipe(_AndroidId, angle, startX, startY, endX, endY, duration) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_swipe(self._session.android_id, angle, startX, startY, endX, endY, duration) == "true"
     
     def hid_gesture(self, gesture_path: List[_Point_Tuple], duration: float) -> bool:
         """
@@ -1976,7 +2639,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return:
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_gesture(_AndroidId, angle, gesture_path, duration) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_gesture(self._session.android_id, angle, gesture_path, duration) == "true"
     
     def hid_gestures(self, gestures_path: List[dict['duration': float, _Point_Tuple]]) -> bool:
         """
@@ -1986,7 +2650,8 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         :return:
         """
         angle = self.get_rotation_angle()
-        return _WindowsBot.hid_gestures(_AndroidId, angle, gestures_path) == "true"
+        self._frame_cache.invalidate()
+        return _WindowsBot.hid_gestures(self._session.android_id, angle, gestures_path) == "true"
 
     def close_driver(self) -> None:
         """
@@ -2080,8 +2745,16 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         # self.request.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65535)
         self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)  # 发送缓冲区 10M
 
+        # 登记设备标识，便于通过 device_registry 查找
+        if self.identify_on_connect:
+            self.identify()
+
         # 执行脚本
-        self.script_main()
+        if self.profiler is not None:
+            with self.profiler.profile(self, self._session.address):
+                self.script_main()
+        else:
+            self.script_main()
 
     @abc.abstractmethod
     def script_main(self):
@@ -2089,10 +2762,13 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         """
 
     @classmethod
-    def execute(cls, listen_port: int, multi: int = 1):
+    def execute(cls, listen_port: int, multi: int = 1, profile: str = None):
         """
         多线程启动 Socket 服务，执行脚本
 
+        :param listen_port: 脚本监听的端口
+        :param multi: 工作进程数量，默认 1；大于 1 时启动多个子进程共享监听端口，子进程意外退出后自动重启
+        :param profile: 性能分析结果的输出目录，设置后采样分析每台设备的 script_main，服务停止时输出折叠调用栈
         :return:
         """
 
@@ -2106,11 +2782,13 @@ class AndroidBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle
         address_info = \
             socket.getaddrinfo(None, listen_port, socket.AF_INET, socket.SOCK_STREAM, 0, socket.AI_PASSIVE)[0]
         *_, socket_address = address_info
-        # 启动 Socket 服务
-        sock = _ThreadingTCPServer(socket_address, cls, bind_and_activate=True)
-        sock.request_queue_size = int(getattr(cls, "request_queue_size", 5))
-        print(f"Server stared on {socket_address[0]}:{socket_address[1]}")
-        print("服务已启动")
-        print("等待设备连接...")
-
-        sock.serve_forever()
+
+        if multi > 1 and os.name == "nt":
+            # Windows 不支持 SO_REUSEPORT，多个进程无法均衡地共享端口
+            logger.warning("Windows 不支持多进程共享端口，`multi` 参数无效，使用单进程启动")
+            multi = 1
+
+        if multi == 1:
+            _serve(cls, socket_address, profile)
+        else:
+            multiprocess(multi, lambda: spawn.Process(target=_serve, args=(cls, socket_address, profile)))
@@ -0,0 +1,773 @@
+import abc
+import asyncio
+import json
+import os
+import socket
+from typing import Optional, Dict, List, Union, BinaryIO
+
+from loguru import logger
+
+from ._AndroidBot import spawn, Log_Format, Point, Point2s, _Point_Tuple, _sub_colors_text, _algorithm_args, \
+    _parse_point, _parse_points, _parse_rect, _open_binary
+from ._frame import Frame
+from ._ocr import OcrData, OcrResult, parse_ocr
+from ._codec import encode_request, encode_request_prefix, stream_size, read_frame_async, read_length_async, \
+    read_into_file_async, FILE_CHUNK_SIZE, _Progress
+from ._logging import PAYLOAD_LIMIT, configure_bot_logging, payload, session_logger
+from ._multiprocess import SHUTDOWN_TIMEOUT, multiprocess, stop_loop_on_signals
+from ._utils import _protect, _Region, _Algorithm, _SubColors
+from ._wait import async_wait_until
+
+
+class AsyncAndroidBotMain(metaclass=_protect("handle", "execute")):
+    """
+    asyncio 版本的 AndroidBotMain
+
+    单线程事件循环驱动所有设备，等待类方法按自适应间隔使用 ``asyncio.sleep`` 让出执行权，适合同时连接大量设备的场景。
+    命令名称与响应解析同 :class:`AndroidBotMain`，所有命令方法都需要 ``await``。
+    """
+    raise_err = False
+    wait_timeout = 3  # seconds
+    interval_timeout = 0.5  # seconds
+    adaptive_wait = True  # 等待类方法是否自适应退避轮询，False 时按 interval_timeout 固定间隔轮询
+
+    log_level = "INFO"
+    log_format = Log_Format
+    log_payload_limit = PAYLOAD_LIMIT  # 收发数据日志最多显示的字节数
+    log_payload_sample = 1.0  # 收发数据日志的采样比例，0-1
+    log_enqueue = True  # 是否在后台线程写入日志
+
+    log = logger
+
+    # 基础存储路径
+    _base_path = "/storage/emulated/0/Android/data/com.aibot.client/files/"
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._lock = asyncio.Lock()
+        self.reader = reader
+        self.writer = writer
+        self.client_address = writer.get_extra_info("peername")[:2]
+        self.log = session_logger("android", "%s:%s" % self.client_address)
+        self._wire_log = self.log.bind(payload=True)
+
+    async def __send_data_return_bytes(self, *args) -> bytes:
+        data = encode_request(args)
+        try:
+            async with self._lock:
+                self._wire_log.debug("---> {}", payload(data))
+                self.writer.write(data)
+                await self.writer.drain()
+                data = await read_frame_async(self.reader, self.client_address)
+                self._wire_log.debug("<--- {}", payload(data))
+        except Exception as e:
+            self.log.error("send/read tcp data error: " + str(e))
+            raise e
+        return data
+
+    async def __send_data(self, *args) -> str:
+        data = await self.__send_data_return_bytes(*args)
+        return data.decode("utf8").strip()
+
+    # #############
+    #   截图相关   #
+    # #############
+    async def save_screenshot(self, image_name: str, region: _Region = None,
+                              algorithm: _Algorithm = None) -> Optional[str]:
+        """
+        保存截图，返回图片地址(手机中)或者 None
+
+        .. seealso::
+            :meth:`AndroidBotMain.save_screenshot`
+        """
+        if image_name.find("/") != -1:
+            raise ValueError("`image_name` cannot contain `/`.")
+
+        if not region:
+            region = [0, 0, 0, 0]
+
+        response = await self.__send_data("saveScreenshot", self._base_path + image_name, *region,
+                                          *_algorithm_args(algorithm))
+        if response == "true":
+            return self._base_path + image_name
+        return None
+
+    async def take_screenshot(self, region: _Region = None, algorithm: _Algorithm = None,
+                              scale: float = 1.0) -> Optional[bytes]:
+        """
+        截图，返回图像字节格式或者 None
+
+        .. seealso::
+            :meth:`AndroidBotMain.take_screenshot`
+        """
+        if not region:
+            region = [0, 0, 0, 0]
+
+        response = await self.__send_data_return_bytes("takeScreenshot", *region, *_algorithm_args(algorithm), scale)
+        if response == b'null':
+            return None
+        return response
+
+    # #############
+    #   色值相关   #
+    # #############
+    async def capture(self, region: _Region = None, scale: float = 1.0) -> Optional[Frame]:
+        """
+        截图并在本地解码为 :class:`Frame`
+
+        .. seealso::
+            :meth:`AndroidBotMain.capture`
+        """
+        data = await self.take_screenshot(region, None, scale)
+        if data is None:
+            return None
+        origin = (region[0], region[1]) if region else (0, 0)
+        # 解码整张截图耗时较长，放到线程池中执行，不阻塞其他设备的协程
+        return await asyncio.get_running_loop().run_in_executor(
+            None, Frame.from_bytes, data, origin, scale, lambda x, y: Point(x=x, y=y, driver=self))
+
+    async def get_color(self, point: _Point_Tuple) -> Optional[str]:
+        """
+        获取指定坐标点的色值
+
+        .. seealso::
+            :meth:`AndroidBotMain.get_color`
+        """
+        response = await self.__send_data("getColor", point[0], point[1])
+        if response == "null":
+            return None
+        return response
+
+    async def find_color(self, color: str, sub_colors: _SubColors = None, region: _Region = None,
+                         similarity: float = 0.9, wait_time: float = None, interval_time: float = None,
+                         raise_err: bool = None) -> Optional[Point]:
+        """
+        获取指定色值的坐标点，返回坐标或者 None
+
+        .. seealso::
+            :meth:`AndroidBotMain.find_color`
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        if not region:
+            region = [0, 0, 0, 0]
+
+        sub_colors_str = _sub_colors_text(sub_colors)
+
+        async def find() -> Optional[Point]:
+            return _parse_point(await self.__send_data("findColor", color, sub_colors_str, *region, similarity), self)
+
+        point = await async_wait_until(find, wait_time, interval_time, self.adaptive_wait)
+        if point is not None:
+            return point
+        # 超时
+        if raise_err:
+            raise TimeoutError("`find_color` 操作超时")
+        return None
+
+    async def compare_color(self, main_x: float, main_y: float, color: str, sub_colors: _SubColors = None,
+                            region: _Region = None, similarity: float = 0.9) -> bool:
+        """
+        比较指定坐标点的颜色值
+
+        .. seealso::
+            :meth:`AndroidBotMain.compare_color`
+        """
+        if not region:
+            region = [0, 0, 0, 0]
+
+        return await self.__send_data("compareColor", main_x, main_y, color, _sub_colors_text(sub_colors),
+                                      *region, similarity) == "true"
+
+    # #############
+    #   找图相关   #
+    # #############
+    async def find_image(self, image_name, region: _Region = None, algorithm: _Algorithm = None,
+                         similarity: float = 0.9, wait_time: float = None, interval_time: float = None,
+                         raise_err: bool = None) -> Optional[Point]:
+        """
+        寻找图片坐标，返回图片坐标或者 None
+
+        .. seealso::
+            :meth:`AndroidBotMain.find_image`
+        """
+        result = await self.find_images(image_name, region, algorithm, similarity, 1, wait_time, interval_time,
+                                        raise_err)
+        if not result:
+            return None
+        return result[0]
+
+    async def find_images(self, image_name, region: _Region = None, algorithm: _Algorithm = None,
+                          similarity: float = 0.9, multi: int = 1, wait_time: float = None,
+                          interval_time: float = None, raise_err: bool = None) -> List[Point]:
+        """
+        寻找图片坐标，返回坐标列表
+
+        .. seealso::
+            :meth:`AndroidBotMain.find_images`
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        if not region:
+            region = [0, 0, 0, 0]
+
+        algorithm_type, threshold, max_val = _algorithm_args(algorithm)
+
+        async def find() -> List[Point]:
+            return _parse_points(await self.__send_data("findImage", self._base_path + image_name, *region,
+                                                        similarity, algorithm_type, threshold, max_val, multi), self)
+
+        point_list = await async_wait_until(find, wait_time, interval_time, self.adaptive_wait)
+        if point_list:
+            return point_list
+        # 超时
+        if raise_err:
+            raise TimeoutError("`find_images` 操作超时")
+        return []
+
+    async def find_dynamic_image(self, interval_ti: int, region: _Region = None, wait_time: float = None,
+                                 interval_time: float = None, raise_err: bool = None) -> List[Point]:
+        """
+        找动态图，返回坐标列表
+
+        .. seealso::
+            :meth:`AndroidBotMain.find_dynamic_image`
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        if not region:
+            region = [0, 0, 0, 0]
+
+        async def find() -> List[Point]:
+            return _parse_points(await self.__send_data("findAnimation", interval_ti, *region), self)
+
+        point_list = await async_wait_until(find, wait_time, interval_time, self.adaptive_wait)
+        if point_list:
+            return point_list
+        # 超时
+        if raise_err:
+            raise TimeoutError("`find_dynamic_image` 操作超时")
+        return []
+
+    # ################
+    #   坐标操作相关   #
+    # ################
+    async def click(self, point: _Point_Tuple, offset_x: float = 0, offset_y: float = 0) -> bool:
+        """点击坐标"""
+        return await self.__send_data("click", point[0] + offset_x, point[1] + offset_y) == "true"
+
+    async def double_click(self, point: _Point_Tuple, offset_x: float = 0, offset_y: float = 0) -> bool:
+        """双击坐标"""
+        return await self.__send_data("doubleClick", point[0] + offset_x, point[1] + offset_y) == "true"
+
+    async def long_click(self, point: _Point_Tuple, duration: float, offset_x: float = 0,
+                         offset_y: float = 0) -> bool:
+        """长按坐标，duration 单位秒"""
+        return await self.__send_data("longClick", point[0] + offset_x, point[1] + offset_y,
+                                      duration * 1000) == "true"
+
+    async def swipe(self, start_point: _Point_Tuple, end_point: _Point_Tuple, duration: float) -> bool:
+        """滑动坐标，duration 单位秒"""
+        return await self.__send_data("swipe", start_point[0], start_point[1], end_point[0], end_point[1],
+                                      duration * 1000) == "true"
+
+    async def gesture(self, gesture_path: List[_Point_Tuple], duration: float) -> bool:
+        """执行手势，duration 单位秒"""
+        gesture_path_str = "".join([f"{point[0]}/{point[1]}/\n" for point in gesture_path]).strip()
+        return await self.__send_data("dispatchGesture", gesture_path_str, duration * 1000) == "true"
+
+    async def press(self, point: _Point_Tuple, duration: float) -> bool:
+        """手指按下"""
+        return await self.__send_data("press", point[0], point[1], duration * 1000) == "true"
+
+    async def move(self, point: _Point_Tuple, duration: float) -> bool:
+        """手指移动"""
+        return await self.__send_data("move", point[0], point[1], duration * 1000) == "true"
+
+    async def release(self) -> bool:
+        """手指抬起"""
+        return await self.__send_data("release") == "true"
+
+    async def press_release(self, point: _Point_Tuple, duration: float) -> bool:
+        """按下屏幕坐标点并释放"""
+        if not await self.press(point, duration):
+            return False
+        await asyncio.sleep(duration)
+        return await self.release()
+
+    # ##############
+    #   OCR 相关   #
+    ################
+    async def __ocr_server(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0) -> OcrData:
+        if not region:
+            region = [0, 0, 0, 0]
+
+        # scale 仅支持区域识别
+        if region[2] == 0:
+            scale = 1.0
+
+        response = await self.__send_data("ocr", *region, *_algorithm_args(algorithm), scale)
+        # 文本框多时解析耗时较长，放到线程池中执行
+        return await asyncio.get_running_loop().run_in_executor(None, parse_ocr, response)
+
+    async def init_ocr_server(self, ip: str, port: int = 9752) -> bool:
+        """初始化 OCR 服务"""
+        return await self.__send_data("initOcr", ip, port) == "true"
+
+    async def get_text(self, region: _Region = None, algorithm: _Algorithm = None, scale: float = 1.0,
+                       as_result: bool = False) -> Union[List[str], OcrResult]:
+        """
+        通过 OCR 识别屏幕中的文字，返回文字列表，``as_result=True`` 时返回 :class:`OcrResult`
+
+        .. seealso::
+            :meth:`AndroidBotMain.get_text`
+        """
+        if not region:
+            region = [0, 0, 0, 0]
+
+        # scale 仅支持区域识别
+        if region[2] == 0:
+            scale = 1.0
+
+        ocr_data = await self.__ocr_server(region, algorithm, scale)
+        if as_result:
+            return OcrResult(ocr_data, region, scale, lambda x, y: Point(x=x, y=y, driver=self))
+        return list(ocr_data.texts)
+
+    async def find_text(self, text: str, region: _Region = None, algorithm: _Algorithm = None,
+                        scale: float = 1.0) -> List[Point]:
+        """
+        查找文字所在的坐标，返回坐标列表（坐标是文本区域中心位置）
+
+        .. seealso::
+            :meth:`AndroidBotMain.find_text`
+        """
+        return (await self.get_text(region, algorithm, scale, as_result=True)).find(text)
+
+    # #############
+    #   元素操作   #
+    ###############
+    async def __wait_response(self, method_name: str, succeed, wait_time: float, interval_time: float,
+                              raise_err: bool, *args):
+        """
+        轮询发送命令直到 succeed(response) 为真，超时返回 None
+
+        :return: 成功时的响应
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        response = await async_wait_until(lambda: self.__send_data(*args), wait_time, interval_time,
+                                          self.adaptive_wait, succeed)
+        if succeed(response):
+            return response
+        # 超时
+        if raise_err:
+            raise TimeoutError(f"`{method_name}` 操作超时")
+        return None
+
+    async def get_element_rect(self, xpath: str, wait_time: float = None, interval_time: float = None,
+                               raise_err: bool = None) -> Optional[Point2s]:
+        """获取元素位置，返回元素区域左上角和右下角坐标"""
+        response = await self.__wait_response("get_element_rect", lambda r: r != "-1|-1|-1|-1", wait_time,
+                                              interval_time, raise_err, "getElementRect", xpath)
+        if response is None:
+            return None
+        return _parse_rect(response, self)
+
+    async def get_element_desc(self, xpath: str, wait_time: float = None, interval_time: float = None,
+                               raise_err: bool = None) -> Optional[str]:
+        """获取元素描述"""
+        return await self.__wait_response("get_element_desc", lambda r: r != "null", wait_time, interval_time,
+                                          raise_err, "getElementDescription", xpath)
+
+    async def get_element_text(self, xpath: str, wait_time: float = None, interval_time: float = None,
+                               raise_err: bool = None) -> Optional[str]:
+        """获取元素文本"""
+        return await self.__wait_response("get_element_text", lambda r: r != "null", wait_time, interval_time,
+                                          raise_err, "getElementText", xpath)
+
+    async def set_element_text(self, xpath: str, text: str, wait_time: float = None, interval_time: float = None,
+                               raise_err: bool = None) -> bool:
+        """设置元素文本"""
+        return await self.__wait_response("set_element_text", lambda r: r == "true", wait_time, interval_time,
+                                          raise_err, "setElementText", xpath, text) is not None
+
+    async def click_element(self, xpath: str, wait_time: float = None, interval_time: float = None,
+                            raise_err: bool = None) -> bool:
+        """点击元素"""
+        return await self.__wait_response("click_element", lambda r: r == "true", wait_time, interval_time,
+                                          raise_err, "clickElement", xpath) is not None
+
+    async def click_any_elements(self, xpath_list: List[str], wait_time: float = None, interval_time: float = None,
+                                 raise_err: bool = None) -> bool:
+        """遍历点击列表中的元素，直到任意一个元素返回 True"""
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        if raise_err is None:
+            raise_err = self.raise_err
+
+        async def click_any() -> bool:
+            for xpath in xpath_list:
+                if await self.__send_data("clickElement", xpath) == "true":
+                    return True
+            return False
+
+        if await async_wait_until(click_any, wait_time, interval_time, self.adaptive_wait):
+            return True
+
+        if raise_err:
+            raise TimeoutError("`click_any_elements` 操作超时")
+        return False
+
+    async def scroll_element(self, xpath: str, direction: int = 0) -> bool:
+        """滚动元素，0 向上滑动，1 向下滑动"""
+        return await self.__send_data("scrollElement", xpath, direction) == "true"
+
+    async def element_not_exists(self, xpath: str, wait_time: float = None, interval_time: float = None) -> bool:
+        """元素是否不存在"""
+        return await self.__wait_response("element_not_exists", lambda r: r != "true", wait_time, interval_time,
+                                          False, "existsElement", xpath) is not None
+
+    async def element_exists(self, xpath: str, wait_time: float = None, interval_time: float = None) -> bool:
+        """元素是否存在"""
+        return await self.__wait_response("element_exists", lambda r: r == "true", wait_time, interval_time,
+                                          False, "existsElement", xpath) is not None
+
+    async def any_elements_exists(self, xpath_list: List[str], wait_time: float = None,
+                                  interval_time: float = None) -> Optional[str]:
+        """遍历列表中的元素，返回第一个存在的元素 xpath 或者 None"""
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        async def find_any() -> Optional[str]:
+            for xpath in xpath_list:
+                if await self.__send_data("existsElement", xpath) == "true":
+                    return xpath
+            return None
+
+        return await async_wait_until(find_any, wait_time, interval_time, self.adaptive_wait)
+
+    async def element_is_selected(self, xpath: str) -> bool:
+        """元素是否选中"""
+        return await self.__send_data("isSelectedElement", xpath) == "true"
+
+    # #############
+    #   文件传输   #
+    # #############
+    async def push_file(self, origin_path: Union[str, BinaryIO], to_path: str, progress: _Progress = None) -> bool:
+        """将电脑文件传输到手机端，分块流式发送，参数同 :meth:`AndroidBotMain.push_file`"""
+        if not to_path.startswith("/storage/emulated/0/"):
+            to_path = "/storage/emulated/0/" + to_path
+
+        loop = asyncio.get_running_loop()
+        with _open_binary(origin_path, "rb") as file:
+            size = stream_size(file)
+            data = encode_request_prefix(("pushFile", to_path), size)
+            start = file.tell()
+            try:
+                async with self._lock:
+                    self._wire_log.debug("---> {}<{} bytes>", payload(data), size)
+                    self.writer.write(data)
+                    await self.writer.drain()
+                    sent = 0
+                    while sent < size:
+                        count = await loop.sendfile(self.writer.transport, file, start + sent,
+                                                    min(FILE_CHUNK_SIZE, size - sent))
+                        if count == 0:
+                            raise EOFError(f"文件长度不足，预期 {size} 字节，实际 {sent} 字节")
+                        sent += count
+                        if progress:
+                            progress(sent, size)
+                    data = await read_frame_async(self.reader, self.client_address)
+                    self._wire_log.debug("<--- {}", payload(data))
+            except Exception as e:
+                self.log.error("send/read tcp data error: " + str(e))
+                raise e
+        return data.decode("utf8").strip() == "true"
+
+    async def pull_file(self, remote_path: str, local_path: Union[str, BinaryIO], progress: _Progress = None) -> bool:
+        """将手机文件传输到电脑端，分块写入本地文件，参数同 :meth:`AndroidBotMain.pull_file`"""
+        if not remote_path.startswith("/storage/emulated/0/"):
+            remote_path = "/storage/emulated/0/" + remote_path
+
+        data = encode_request(("pullFile", remote_path))
+        try:
+            async with self._lock:
+                self._wire_log.debug("---> {}", payload(data))
+                self.writer.write(data)
+                await self.writer.drain()
+                length = await read_length_async(self.reader, self.client_address)
+                head = b""
+                if length == 4:
+                    # 文件不存在时返回 null
+                    head = await self.reader.readexactly(4)
+                    if head == b"null":
+                        self._wire_log.debug("<--- {}", payload(head))
+                        return False
+
+                with _open_binary(local_path, "wb") as file:
+                    if head:
+                        file.write(head)
+                        if progress:
+                            progress(length, length)
+                    else:
+                        await read_into_file_async(self.reader, file, length, progress=progress,
+                                                   client_address=self.client_address)
+                self._wire_log.debug("<--- <{} bytes>", length)
+        except Exception as e:
+            self.log.error("send/read tcp data error: " + str(e))
+            raise e
+        return True
+
+    # #############
+    #   设备操作   #
+    # #############
+    async def get_group_id(self) -> str:
+        """获取投屏组号"""
+        return await self.__send_data("getGroup")
+
+    async def get_identifier(self) -> str:
+        """获取投屏编号"""
+        return await self.__send_data("get_identifier")
+
+    async def get_title(self) -> str:
+        """获取投屏标题"""
+        return await self.__send_data("getTitle")
+
+    async def start_app(self, name: str, wait_time: float = None, interval_time: float = None) -> bool:
+        """启动 APP"""
+        return await self.__wait_response("start_app", lambda r: r == "true", wait_time, interval_time, False,
+                                          "startApp", name) is not None
+
+    async def app_is_running(self, app_name: str) -> bool:
+        """判断app是否正在运行(包含前后台)"""
+        return await self.__send_data("appIsRunnig", app_name) == "true"
+
+    async def get_installed_packages(self) -> List[str]:
+        """获取已安装app的包名(不包含系统APP)"""
+        response = await self.__send_data("getInstalledPackages")
+        if response == "null" or response == "":
+            return []
+        return response.split("|")
+
+    def get_device_ip(self) -> str:
+        """获取设备IP地址"""
+        return self.client_address[0]
+
+    async def get_android_id(self) -> str:
+        """获取 Android 设备 ID"""
+        return await self.__send_data("getAndroidId")
+
+    async def get_window_size(self) -> Dict[str, float]:
+        """获取屏幕大小"""
+        width, height = (await self.__send_data("getWindowSize")).split("|")
+        return {"width": float(width), "height": float(height)}
+
+    async def get_image_size(self, image_path) -> Dict[str, float]:
+        """获取图片大小"""
+        width, height = (await self.__send_data("getImageSize", image_path)).split("|")
+        return {"width": float(width), "height": float(height)}
+
+    async def show_toast(self, text: str, duration: float = 3) -> bool:
+        """Toast 弹窗，duration 单位秒"""
+        return await self.__send_data("showToast", text, duration * 1000) == "true"
+
+    async def send_keys(self, text: str) -> bool:
+        """发送文本，需要打开 AiBot 输入法"""
+        return await self.__send_data("sendKeys", text) == "true"
+
+    async def send_vk(self, vk: int) -> bool:
+        """发送 vk"""
+        return await self.__send_data("sendVk", vk) == "true"
+
+    async def back(self) -> bool:
+        """返回"""
+        return await self.__send_data("back") == "true"
+
+    async def home(self) -> bool:
+        """返回桌面"""
+        return await self.__send_data("home") == "true"
+
+    async def recent_tasks(self) -> bool:
+        """显示最近任务"""
+        return await self.__send_data("recents") == "true"
+
+    async def open_uri(self, uri: str) -> bool:
+        """唤起 app"""
+        return await self.__send_data("openUri", uri) == "true"
+
+    async def start_activity(self, action: str, uri: str = '', package_name: str = '', class_name: str = '',
+                             typ: str = '') -> bool:
+        """Intent 跳转"""
+        return await self.__send_data("startActivity", action, uri, package_name, class_name, typ) == "true"
+
+    async def get_activity(self) -> str:
+        """获取活动页"""
+        return await self.__send_data("getActivity")
+
+    async def get_package(self) -> str:
+        """获取包名"""
+        return await self.__send_data("getPackage")
+
+    async def set_clipboard_text(self, text: str) -> bool:
+        """设置剪切板文本"""
+        return await self.__send_data("setClipboardText", text) == "true"
+
+    async def get_clipboard_text(self) -> str:
+        """获取剪切板内容"""
+        return await self.__send_data("getClipboardText")
+
+    async def get_script_params(self) -> Optional[dict]:
+        """获取脚本参数"""
+        response = await self.__send_data("getScriptParam")
+        if response == "null":
+            return None
+        return json.loads(response)
+
+    async def url_request(self, url: str, request_type: str, headers: str = 'null', post_data: str = 'null') -> str:
+        """发送URL请求"""
+        return await self.__send_data("urlRequest", url, request_type, headers, post_data)
+
+    async def close_driver(self) -> None:
+        """关闭连接"""
+        await self.__send_data("closeDriver")
+
+    # ##########
+    #   其他   #
+    ############
+    async def handle(self) -> None:
+        sock = self.writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+
+        try:
+            # 执行脚本
+            await self.script_main()
+        except ConnectionAbortedError as e:
+            self.log.warning(str(e))
+        finally:
+            self.writer.close()
+
+    @abc.abstractmethod
+    async def script_main(self):
+        """脚本入口，由子类重写
+        """
+
+    @classmethod
+    async def serve(cls, listen_port: int) -> None:
+        """
+        在当前事件循环中启动 Socket 服务，每个设备连接创建一个实例并执行 script_main
+
+        收到 SIGINT / SIGTERM 时停止监听，断开所有连接并等待脚本完成清理后返回，最多等待 ``SHUTDOWN_TIMEOUT`` 秒
+
+        :param listen_port: 脚本监听的端口
+        :return:
+        """
+        connections: Dict[asyncio.Task, "AsyncAndroidBotMain"] = {}
+        stop = asyncio.Event()
+
+        async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            task = asyncio.current_task()
+            connections[task] = cls(reader, writer)
+            try:
+                await connections[task].handle()
+            except Exception:
+                # 主动断开引起的脚本异常是预期的
+                if not stop.is_set():
+                    raise
+            finally:
+                del connections[task]
+
+        server = await asyncio.start_server(on_connect, host=None, port=listen_port, family=socket.AF_INET,
+                                            reuse_address=True, reuse_port=os.name != "nt",
+                                            backlog=int(getattr(cls, "request_queue_size", 100)))
+        for sock in server.sockets:
+            address = sock.getsockname()
+            print(f"Server stared on {address[0]}:{address[1]}")
+        print("服务已启动")
+        print("等待设备连接...")
+
+        async with server:
+            with stop_loop_on_signals(asyncio.get_running_loop(), stop.set):
+                await stop.wait()
+            server.close()
+            for bot in connections.values():
+                bot.writer.close()
+            if connections:
+                _, pending = await asyncio.wait(list(connections), timeout=SHUTDOWN_TIMEOUT)
+                for task in pending:
+                    task.cancel()
+
+    @classmethod
+    def execute(cls, listen_port: int, multi: int = 1):
+        """
+        启动 asyncio Socket 服务，执行脚本
+
+        :param listen_port: 脚本监听的端口
+        :param multi: 工作进程数量，默认 1；大于 1 时每个子进程运行一个事件循环，共享监听端口
+        :return:
+        """
+        if listen_port < 0 or listen_port > 65535:
+            raise OSError("`listen_port` must be in 0-65535.")
+
+        if multi < 1:
+            raise ValueError("`multi` must be >= 1.")
+
+        if multi > 1 and os.name == "nt":
+            # Windows 不支持 SO_REUSEPORT，多个进程无法均衡地共享端口
+            logger.warning("Windows 不支持多进程共享端口，`multi` 参数无效，使用单进程启动")
+            multi = 1
+
+        if multi == 1:
+            _run(cls, listen_port)
+        else:
+            multiprocess(multi, lambda: spawn.Process(target=_run, args=(cls, listen_port)))
+
+
+def _run(bot_class: type, listen_port: int) -> None:
+    """
+    运行事件循环，多进程模式下作为子进程入口
+
+    :param bot_class: 脚本类
+    :param listen_port: 脚本监听的端口
+    :return:
+    """
+    configure_bot_logging(bot_class)
+    try:
+        asyncio.run(bot_class.serve(listen_port))
+    except KeyboardInterrupt:
+        pass
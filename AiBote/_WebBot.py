@@ -1,16 +1,35 @@
 import abc
+import base64
 import json
 import random
 import socket
 import socketserver
 import subprocess
-import sys
 import threading
-from typing import Optional, Tuple, Any, Literal
-
-from loguru import logger
-
+import time
+from typing import Optional, Tuple, Any, Iterable, Literal
+
+
+from ._codec import encode_request, to_driver_text, FrameReader
+from ._conditions import Element, Image, Color, WaitResult, _Condition, as_conditions, check_frame
+from ._frame import Frame
+from ._registry import device_registry
+from ._logging import PAYLOAD_LIMIT, configure_bot_logging, payload, session_logger
+from ._metrics import metrics_registry
+from ._multiprocess import close_connections, stop_on_signals
+from ._profiler import SamplingProfiler, start_profiling, stop_profiling
+from ._recording import SessionRecorder
+from ._trace import Tracer
 from ._utils import _protect, Point, _Point_Tuple
+from ._wait import Notifier, Waiter
+
+# 会改变页面内容的命令，执行后唤醒等待中的方法
+_SCREEN_COMMANDS = frozenset((
+    "goto", "newPage", "back", "forward", "refresh", "switchPage", "closePage", "clickElement", "clearElement",
+    "sendKeys", "sendVk", "setElementValue", "setElementAttribute", "uploadFile", "clickMouse",
+    "clickMouseByXpath", "moveMouse", "moveMouseByXpath", "wheelMouse", "wheelMouseByXpath", "clickAlert",
+    "executeScript",
+))
 
 
 class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
@@ -18,11 +37,17 @@ class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
     allow_reuse_address = True
 
 
-class WebBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "execute")):
+class WebBotMain(socketserver.BaseRequestHandler, Waiter, metaclass=_protect("handle", "execute")):
     raise_err = False
 
     wait_timeout = 3  # seconds
     interval_timeout = 0.5  # seconds
+    adaptive_wait = True  # 等待类方法是否自适应退避轮询，False 时按 interval_timeout 固定间隔轮询
+
+    collect_metrics = True  # 是否按命令统计次数、字节数、错误和耗时，见 metrics_registry
+    tracer: Optional[Tracer] = None  # 命令追踪，设置后记录每个方法调用、收发数据和等待休眠的耗时
+    profiler: Optional[SamplingProfiler] = None  # 采样分析器，execute(profile=...) 时自动设置
+    record_dir: Optional[str] = None  # 录制目录，设置后每个连接的请求和响应写入录制文件，可用 ReplaySimulator 回放
 
     log_path = ""
     log_level = "INFO"
@@ -30,56 +55,101 @@ class WebBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                  "<level>{level: <8}</level> | " \
                  "{thread.name: <8} | " \
                  "<cyan>{module}.{function}:{line}</cyan> | " \
+                 "<magenta>{extra[session]}</magenta> | " \
                  "<level>{message}</level>"  # 日志内容
+    log_payload_limit = PAYLOAD_LIMIT  # 收发数据日志最多显示的字节数
+    log_payload_sample = 1.0  # 收发数据日志的采样比例，0-1
+    log_enqueue = True  # 是否在后台线程写入日志
 
     def __init__(self, request, client_address, server):
         self._lock = threading.Lock()
-        self.log = logger
-
-        self.log.remove()
-        self.log.add(sys.stdout, level=self.log_level.upper(), format=self.log_format)
-
-        if self.log_path:
-            self.log.add(self.log_path, level=self.log_level.upper(), format=self.log_format,
-                         rotation='5 MB', retention='2 days')
-
-        super().__init__(request, client_address, server)
+        self._reader = FrameReader(request, client_address)
+        self._notifier = Notifier()
+
+        self._session = device_registry.register(self, "web", client_address)
+        self.log = session_logger("web", self._session.address)
+        self._wire_log = self.log.bind(payload=True)
+        self._metrics = metrics_registry.device("web", self._session.address) if self.collect_metrics else None
+        self._recorder = SessionRecorder.create(self.record_dir, "web", self._session.address) \
+            if self.record_dir else None
+        if self.tracer is not None:
+            self.tracer.instrument(self, self._session.address)
+        try:
+            super().__init__(request, client_address, server)
+        finally:
+            if self._recorder is not None:
+                self._recorder.close()
+            device_registry.unregister(self)
+            if self._metrics is not None:
+                metrics_registry.release(self._metrics)
+            if self.tracer is not None:
+                self.tracer.flush()
 
     def __send_data(self, *args) -> str:
-        args_len = ""
-        args_text = ""
-
-        for argv in args:
-            if argv is None:
-                argv = ""
-            elif isinstance(argv, bool) and argv:
-                argv = "true"
-            elif isinstance(argv, bool) and not argv:
-                argv = "false"
-
-            argv = str(argv)
-            args_text += argv
-            args_len += str(len(bytes(argv, 'utf8'))) + "/"
-
-        data = (args_len.strip("/") + "\n" + args_text).encode("utf8")
+        request_data = encode_request(args, to_driver_text)
 
         try:
             with self._lock:
-                self.log.debug(rf"->>> {data}")
-                self.request.sendall(data)
-                response = self.request.recv(65535)
-                if response == b"":
-                    raise ConnectionAbortedError(f"{self.client_address[0]}:{self.client_address[1]} 客户端断开链接。")
-                data_length, data = response.split(b"/", 1)
-                while int(data_length) > len(data):
-                    data += self.request.recv(65535)
-                self.log.debug(rf"<<<- {data}")
+                start = time.perf_counter()
+                self._wire_log.debug("->>> {}", payload(request_data))
+                self.request.sendall(request_data)
+                data = self._reader.read_frame()
+                self._session.touch()
+                # 输入失败时页面没有变化，不唤醒等待中的方法
+                if args[0] in _SCREEN_COMMANDS and data != b"false":
+                    self._notifier.notify()
+                self._wire_log.debug("<<<- {}", payload(data))
+                if self._metrics is not None:
+                    self._metrics.record(args[0], start, len(request_data), len(data))
+                if self._recorder is not None:
+                    self._recorder.record(request_data, data, start, time.perf_counter())
 
             return data.decode("utf8").strip()
         except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record(args[0], start, len(request_data), 0, True)
             self.log.error("send/read tcp data error: " + str(e))
             raise e
 
+    # #############
+    #   等待相关   #
+    # #############
+    def wait_any(self, conditions: Iterable[_Condition], wait_time: float = None,
+                 interval_time: float = None) -> Optional[WaitResult]:
+        """
+        等待任意一个条件满足，条件可以是元素、图片、颜色的组合
+
+        每轮轮询只截图一次，图片和颜色条件在同一张截图上本地判断；按列表顺序检查，找到第一个满足的条件即返回。
+        Web 驱动没有 OCR，不支持文字条件。
+
+        :param conditions: 条件列表，字符串为元素 xpath，其他为 :class:`AiBote.Image`、:class:`AiBote.Color`
+        :param wait_time: 等待时间，默认取 self.wait_timeout
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout
+        :return: WaitResult(下标, 条件, 结果) 或者 None
+        """
+        conditions = as_conditions(conditions, (Element, Image, Color))
+
+        def check() -> Optional[WaitResult]:
+            frames = []
+            for index, condition in enumerate(conditions):
+                if isinstance(condition, Element):
+                    value = self.__send_data("getElementRect", condition.xpath) != "null"
+                else:
+                    if not frames:
+                        frames.append(self.__capture())
+                    value = check_frame(condition, frames[0])
+                if value:
+                    return WaitResult(index, condition, value)
+            return None
+
+        return self.wait_until(check, wait_time, interval_time)
+
+    def __capture(self) -> Optional[Frame]:
+        data = self.save_screenshot()
+        if data is None:
+            return None
+        return Frame.from_bytes(base64.b64decode(data))
+
     #############
     # 页面和导航 #
     #############
@@ -680,7 +750,11 @@ class WebBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)  # 发送缓冲区 10M
 
         # 执行脚本
-        self.script_main()
+        if self.profiler is not None:
+            with self.profiler.profile(self, self._session.address):
+                self.script_main()
+        else:
+            self.script_main()
 
     @abc.abstractmethod
     def script_main(self):
@@ -688,13 +762,14 @@ class WebBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         """
 
     @classmethod
-    def execute(cls, listen_port: int, local: bool = True, driver_params: dict = None):
+    def execute(cls, listen_port: int, local: bool = True, driver_params: dict = None, profile: str = None):
         """
         多线程启动 Socket 服务
 
         :param listen_port: 脚本监听的端口
         :param local: 脚本是否部署在本地
         :param driver_params: Web 驱动启动参数
+        :param profile: 性能分析结果的输出目录，设置后采样分析每个连接的 script_main，服务停止时输出折叠调用栈
         :return:
         """
 
@@ -732,4 +807,12 @@ class WebBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
             print("等待驱动连接...")
         # 启动 Socket 服务
         sock = _ThreadingTCPServer(socket_address, cls, bind_and_activate=True)
-        sock.serve_forever()
+        configure_bot_logging(cls)
+        with stop_on_signals(sock):
+            profiling = start_profiling(cls, profile)
+            try:
+                sock.serve_forever()
+            finally:
+                close_connections(sock)
+                sock.server_close()
+                stop_profiling(profiling)
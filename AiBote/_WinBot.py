@@ -1,16 +1,30 @@
 import abc
+import contextlib
+import os
 import socket
 import socketserver
 import subprocess
-import sys
+import tempfile
 import threading
 import time
 import re
-from ast import literal_eval
-from typing import Optional, List, Tuple, Union
-
-from loguru import logger
-
+from typing import Optional, Dict, Iterable, List, Tuple, Union
+
+
+from ._codec import encode_request, to_driver_text, FrameReader
+from ._frame import Frame, FrameCache
+from ._matcher import apply_algorithm, to_gray
+from ._ocr import IncrementalOcr, OcrCache, OcrData, OcrResult, parse_ocr
+from ._ocr_backend import OcrBackend
+from ._conditions import Element, Image, Color, Text, WaitResult, _Condition, as_conditions, check_frame
+from ._wait import Notifier, Waiter
+from ._registry import device_registry
+from ._logging import PAYLOAD_LIMIT, configure_bot_logging, payload, session_logger
+from ._metrics import metrics_registry
+from ._multiprocess import close_connections, stop_on_signals
+from ._profiler import SamplingProfiler, start_profiling, stop_profiling
+from ._recording import SessionRecorder
+from ._trace import Tracer
 from ._utils import _protect, Point, _Region, _Algorithm, _SubColors
 from urllib import request, parse
 import json
@@ -18,16 +32,33 @@ import base64
 
 _Point_Tuple = Union[Point, Tuple[float, float]]
 
+# 会改变窗口内容的命令，执行后截图缓存失效
+_SCREEN_COMMANDS = frozenset((
+    "clickMouse", "moveMouse", "moveMouseRelative", "rollMouse", "sendKeys", "sendKeysByHwnd", "sendVk",
+    "sendVkByHwnd", "setWindowPos", "setWindowTop", "showWindow", "startProcess", "clickElement", "invokeElement",
+    "setElementFocus", "setElementValue", "setElementScroll",
+))
+
 class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
     daemon_threads = True
     allow_reuse_address = True
 
 
-class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "execute")):
+class WinBotMain(socketserver.BaseRequestHandler, Waiter, metaclass=_protect("handle", "execute")):
     raise_err = False
 
     wait_timeout = 3  # seconds
     interval_timeout = 0.5  # seconds
+    frame_cache_ttl = 0  # 截图缓存有效期(秒)，大于 0 时取色、找色、比色、本地找图共用一次截图，输入命令后自动失效
+    adaptive_wait = True  # 等待类方法是否自适应退避轮询，False 时按 interval_timeout 固定间隔轮询
+    ocr_cache: Optional[OcrCache] = None  # OCR 结果缓存，设置后识别区域截图未变化时不再请求 OCR 服务
+    ocr_backend: Optional[OcrBackend] = None  # 脚本端 OCR 后端，设置后截图在脚本端识别，不再经过驱动的 OCR 服务
+    incremental_ocr_tile = (128, 64)  # 增量 OCR 的分块大小 (宽, 高)
+
+    collect_metrics = True  # 是否按命令统计次数、字节数、错误和耗时，见 metrics_registry
+    tracer: Optional[Tracer] = None  # 命令追踪，设置后记录每个方法调用、收发数据和等待休眠的耗时
+    profiler: Optional[SamplingProfiler] = None  # 采样分析器，execute(profile=...) 时自动设置
+    record_dir: Optional[str] = None  # 录制目录，设置后每个连接的请求和响应写入录制文件，可用 ReplaySimulator 回放
 
     log_path = ""
     log_level = "INFO"
@@ -35,56 +66,105 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                  "<level>{level: <8}</level> | " \
                  "{thread.name: <8} | " \
                  "<cyan>{module}.{function}:{line}</cyan> | " \
+                 "<magenta>{extra[session]}</magenta> | " \
                  "<level>{message}</level>"  # 日志内容
+    log_payload_limit = PAYLOAD_LIMIT  # 收发数据日志最多显示的字节数
+    log_payload_sample = 1.0  # 收发数据日志的采样比例，0-1
+    log_enqueue = True  # 是否在后台线程写入日志
 
     def __init__(self, request, client_address, server):
         self._lock = threading.Lock()
-        self.log = logger
-
-        self.log.remove()
-        self.log.add(sys.stdout, level=self.log_level.upper(), format=self.log_format)
-
-        if self.log_path:
-            self.log.add(self.log_path, level=self.log_level.upper(), format=self.log_format,
-                         rotation='5 MB', retention='2 days')
-
-        super().__init__(request, client_address, server)
+        self._reader = FrameReader(request, client_address)
+        self._frame_cache = FrameCache()
+        self._notifier = Notifier()
+        self._incremental_ocr: Dict[tuple, IncrementalOcr] = {}
+
+        self._session = device_registry.register(self, "win", client_address)
+        self.log = session_logger("win", self._session.address)
+        self._wire_log = self.log.bind(payload=True)
+        self._metrics = metrics_registry.device("win", self._session.address) if self.collect_metrics else None
+        self._recorder = SessionRecorder.create(self.record_dir, "win", self._session.address) \
+            if self.record_dir else None
+        if self.tracer is not None:
+            self.tracer.instrument(self, self._session.address)
+        try:
+            super().__init__(request, client_address, server)
+        finally:
+            if self._recorder is not None:
+                self._recorder.close()
+            device_registry.unregister(self)
+            if self._metrics is not None:
+                metrics_registry.release(self._metrics)
+            if self.tracer is not None:
+                self.tracer.flush()
 
     def __send_data(self, *args) -> str:
-        args_len = ""
-        args_text = ""
-
-        for argv in args:
-            if argv is None:
-                argv = ""
-            elif isinstance(argv, bool) and argv:
-                argv = "true"
-            elif isinstance(argv, bool) and not argv:
-                argv = "false"
-
-            argv = str(argv)
-            args_text += argv
-            args_len += str(len(bytes(argv, 'utf8'))) + "/"
-
-        data = (args_len.strip("/") + "\n" + args_text).encode("utf8")
+        request_data = encode_request(args, to_driver_text)
 
         try:
             with self._lock:
-                self.log.debug(rf"->-> {data}")
-                self.request.sendall(data)
-                response = self.request.recv(65535)
-                if response == b"":
-                    raise ConnectionAbortedError(f"{self.client_address[0]}:{self.client_address[1]} 客户端断开链接。")
-                data_length, data = response.split(b"/", 1)
-                while int(data_length) > len(data):
-                    data += self.request.recv(65535)
-                self.log.debug(rf"<-<- {data}")
+                start = time.perf_counter()
+                self._wire_log.debug("->-> {}", payload(request_data))
+                self.request.sendall(request_data)
+                data = self._reader.read_frame()
+                self._session.touch()
+                if args[0] in _SCREEN_COMMANDS:
+                    self._frame_cache.invalidate()
+                    # 输入失败时屏幕没有变化，不唤醒等待中的方法
+                    if data != b"false":
+                        self._notifier.notify()
+                self._wire_log.debug("<-<- {}", payload(data))
+                if self._metrics is not None:
+                    self._metrics.record(args[0], start, len(request_data), len(data))
+                if self._recorder is not None:
+                    self._recorder.record(request_data, data, start, time.perf_counter())
 
             return data.decode("utf8").strip()
         except Exception as e:
+            if self._metrics is not None:
+                self._metrics.record(args[0], start, len(request_data), 0, True)
             self.log.error("send/read tcp data error: " + str(e))
             raise e
 
+    # #############
+    #   等待相关   #
+    # #############
+    def wait_any(self, hwnd: str, conditions: Iterable[_Condition], wait_time: float = None,
+                 interval_time: float = None, mode: bool = False) -> Optional[WaitResult]:
+        """
+        等待窗口中任意一个条件满足，条件可以是元素、图片、颜色、OCR 文字的组合
+
+        每轮轮询只截图一次，图片和颜色条件在同一张截图上本地判断；按列表顺序检查，找到第一个满足的条件即返回。
+
+        :param hwnd: 窗口句柄；
+        :param conditions: 条件列表，字符串为元素 xpath，其他为 :class:`AiBote.Image`、:class:`AiBote.Color`、
+            :class:`AiBote.Text`；
+        :param wait_time: 等待时间，默认取 self.wait_timeout；
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout；
+        :param mode: 截图和 OCR 的操作模式，后台 true，前台 false, 默认前台操作；
+        :return: WaitResult(下标, 条件, 结果) 或者 None
+        """
+        conditions = as_conditions(conditions)
+
+        def check() -> Optional[WaitResult]:
+            frames = []
+            for index, condition in enumerate(conditions):
+                if isinstance(condition, Element):
+                    value = self.__send_data("getElementRect", hwnd, condition.xpath) != "-1|-1|-1|-1"
+                elif isinstance(condition, Text):
+                    points = self.find_text(hwnd, condition.text, condition.region, condition.algorithm, mode)
+                    value = points[0] if points else None
+                else:
+                    # 整窗口截图只截一次，设置了 frame_cache_ttl 时使用缓存
+                    if not frames:
+                        frames.append(self.capture(hwnd, None, mode))
+                    value = check_frame(condition, frames[0])
+                if value:
+                    return WaitResult(index, condition, value)
+            return None
+
+        return self.wait_until(check, wait_time, interval_time)
+
     # #############
     #   窗口操作   #
     # #############
@@ -199,15 +279,11 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("getWindowPos", hwnd)
-            if response == "-1|-1|-1|-1":
-                time.sleep(interval_time)
-                continue
-            else:
-                x1, y1, x2, y2 = response.split("|")
-                return Point(x=float(x1), y=float(y1)), Point(x=float(x2), y=float(y2))
+        response = self.wait_until(lambda: self.__send_data("getWindowPos", hwnd), wait_time, interval_time,
+                                   lambda data: data != "-1|-1|-1|-1")
+        if response != "-1|-1|-1|-1":
+            x1, y1, x2, y2 = response.split("|")
+            return Point(x=float(x1), y=float(y1)), Point(x=float(x2), y=float(y2))
         # 超时
         return None
 
@@ -381,6 +457,12 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         :param mode: 操作模式，后台 true，前台 false, 默认前台操作；
         :return:
         """
+        if self.frame_cache_ttl > 0:
+            frame = self.capture(hwnd, None, mode)
+            # 坐标不在截图范围内时向驱动请求
+            if frame is not None and frame.contains((x, y)):
+                return frame.get_color((x, y))
+
         response = self.__send_data("getColor", hwnd, x, y, mode)
         if response == "null":
             return None
@@ -425,16 +507,25 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         else:
             sub_colors_str = "null"
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findColor", hwnd, color, sub_colors_str, *region, similarity, mode)
-            # 找色失败
-            if response == "-1.0|-1.0":
-                time.sleep(interval_time)
+        def find() -> Optional[Point]:
+            frame = self.capture(hwnd, None, mode) if self.frame_cache_ttl > 0 else None
+            if frame is not None:
+                found = frame.find_color(color, sub_colors, region, similarity)
             else:
-                # 找色成功
-                x, y = response.split("|")
-                return Point(x=float(x), y=float(y))
+                response = self.__send_data("findColor", hwnd, color, sub_colors_str, *region, similarity, mode)
+                found = None
+                if response != "-1.0|-1.0":
+                    x, y = response.split("|")
+                    found = Point(x=float(x), y=float(y))
+            if found is None:
+                # 找色失败，下一轮重新截图
+                self._frame_cache.invalidate()
+            return found
+
+        point = self.wait_until(find, wait_time, interval_time)
+        if point is not None:
+            # 找色成功
+            return point
         # 超时
         return None
 
@@ -449,10 +540,12 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                       mode: bool = False,
                       wait_time: float = None,
                       interval_time: float = None,
-                      raise_err: bool = None) -> Optional[Point]:
+                      raise_err: bool = None) -> bool:
         """
         比较指定坐标点的颜色值
 
+        在 wait_time 内轮询，直到颜色一致或超时；wait_time 为 0 时只比较一次
+
         :param hwnd: 窗口句柄；
         :param main_x: 主颜色所在的X坐标；
         :param main_y: 主颜色所在的Y坐标；
@@ -489,14 +582,20 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         else:
             sub_colors_str = "null"
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
+        def compare() -> bool:
+            frame = self.capture(hwnd, None, mode) if self.frame_cache_ttl > 0 else None
+            if frame is not None:
+                return frame.compare_color(main_x, main_y, color, sub_colors, similarity)
             return self.__send_data("compareColor", hwnd, main_x, main_y, color, sub_colors_str, *region, similarity,
                                     mode) == "true"
+
+        # 成功
+        if self.wait_until(compare, wait_time, interval_time):
+            return True
         # 超时
         if raise_err:
             raise TimeoutError("`compare_color` 操作超时")
-        return None
+        return False
 
     def extract_image_by_video(self, video_path: str, save_folder: str, jump_frame: int = 1) -> bool:
         """
@@ -561,26 +660,123 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                 threshold = 127
                 max_val = 255
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findImage", hwnd, image_path, *region, similarity, algorithm_type,
-                                        threshold, max_val, multi, mode)
-            # 找图失败
-            if response in ["-1.0|-1.0", "-1|-1"]:
-                time.sleep(interval_time)
-                continue
-            else:
-                # 找图成功，返回图片左上角坐标
-                # 分割出多个图片的坐标
-                image_points = response.split("/")
-                point_list = []
-                for point_str in image_points:
-                    x, y = point_str.split("|")
-                    point_list.append(Point(x=float(x), y=float(y)))
-                return point_list
+        response = self.wait_until(
+            lambda: self.__send_data("findImage", hwnd, image_path, *region, similarity, algorithm_type, threshold,
+                                     max_val, multi, mode),
+            wait_time, interval_time, lambda data: data not in ["-1.0|-1.0", "-1|-1"])
+        if response not in ["-1.0|-1.0", "-1|-1"]:
+            # 找图成功，返回图片左上角坐标
+            # 分割出多个图片的坐标
+            image_points = response.split("/")
+            point_list = []
+            for point_str in image_points:
+                x, y = point_str.split("|")
+                point_list.append(Point(x=float(x), y=float(y)))
+            return point_list
         # 超时
         return []
 
+    def capture(self, hwnd: str, region: _Region = None, mode: bool = False) -> Optional[Frame]:
+        """
+        截图并在本地解码为 :class:`Frame`，之后的取色、比色、找图都在本地完成
+
+        驱动与脚本运行在同一台电脑上，截图通过临时文件交换。需要安装 numpy 和 opencv-python（或 Pillow）
+
+        设置了 ``frame_cache_ttl`` 时按窗口句柄和操作模式从有效期内缓存的整窗口截图中截取 ``region``。
+
+        :param hwnd: 窗口句柄；
+        :param region: 截图区域，默认全屏；
+        :param mode: 操作模式，后台 true，前台 false, 默认前台操作；
+        :return: Frame 或者 None
+        """
+        if self.frame_cache_ttl > 0:
+            frame = self._frame_cache.get(self.frame_cache_ttl, lambda: self.__capture(hwnd, None, mode), (hwnd, mode))
+            if frame is not None and region and any(region):
+                return frame.sub_frame(region)
+            return frame
+        return self.__capture(hwnd, region, mode)
+
+    def __capture(self, hwnd: str, region: _Region, mode: bool) -> Optional[Frame]:
+        fd, save_path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        try:
+            if not self.save_screenshot(hwnd, save_path, region, None, mode):
+                return None
+            with open(save_path, "rb") as file:
+                data = file.read()
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(save_path)
+        if not data:
+            return None
+        origin = (region[0], region[1]) if region else (0, 0)
+        return Frame.from_bytes(data, origin, 1.0, lambda x, y: Point(x=x, y=y))
+
+    def invalidate_frame_cache(self) -> None:
+        """
+        使缓存的截图失效，下一次取色、找色、找图重新截图；输入命令会自动调用
+
+        :return:
+        """
+        self._frame_cache.invalidate()
+
+    def find_local_images(self, hwnd: str, template, region: _Region = None, algorithm: _Algorithm = None,
+                          similarity: float = 0.9, mode: bool = False, multi: int = 1, wait_time: float = None,
+                          interval_time: float = None) -> List[Point]:
+        """
+        本地找图，截图后在脚本端做模板匹配，参数语义同 :meth:`find_images`
+
+        :param hwnd: 窗口句柄；
+        :param template: 模板图片路径或 BGR/灰度数组；
+        :param region: 从指定区域中找图，默认全屏；
+        :param algorithm: 处理截图和模板所用的算法；
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9；
+        :param mode: 操作模式，后台 true，前台 false, 默认前台操作；
+        :param multi: 返回图片数量，默认1张；
+        :param wait_time: 等待时间，默认取 self.wait_timeout；
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout；
+        :return: 图片中心点坐标列表
+        """
+        result = self.match_images(hwnd, {"": template}, region, algorithm, similarity, mode, multi, wait_time,
+                                   interval_time)
+        return result.get("", [])
+
+    def match_images(self, hwnd: str, templates: Dict[str, object], region: _Region = None,
+                     algorithm: _Algorithm = None, similarity: float = 0.9, mode: bool = False, multi: int = 1,
+                     wait_time: float = None, interval_time: float = None) -> Dict[str, List[Point]]:
+        """
+        一次截图同时查找多个模板，任一模板找到即返回，轮询时每轮只截图一次
+
+        :param hwnd: 窗口句柄；
+        :param templates: {名称: 模板图片路径或数组}；
+        :param region: 截图区域，默认全屏；
+        :param algorithm: 处理截图和模板所用的算法；
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9；
+        :param mode: 操作模式，后台 true，前台 false, 默认前台操作；
+        :param multi: 每个模板最多返回的数量，默认1张；
+        :param wait_time: 等待时间，默认取 self.wait_timeout；
+        :param interval_time: 轮询间隔时间，默认取 self.interval_timeout；
+        :return: {名称: 中心点坐标列表}，超时返回空字典
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        def match() -> Optional[Dict[str, List[Point]]]:
+            frame = self.capture(hwnd, region, mode)
+            if frame is not None:
+                found = frame.match_images(templates, region, algorithm, similarity, multi)
+                if any(found.values()):
+                    return found
+            # 下一轮重新截图
+            self._frame_cache.invalidate()
+            return None
+
+        # 超时返回空字典
+        return self.wait_until(match, wait_time, interval_time) or {}
+
     def find_dynamic_image(self, hwnd: str, interval_ti: int, region: _Region = None, mode: bool = False,
                            wait_time: float = None, interval_time: float = None) -> List[Point]:
         """
@@ -607,48 +803,25 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if not region:
             region = [0, 0, 0, 0]
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("findAnimation", hwnd, interval_ti, *region, mode)
-            # 找图失败
-            if response == "-1.0|-1.0":
-                time.sleep(interval_time)
-                continue
-            else:
-                # 找图成功，返回图片左上角坐标
-                # 分割出多个图片的坐标
-                image_points = response.split("/")
-                point_list = []
-                for point_str in image_points:
-                    x, y = point_str.split("|")
-                    point_list.append(Point(x=float(x), y=float(y)))
-                return point_list
+        response = self.wait_until(lambda: self.__send_data("findAnimation", hwnd, interval_ti, *region, mode),
+                                   wait_time, interval_time, lambda data: data != "-1.0|-1.0")
+        if response != "-1.0|-1.0":
+            # 找图成功，返回图片左上角坐标
+            # 分割出多个图片的坐标
+            image_points = response.split("/")
+            point_list = []
+            for point_str in image_points:
+                x, y = point_str.split("|")
+                point_list.append(Point(x=float(x), y=float(y)))
+            return point_list
         # 超时
         return []
 
     # ##############
     #   OCR 相关   #
     # ##############
-    @staticmethod
-    def __parse_ocr(text: str) -> list:
-        """
-        解析 OCR 识别出出来的信息
-
-        :param text:
-        :return:
-        """
-        # pattern = re.compile(r'(\[\[\[).+?(\)])')
-        # matches = pattern.finditer(text)
-        #
-        # text_info_list = []
-        # for match in matches:
-        #     result_str = match.group()
-        #     text_info = literal_eval(result_str)
-        #     text_info_list.append(text_info)
-
-        return literal_eval(text)
-
-    def __ocr_server(self, hwnd: str, region: _Region = None, algorithm: _Algorithm = None, mode: bool = False) -> list:
+    def __ocr_server(self, hwnd: str, region: _Region = None, algorithm: _Algorithm = None, mode: bool = False,
+                     cache: bool = True) -> OcrData:
         """
         OCR 服务，通过 OCR 识别屏幕中文字
 
@@ -656,6 +829,7 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         :param region:
         :param algorithm:
         :param mode:
+        :param cache: 是否使用 ocr_cache
         :return:
         """
         if not region:
@@ -669,12 +843,25 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                 threshold = 127
                 max_val = 255
 
-        response = self.__send_data("ocr", hwnd, *region, algorithm_type, threshold, max_val, mode)
-        if response == "null" or response == "[]":
-            return []
-        return self.__parse_ocr(response)
+        if self.ocr_backend is not None:
+            frame = self.__capture(hwnd, region if region[2] else None, mode)
+            if frame is None:
+                return OcrData()
+            return self.__ocr_local(frame.image, algorithm, cache)
+
+        def recognize() -> OcrData:
+            return parse_ocr(self.__send_data("ocr", hwnd, *region, algorithm_type, threshold, max_val, mode))
+
+        if not cache or self.ocr_cache is None:
+            return recognize()
+
+        # 区域截图未变化时使用缓存的识别结果
+        frame = self.capture(hwnd, region if region[2] else None, mode)
+        if frame is None:
+            return recognize()
+        return self.ocr_cache.get(frame.crop(region), (algorithm_type, threshold, max_val), recognize)
 
-    def __ocr_server_by_file(self, image_path: str, region: _Region = None, algorithm: _Algorithm = None) -> list:
+    def __ocr_server_by_file(self, image_path: str, region: _Region = None, algorithm: _Algorithm = None) -> OcrData:
         """
         OCR 服务，通过 OCR 识别屏幕中文字
 
@@ -694,10 +881,84 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
                 threshold = 127
                 max_val = 255
 
-        response = self.__send_data("ocrByFile", image_path, *region, algorithm_type, threshold, max_val)
-        if response == "null" or response == "[]":
-            return []
-        return self.__parse_ocr(response)
+        if self.ocr_backend is not None:
+            with open(image_path, "rb") as file:
+                frame = Frame.from_bytes(file.read())
+            return self.__ocr_local(frame.crop(region), algorithm)
+
+        def recognize() -> OcrData:
+            return parse_ocr(self.__send_data("ocrByFile", image_path, *region, algorithm_type, threshold, max_val))
+
+        if self.ocr_cache is None:
+            return recognize()
+
+        # 驱动与脚本在同一台电脑上，直接读取图片计算哈希
+        try:
+            with open(image_path, "rb") as file:
+                frame = Frame.from_bytes(file.read())
+        except (OSError, ValueError):
+            return recognize()
+        return self.ocr_cache.get(frame.crop(region), (algorithm_type, threshold, max_val), recognize)
+
+    def __ocr_local(self, image: "np.ndarray", algorithm: _Algorithm = None, cache: bool = True) -> OcrData:
+        """
+        使用脚本端 OCR 后端识别，按驱动端相同的参数在本地处理图像
+
+        :param image: 识别区域的截图
+        :param algorithm:
+        :param cache: 是否使用 ocr_cache
+        :return:
+        """
+        if algorithm and any(algorithm):
+            image = apply_algorithm(to_gray(image), algorithm)
+
+        def recognize() -> OcrData:
+            return self.ocr_backend.recognize(image)
+
+        if not cache or self.ocr_cache is None:
+            return recognize()
+        return self.ocr_cache.get(image, ("local", tuple(algorithm or ())), recognize)
+
+    def __ocr_incremental(self, hwnd: str, region: _Region = None, algorithm: _Algorithm = None,
+                          mode: bool = False) -> OcrData:
+        """
+        增量 OCR，只识别与上一次截图相比变化的分块
+
+        :param hwnd:
+        :param region:
+        :param algorithm:
+        :param mode:
+        :return:
+        """
+        if not region:
+            region = [0, 0, 0, 0]
+
+        frame = self.capture(hwnd, region if region[2] else None, mode)
+        if frame is None:
+            return self.__ocr_server(hwnd, region, algorithm, mode)
+
+        key = (hwnd, tuple(region), tuple(algorithm or ()), mode)
+        state = self._incremental_ocr.get(key)
+        if state is None:
+            state = self._incremental_ocr[key] = IncrementalOcr(self.incremental_ocr_tile)
+
+        def recognize(rect) -> OcrData:
+            if rect is None:
+                return self.__ocr_server(hwnd, region, algorithm, mode, cache=False)
+            # 分块坐标换算为窗口坐标
+            left, top, right, bottom = rect
+            return self.__ocr_server(hwnd, [region[0] + left, region[1] + top, region[0] + right, region[1] + bottom],
+                                     algorithm, mode, cache=False)
+
+        return state.update(frame.crop(region), recognize)
+
+    def reset_incremental_ocr(self) -> None:
+        """
+        丢弃增量 OCR 保存的上一次结果，下一次 ``get_text(incremental=True)`` 整体识别
+
+        :return:
+        """
+        self._incremental_ocr.clear()
 
     def init_ocr_server(self, ip: str, port: int = 9752) -> bool:
         """
@@ -710,7 +971,8 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         return self.__send_data("initOcr", ip, port) == "true"
 
     def get_text(self, hwnd_or_image_path: str, region: _Region = None, algorithm: _Algorithm = None,
-                 mode: bool = False) -> List[str]:
+                 mode: bool = False, as_result: bool = False,
+                 incremental: bool = False) -> Union[List[str], OcrResult]:
         """
         通过 OCR 识别窗口/图片中的文字，返回文字列表
 
@@ -718,86 +980,52 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         :param region: 识别区域，默认全屏；
         :param algorithm: 处理图片/屏幕所用算法和参数，默认保存原图；
         :param mode: 操作模式，后台 true，前台 false, 默认前台操作；
-        :return:
+        :param as_result: 是否返回 :class:`OcrResult`，保留文本框坐标，可多次查询而不重新识别；
+        :param incremental: 增量识别，仅窗口句柄有效。区域按 ``incremental_ocr_tile`` 分块，与同一窗口、区域上一次的截图比较，
+            只识别变化的分块并与上一次的结果合并，适合长时间监控窗口；
+        :return: 文字列表或者 OcrResult
 
         .. seealso::
             :meth:`save_screenshot`: ``region`` 和 ``algorithm`` 的参数说明
 
         """
+        if not region:
+            region = [0, 0, 0, 0]
+
         if hwnd_or_image_path.isdigit():
             # 句柄
-            text_info_list = self.__ocr_server(hwnd_or_image_path, region, algorithm, mode)
+            if incremental:
+                ocr_data = self.__ocr_incremental(hwnd_or_image_path, region, algorithm, mode)
+            else:
+                ocr_data = self.__ocr_server(hwnd_or_image_path, region, algorithm, mode)
         else:
             # 图片
-            text_info_list = self.__ocr_server_by_file(hwnd_or_image_path, region, algorithm)
+            ocr_data = self.__ocr_server_by_file(hwnd_or_image_path, region, algorithm)
 
-        text_list = []
-        for text_info in text_info_list:
-            text = text_info[-1][0]
-            text_list.append(text)
-        return text_list
+        if as_result:
+            return OcrResult(ocr_data, region)
+        return list(ocr_data.texts)
 
     def find_text(self, hwnd_or_image_path: str, text: str, region: _Region = None, algorithm: _Algorithm = None,
-                  mode: bool = False) -> List[Point]:
+                  mode: bool = False, incremental: bool = False) -> List[Point]:
         """
-        通过 OCR 识别窗口/图片中的文字，返回文字列表
+        通过 OCR 识别窗口/图片中的文字，返回文字所在的坐标列表（坐标是文本区域中心位置）
+
+        同一窗口需要查找多个文字时，使用 ``get_text(hwnd, as_result=True)`` 识别一次再查询。
 
         :param hwnd_or_image_path: 句柄或者图片路径
         :param text: 要查找的文字
         :param region: 识别区域，默认全屏
         :param algorithm: 处理图片/屏幕所用算法和参数，默认保存原图
         :param mode: 操作模式，后台 true，前台 false, 默认前台操作
-        :return: 文字列表
+        :param incremental: 增量识别，见 :meth:`get_text`
+        :return: 坐标列表
 
         .. seealso::
             :meth:`save_screenshot`: ``region`` 和 ``algorithm`` 的参数说明
 
         """
-        if not region:
-            region = [0, 0, 0, 0]
-
-        if hwnd_or_image_path.isdigit():
-            # 句柄
-            text_info_list = self.__ocr_server(hwnd_or_image_path, region, algorithm, mode)
-        else:
-            # 图片
-            text_info_list = self.__ocr_server_by_file(hwnd_or_image_path, region, algorithm)
-
-        text_points = []
-        for text_info in text_info_list:
-            if text in text_info[-1][0]:
-                points, words_tuple = text_info
-
-                left, _, right, _ = points
-
-                # 文本区域起点坐标
-                start_x = left[0]
-                start_y = left[1]
-                # 文本区域终点坐标
-                end_x = right[0]
-                end_y = right[1]
-                # 文本区域中心点据左上角的偏移量
-                # 可能指定文本只是部分文本，要计算出实际位置(x轴)
-                width = end_x - start_x
-                height = end_y - start_y
-                words: str = words_tuple[0]
-
-                # 单字符宽度
-                single_word_width = width / len(words)
-                # 文本在整体文本的起始位置
-                pos = words.find(text)
-
-                offset_x = single_word_width * (pos + len(text) / 2)
-                offset_y = height / 2
-
-                # 计算文本区域中心坐标
-                text_point = Point(
-                    x=float(region[0] + start_x + offset_x),
-                    y=float(region[1] + start_y + offset_y),
-                )
-                text_points.append(text_point)
-
-        return text_points
+        return self.get_text(hwnd_or_image_path, region, algorithm, mode, True, incremental).find(text)
 
     # ##############
     #   元素操作   #
@@ -820,14 +1048,10 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("getElementName", hwnd, xpath)
-            if response == "null":
-                time.sleep(interval_time)
-                continue
-            else:
-                return response
+        response = self.wait_until(lambda: self.__send_data("getElementName", hwnd, xpath), wait_time, interval_time,
+                                   lambda data: data != "null")
+        if response != "null":
+            return response
         # 超时
         return None
 
@@ -848,14 +1072,10 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("getElementValue", hwnd, xpath)
-            if response == "null":
-                time.sleep(interval_time)
-                continue
-            else:
-                return response
+        response = self.wait_until(lambda: self.__send_data("getElementValue", hwnd, xpath), wait_time, interval_time,
+                                   lambda data: data != "null")
+        if response != "null":
+            return response
         # 超时
         return None
 
@@ -877,15 +1097,11 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("getElementRect", hwnd, xpath)
-            if response == "-1|-1|-1|-1":
-                time.sleep(interval_time)
-                continue
-            else:
-                x1, y1, x2, y2 = response.split("|")
-                return Point(x=float(x1), y=float(y1)), Point(x=float(x2), y=float(y2))
+        response = self.wait_until(lambda: self.__send_data("getElementRect", hwnd, xpath), wait_time, interval_time,
+                                   lambda data: data != "-1|-1|-1|-1")
+        if response != "-1|-1|-1|-1":
+            x1, y1, x2, y2 = response.split("|")
+            return Point(x=float(x1), y=float(y1)), Point(x=float(x2), y=float(y2))
         # 超时
         return None
 
@@ -906,14 +1122,10 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data("getElementWindow", hwnd, xpath)
-            if response == "null":
-                time.sleep(interval_time)
-                continue
-            else:
-                return response
+        response = self.wait_until(lambda: self.__send_data("getElementWindow", hwnd, xpath), wait_time, interval_time,
+                                   lambda data: data != "null")
+        if response != "null":
+            return response
         # 超时
         return None
 
@@ -935,16 +1147,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('clickElement', hwnd, xpath, typ)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('clickElement', hwnd, xpath, typ) != "false",
+            wait_time, interval_time)
 
     def invoke_element(self, hwnd: str, xpath: str, wait_time: float = None,
                        interval_time: float = None) -> bool:
@@ -963,16 +1168,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('invokeElement', hwnd, xpath)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('invokeElement', hwnd, xpath) != "false",
+            wait_time, interval_time)
 
     def set_element_focus(self, hwnd: str, xpath: str, wait_time: float = None,
                           interval_time: float = None) -> bool:
@@ -991,16 +1189,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('setElementFocus', hwnd, xpath)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('setElementFocus', hwnd, xpath) != "false",
+            wait_time, interval_time)
 
     def set_element_value(self, hwnd: str, xpath: str, value: str,
                           wait_time: float = None, interval_time: float = None) -> bool:
@@ -1020,16 +1211,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('setElementValue', hwnd, xpath, value)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('setElementValue', hwnd, xpath, value) != "false",
+            wait_time, interval_time)
 
     def scroll_element(self, hwnd: str, xpath: str, horizontal: int, vertical: int,
                        wait_time: float = None, interval_time: float = None) -> bool:
@@ -1050,16 +1234,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('setElementScroll', hwnd, xpath, horizontal, vertical)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('setElementScroll', hwnd, xpath, horizontal, vertical) != "false",
+            wait_time, interval_time)
 
     def is_selected(self, hwnd: str, xpath: str,
                     wait_time: float = None, interval_time: float = None) -> bool:
@@ -1078,16 +1255,9 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         if interval_time is None:
             interval_time = self.interval_timeout
 
-        end_time = time.time() + wait_time
-        while time.time() < end_time:
-            response = self.__send_data('isSelected', hwnd, xpath)
-            if response == "false":
-                time.sleep(interval_time)
-                continue
-            else:
-                return True
-        # 超时
-        return False
+        return self.wait_until(
+            lambda: self.__send_data('isSelected', hwnd, xpath) != "false",
+            wait_time, interval_time)
 
     def close_window(self, hwnd: str, xpath: str) -> bool:
         """
@@ -1767,7 +1937,11 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)  # 发送缓冲区 10M
 
         # 执行脚本
-        self.script_main()
+        if self.profiler is not None:
+            with self.profiler.profile(self, self._session.address):
+                self.script_main()
+        else:
+            self.script_main()
 
     @abc.abstractmethod
     def script_main(self):
@@ -1775,12 +1949,13 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
         """
 
     @classmethod
-    def execute(cls, listen_port: int, local: bool = True):
+    def execute(cls, listen_port: int, local: bool = True, profile: str = None):
         """
         多线程启动 Socket 服务
 
         :param listen_port: 脚本监听的端口
         :param local: 脚本是否部署在本地
+        :param profile: 性能分析结果的输出目录，设置后采样分析每个连接的 script_main，服务停止时输出折叠调用栈
         :return:
         """
 
@@ -1807,4 +1982,12 @@ class WinBotMain(socketserver.BaseRequestHandler, metaclass=_protect("handle", "
 
         # 启动 Socket 服务
         sock = _ThreadingTCPServer(socket_address, cls, bind_and_activate=True)
-        sock.serve_forever()
+        configure_bot_logging(cls)
+        with stop_on_signals(sock):
+            profiling = start_profiling(cls, profile)
+            try:
+                sock.serve_forever()
+            finally:
+                close_connections(sock)
+                sock.server_close()
+                stop_profiling(profiling)
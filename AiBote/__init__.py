@@ -1,5 +1,18 @@
 from ._AndroidBot import AndroidBotMain
+from ._AsyncAndroidBot import AsyncAndroidBotMain
+from ._conditions import Element, Image, Color, Text, WaitResult
+from ._frame import Frame
+from ._ocr import OcrResult, OcrMatch, OcrCache
+from ._ocr_backend import OcrBackend, RapidOcrBackend, ProcessPoolOcr
+from ._registry import device_registry, DeviceRegistry
+from ._metrics import metrics_registry, MetricsRegistry, MetricsExporter
+from ._profiler import SamplingProfiler
+from ._simulator import DeviceSimulator
+from ._recording import Recording, ReplaySimulator
+from ._templates import TemplateLibrary
+from ._trace import Tracer
+from ._wait import deadline
 from ._WinBot import WinBotMain
 from ._WebBot import WebBotMain
 
-__all__ = ["AndroidBotMain", "WinBotMain", "WebBotMain"]
+__all__ = ["AndroidBotMain", "AsyncAndroidBotMain", "WinBotMain", "WebBotMain", "DeviceSimulator", "Recording", "ReplaySimulator", "device_registry", "DeviceRegistry", "metrics_registry", "MetricsRegistry", "MetricsExporter", "SamplingProfiler", "Frame", "TemplateLibrary", "Tracer", "deadline", "Element", "Image", "Color", "Text", "WaitResult", "OcrResult", "OcrMatch", "OcrCache", "OcrBackend", "RapidOcrBackend", "ProcessPoolOcr"]
@@ -0,0 +1,321 @@
+"""
+Aibote 通信协议编解码
+
+请求格式：``len/len/len\\n`` + 参数字节依次拼接；
+响应格式：``len/`` + 数据。
+"""
+import asyncio
+import os
+import socket
+from typing import BinaryIO, Callable, Iterable, List, Optional, Tuple, Union
+
+_Bytes_Like = Union[bytes, bytearray, memoryview]
+# 传输进度回调 progress(已传输字节数, 总字节数)
+_Progress = Optional[Callable[[int, int], None]]
+
+# 单次接收的最大字节数
+RECV_CHUNK_SIZE = 65536
+# 文件流式传输的分块大小
+FILE_CHUNK_SIZE = 1024 * 1024
+# 响应头最大长度，超过即认为数据格式错误
+_MAX_HEADER_SIZE = 32
+
+
+def to_driver_text(argv) -> str:
+    """
+    WindowsDriver/WebDriver 的参数转换规则：None 转为空字符串，bool 转为 true/false
+
+    :param argv: 参数
+    :return:
+    """
+    if argv is None:
+        return ""
+    if argv is True:
+        return "true"
+    if argv is False:
+        return "false"
+    return str(argv)
+
+
+def _encode_parts(args: Iterable, to_text: Callable[[object], str]) -> List[memoryview]:
+    parts = []
+    for argv in args:
+        if isinstance(argv, (bytes, bytearray, memoryview)):
+            parts.append(memoryview(argv).cast("B"))
+        else:
+            parts.append(memoryview(to_text(argv).encode("utf8")))
+    return parts
+
+
+def _join_frame(header: bytes, parts: List[memoryview]) -> bytearray:
+    total = len(header)
+    for part in parts:
+        total += part.nbytes
+
+    buffer = bytearray(total)
+    view = memoryview(buffer)
+    offset = len(header)
+    view[:offset] = header
+    for part in parts:
+        end = offset + part.nbytes
+        view[offset:end] = part
+        offset = end
+    return buffer
+
+
+def encode_request(args: Iterable, to_text: Callable[[object], str] = str) -> bytearray:
+    """
+    将参数编码为一个完整的请求帧，一次性分配缓冲区，避免重复拼接
+
+    :param args: 参数列表，bytes/bytearray/memoryview 原样发送，其他类型经 to_text 转为字符串
+    :param to_text: 非字节参数的字符串转换函数
+    :return: 请求帧
+    """
+    parts = _encode_parts(args, to_text)
+    header = ("/".join([str(part.nbytes) for part in parts]) + "\n").encode("utf8")
+    return _join_frame(header, parts)
+
+
+def encode_request_prefix(args: Iterable, stream_size: int, to_text: Callable[[object], str] = str) -> bytearray:
+    """
+    编码以数据流作为最后一个参数的请求帧的前半部分
+
+    长度头中包含数据流的长度，返回值只包含长度头和 args，数据流由调用方随后分块发送。
+
+    :param args: 数据流之前的参数
+    :param stream_size: 数据流长度
+    :param to_text: 非字节参数的字符串转换函数
+    :return: 请求帧前半部分
+    """
+    parts = _encode_parts(args, to_text)
+    header = ("/".join([str(part.nbytes) for part in parts] + [str(stream_size)]) + "\n").encode("utf8")
+    return _join_frame(header, parts)
+
+
+def stream_size(file: BinaryIO) -> int:
+    """
+    文件对象从当前位置到末尾的字节数，不改变当前位置
+
+    :param file: 二进制文件对象
+    :return:
+    """
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END) - position
+    file.seek(position)
+    return size
+
+
+def encode_response(payload: Union[str, _Bytes_Like]) -> bytearray:
+    """
+    编码响应帧，供模拟客户端等场景使用
+
+    :param payload: 响应数据
+    :return: 响应帧
+    """
+    if isinstance(payload, str):
+        payload = payload.encode("utf8")
+    payload = memoryview(payload).cast("B")
+    header = f"{payload.nbytes}/".encode("utf8")
+    buffer = bytearray(len(header) + payload.nbytes)
+    buffer[:len(header)] = header
+    buffer[len(header):] = payload
+    return buffer
+
+
+def _disconnected(client_address: Tuple[str, int] = None) -> ConnectionAbortedError:
+    if client_address:
+        return ConnectionAbortedError(f"{client_address[0]}:{client_address[1]} 客户端断开链接")
+    return ConnectionAbortedError("客户端断开链接")
+
+
+class FrameReader:
+    """
+    按长度头读取响应帧
+
+    每个连接持有一个实例，未消费的多余字节保留到下一次读取，因此可以连续读取多个响应帧。
+    """
+
+    def __init__(self, sock: socket.socket, client_address: Tuple[str, int] = None,
+                 chunk_size: int = RECV_CHUNK_SIZE):
+        self._sock = sock
+        self._client_address = client_address
+        self._buffer = bytearray(chunk_size)
+        self._view = memoryview(self._buffer)
+        # 缓冲区中未消费数据的起止位置
+        self._start = 0
+        self._end = 0
+
+    def _fill(self) -> None:
+        """从 socket 读取数据追加到缓冲区"""
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._end == len(self._buffer):
+            # 缓冲区已满，把未消费数据移动到开头
+            pending = self._end - self._start
+            self._view[:pending] = self._view[self._start:self._end]
+            self._start, self._end = 0, pending
+
+        size = self._sock.recv_into(self._view[self._end:])
+        if size == 0:
+            raise _disconnected(self._client_address)
+        self._end += size
+
+    def read_length(self) -> int:
+        """
+        读取响应头，返回数据长度
+
+        :return:
+        """
+        while True:
+            pos = self._buffer.find(b"/", self._start, self._end)
+            if pos != -1:
+                break
+            if self._end - self._start > _MAX_HEADER_SIZE:
+                raise ValueError(f"响应头格式错误: {bytes(self._view[self._start:self._end])[:_MAX_HEADER_SIZE]}")
+            self._fill()
+
+        length = int(self._buffer[self._start:pos])
+        self._start = pos + 1
+        return length
+
+    def read_exactly_into(self, target: memoryview) -> None:
+        """
+        读取 len(target) 个字节写入 target，优先使用缓冲区中的剩余数据，其余直接 recv_into 到目标内存
+
+        :param target: 目标内存
+        :return:
+        """
+        need = target.nbytes
+        pending = self._end - self._start
+        copied = min(pending, need)
+        if copied:
+            target[:copied] = self._view[self._start:self._start + copied]
+            self._start += copied
+
+        while copied < need:
+            size = self._sock.recv_into(target[copied:])
+            if size == 0:
+                raise _disconnected(self._client_address)
+            copied += size
+
+    def read_frame(self) -> bytearray:
+        """
+        读取一个完整的响应帧，返回数据部分
+
+        数据内存按长度头一次分配，接收过程中不再拼接复制。
+
+        :return:
+        """
+        length = self.read_length()
+        data = bytearray(length)
+        self.read_exactly_into(memoryview(data))
+        return data
+
+    def read_into_file(self, file: BinaryIO, length: int, chunk_size: int = FILE_CHUNK_SIZE,
+                       progress: _Progress = None) -> None:
+        """
+        读取 length 个字节，按固定大小分块写入文件，内存占用与数据总长度无关
+
+        :param file: 二进制文件对象
+        :param length: 数据长度，通常由 :meth:`read_length` 得到
+        :param chunk_size: 分块大小
+        :param progress: 进度回调 ``progress(已接收字节数, 总字节数)``，每写入一块调用一次
+        :return:
+        """
+        written = 0
+        pending = min(self._end - self._start, length)
+        if pending:
+            file.write(self._view[self._start:self._start + pending])
+            self._start += pending
+            written = pending
+            if progress:
+                progress(written, length)
+
+        if written == length:
+            return
+
+        chunk = memoryview(bytearray(min(chunk_size, length - written)))
+        while written < length:
+            target = chunk[:min(chunk.nbytes, length - written)]
+            self.read_exactly_into(target)
+            file.write(target)
+            written += target.nbytes
+            if progress:
+                progress(written, length)
+
+
+async def read_length_async(reader: asyncio.StreamReader, client_address: Tuple[str, int] = None) -> int:
+    """
+    asyncio 版本的响应头读取，返回数据长度
+
+    :param reader: asyncio 流
+    :param client_address: 客户端地址，用于异常信息
+    :return:
+    """
+    try:
+        header = await reader.readuntil(b"/")
+    except asyncio.IncompleteReadError:
+        raise _disconnected(client_address) from None
+    return int(header[:-1])
+
+
+async def read_frame_async(reader: asyncio.StreamReader, client_address: Tuple[str, int] = None) -> bytes:
+    """
+    asyncio 版本的响应帧读取
+
+    :param reader: asyncio 流
+    :param client_address: 客户端地址，用于异常信息
+    :return: 数据部分
+    """
+    length = await read_length_async(reader, client_address)
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise _disconnected(client_address) from None
+
+
+async def read_into_file_async(reader: asyncio.StreamReader, file: BinaryIO, length: int,
+                               chunk_size: int = FILE_CHUNK_SIZE, progress: _Progress = None,
+                               client_address: Tuple[str, int] = None) -> None:
+    """
+    asyncio 版本的 :meth:`FrameReader.read_into_file`
+
+    :param reader: asyncio 流
+    :param file: 二进制文件对象
+    :param length: 数据长度
+    :param chunk_size: 分块大小
+    :param progress: 进度回调 ``progress(已接收字节数, 总字节数)``
+    :param client_address: 客户端地址，用于异常信息
+    :return:
+    """
+    written = 0
+    try:
+        while written < length:
+            chunk = await reader.readexactly(min(chunk_size, length - written))
+            file.write(chunk)
+            written += len(chunk)
+            if progress:
+                progress(written, length)
+    except asyncio.IncompleteReadError:
+        raise _disconnected(client_address) from None
+
+
+async def read_request_async(reader: asyncio.StreamReader) -> List[bytes]:
+    """
+    读取一个请求帧，返回参数列表，供模拟客户端使用
+
+    :param reader: asyncio 流
+    :return: 参数字节列表
+    """
+    header = await reader.readuntil(b"\n")
+    header = header[:-1]
+    if not header:
+        return []
+    lengths = [int(length) for length in header.split(b"/")]
+    body = await reader.readexactly(sum(lengths))
+    args = []
+    offset = 0
+    for length in lengths:
+        args.append(body[offset:offset + length])
+        offset += length
+    return args
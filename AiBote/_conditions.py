@@ -0,0 +1,126 @@
+"""
+等待条件：``wait_any`` 同时等待元素、图片、颜色、文字中的任意一个出现
+
+每轮轮询只截图一次，图片和颜色条件都在这张截图上本地判断；安卓端的元素和 OCR 条件与截图在同一次网络往返中批量发送。
+
+>>> result = self.wait_any([
+...     "com.aibot.client/android.widget.Button@text=确定",
+...     Image("img/close.png", region=(0, 0, 500, 500)),
+...     Color("#FF0000", region=(100, 100, 300, 300)),
+...     Text("登录成功"),
+... ])
+>>> if result:
+...     print(result.index, result.condition, result.value)
+"""
+from typing import Any, Iterable, List, NamedTuple, Optional, Union
+
+from ._utils import _Algorithm, _Region, _SubColors
+
+
+class Element(NamedTuple):
+    """
+    元素存在，直接传入字符串等同于 ``Element(xpath)``
+
+    :param xpath: 元素路径
+    """
+    xpath: str
+
+
+class Image(NamedTuple):
+    """
+    截图中找到模板图片，在脚本端本地匹配
+
+    :param template: 模板图片路径、BGR/灰度数组或模板库中的模板
+    :param region: 查找区域，默认全屏
+    :param algorithm: 处理截图和模板所用的算法
+    :param similarity: 相似度，0-1 的浮点数，默认 0.9
+    """
+    template: Any
+    region: _Region = None
+    algorithm: _Algorithm = None
+    similarity: float = 0.9
+
+
+class Color(NamedTuple):
+    """
+    截图中找到指定颜色，在脚本端本地查找
+
+    :param color: 颜色字符串，必须以 # 开头，例如：#008577
+    :param sub_colors: 辅助定位的其他颜色 ``[(offset_x, offset_y, color), ...]``
+    :param region: 查找区域，默认全屏
+    :param similarity: 相似度，0-1 的浮点数，默认 0.9
+    """
+    color: str
+    sub_colors: _SubColors = None
+    region: _Region = None
+    similarity: float = 0.9
+
+
+class Text(NamedTuple):
+    """
+    OCR 识别到指定文字
+
+    :param text: 要查找的文字
+    :param region: 识别区域，默认全屏
+    :param algorithm: 处理图片/屏幕所用算法和参数，默认保存原图
+    :param scale: 图片缩放率，仅安卓区域识别有效
+    """
+    text: str
+    region: _Region = None
+    algorithm: _Algorithm = None
+    scale: float = 1.0
+
+
+_Condition = Union[str, Element, Image, Color, Text]
+
+
+class WaitResult(NamedTuple):
+    """
+    wait_any 的结果
+
+    :param index: 满足的条件在列表中的下标，同一轮有多个条件满足时取下标最小的
+    :param condition: 满足的条件
+    :param value: 元素条件为 True，其他条件为找到的坐标
+    """
+    index: int
+    condition: Union[Element, Image, Color, Text]
+    value: Any
+
+
+def as_conditions(conditions: Iterable[_Condition], supported: tuple = (Element, Image, Color, Text)) -> list:
+    """
+    字符串转换为元素条件，并检查条件类型
+
+    :param conditions: 条件列表
+    :param supported: 支持的条件类型
+    :return:
+    """
+    result = []
+    for condition in conditions:
+        if isinstance(condition, str):
+            condition = Element(condition)
+        if not isinstance(condition, supported):
+            raise TypeError(f"不支持的等待条件: {condition!r}")
+        result.append(condition)
+    return result
+
+
+def needs_frame(conditions: List[_Condition]) -> bool:
+    """是否有需要截图判断的条件"""
+    return any(isinstance(condition, (Image, Color)) for condition in conditions)
+
+
+def check_frame(condition: Union[Image, Color], frame) -> Optional[Any]:
+    """
+    在截图上判断图片或颜色条件
+
+    :param condition: 图片或颜色条件
+    :param frame: 截图，None 表示截图失败
+    :return: 找到的坐标或者 None
+    """
+    if frame is None:
+        return None
+    if isinstance(condition, Image):
+        points = frame.find_images(condition.template, condition.region, condition.algorithm, condition.similarity)
+        return points[0] if points else None
+    return frame.find_color(condition.color, condition.sub_colors, condition.region, condition.similarity)
@@ -0,0 +1,372 @@
+"""
+截图帧：一次截图解码为 numpy 数组，在本地完成取色、比色、找色，避免逐点的网络往返
+
+需要安装 numpy 和 opencv-python（或 Pillow）：``pip install AiBote.py[image]``
+"""
+import io
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import cv2
+except ImportError:  # pragma: no cover
+    cv2 = None
+
+from ._utils import Point, _Algorithm, _Point_Tuple, _Region, _SubColors
+
+_Bytes_Like = Union[bytes, bytearray, memoryview]
+_Color_Check = Tuple[float, float, str]
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("本地图像处理需要 numpy，请执行 `pip install AiBote.py[image]`")
+
+
+def decode_image(data: _Bytes_Like) -> "np.ndarray":
+    """
+    将 PNG/JPG 等编码的图片解码为 BGR 格式的 numpy 数组
+
+    安装了 opencv 时直接在接收缓冲区上解码，不复制原始数据；否则使用 Pillow。
+
+    :param data: 图片字节
+    :return: (高, 宽, 3) 的 uint8 数组
+    """
+    _require_numpy()
+    if cv2 is not None:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("图片解码失败")
+        return image
+
+    try:
+        from PIL import Image
+    except ImportError:
+        raise ImportError("解码截图需要 opencv-python 或 Pillow，请执行 `pip install AiBote.py[image]`") from None
+    with Image.open(io.BytesIO(data)) as image:
+        return np.ascontiguousarray(np.asarray(image.convert("RGB"))[:, :, ::-1])
+
+
+def parse_color(color: str) -> "np.ndarray":
+    """
+    解析 ``#RRGGBB`` 格式的颜色
+
+    :param color: 颜色字符串
+    :return: BGR 顺序的数组
+    """
+    _require_numpy()
+    value = color.lstrip("#")
+    if len(value) != 6:
+        raise ValueError(f"颜色格式错误，必须为 #RRGGBB: {color}")
+    r, g, b = int(value[0:2], 16), int(value[2:4], 16), int(value[4:6], 16)
+    return np.array([b, g, r], dtype=np.int16)
+
+
+def _color_text(pixel) -> str:
+    b, g, r = (int(value) for value in pixel[:3])
+    return f"#{r:02X}{g:02X}{b:02X}"
+
+
+def _tolerance(similarity: float) -> float:
+    """相似度换算为每个通道允许的最大差值"""
+    return (1 - similarity) * 255
+
+
+class Frame:
+    """
+    解码后的截图，像素格式 BGR
+
+    截图可能只包含屏幕的一个区域并经过缩放，所有方法的坐标参数和返回值都是屏幕坐标，内部自动换算。
+
+    :param image: (高, 宽, 3) 的 uint8 数组
+    :param origin: 截图区域左上角在屏幕中的坐标
+    :param scale: 截图缩放率
+    :param point_factory: 创建返回坐标的函数，默认创建 :class:`Point`
+    """
+
+    def __init__(self, image: "np.ndarray", origin: Tuple[float, float] = (0, 0), scale: float = 1.0,
+                 point_factory: Callable[[float, float], Point] = None):
+        _require_numpy()
+        self.image = image
+        self.origin = origin
+        self.scale = scale
+        self.captured_at = time.monotonic()
+        self._point_factory = point_factory or Point
+        self._gray = None
+
+    @classmethod
+    def from_bytes(cls, data: _Bytes_Like, origin: Tuple[float, float] = (0, 0), scale: float = 1.0,
+                   point_factory: Callable[[float, float], Point] = None) -> "Frame":
+        """
+        从截图字节解码
+
+        :param data: 截图字节
+        :param origin: 截图区域左上角在屏幕中的坐标
+        :param scale: 截图缩放率
+        :param point_factory: 创建返回坐标的函数
+        :return:
+        """
+        return cls(decode_image(data), origin, scale, point_factory)
+
+    @property
+    def width(self) -> int:
+        return self.image.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.image.shape[0]
+
+    @property
+    def age(self) -> float:
+        """截图至今的秒数"""
+        return time.monotonic() - self.captured_at
+
+    @property
+    def gray(self) -> "np.ndarray":
+        """灰度图，首次访问时计算"""
+        if self._gray is None:
+            if cv2 is not None:
+                self._gray = cv2.cvtColor(self.image, cv2.COLOR_BGR2GRAY)
+            else:
+                # ITU-R BT.601，与 cv2.COLOR_BGR2GRAY 一致
+                weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+                self._gray = np.rint(self.image[:, :, :3] @ weights).astype(np.uint8)
+        return self._gray
+
+    def to_local(self, x: float, y: float) -> Tuple[int, int]:
+        """屏幕坐标换算为截图中的像素坐标"""
+        return int((x - self.origin[0]) * self.scale), int((y - self.origin[1]) * self.scale)
+
+    def to_screen(self, x: float, y: float) -> Point:
+        """截图中的像素坐标换算为屏幕坐标"""
+        return self._point_factory(x / self.scale + self.origin[0], y / self.scale + self.origin[1])
+
+    def local_region(self, region: _Region = None) -> Tuple[int, int, int, int]:
+        """
+        屏幕区域换算为截图中的区域，并裁剪到截图范围内
+
+        :param region: 屏幕区域，默认整张截图
+        :return: (left, top, right, bottom)
+        """
+        if not region or not any(region):
+            return 0, 0, self.width, self.height
+        left, top = self.to_local(region[0], region[1])
+        right, bottom = self.to_local(region[2], region[3])
+        return max(0, left), max(0, top), min(self.width, right), min(self.height, bottom)
+
+    def contains(self, point: _Point_Tuple) -> bool:
+        x, y = self.to_local(point[0], point[1])
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def get_color(self, point: _Point_Tuple) -> Optional[str]:
+        """
+        获取指定坐标点的色值
+
+        :param point: 坐标点
+        :return: 色值字符串(例如: #008577)，坐标不在截图范围内返回 None
+        """
+        x, y = self.to_local(point[0], point[1])
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        return _color_text(self.image[y, x])
+
+    def get_colors(self, points: Iterable[_Point_Tuple]) -> List[Optional[str]]:
+        """
+        批量获取多个坐标点的色值，一次数组索引完成
+
+        :param points: 坐标点列表
+        :return: 色值列表，不在截图范围内的坐标为 None
+        """
+        xs, ys, inside = self._local_points([(point[0], point[1]) for point in points])
+        pixels = self.image[ys[inside], xs[inside]]
+        colors: List[Optional[str]] = [None] * len(inside)
+        for index, pixel in zip(np.flatnonzero(inside), pixels):
+            colors[index] = _color_text(pixel)
+        return colors
+
+    def _local_points(self, points: List[Tuple[float, float]]):
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        xs = ((coords[:, 0] - self.origin[0]) * self.scale).astype(np.intp)
+        ys = ((coords[:, 1] - self.origin[1]) * self.scale).astype(np.intp)
+        inside = (xs >= 0) & (xs < self.width) & (ys >= 0) & (ys < self.height)
+        return xs, ys, inside
+
+    def check_colors(self, checks: Iterable[_Color_Check], similarity: float = 0.9) -> List[bool]:
+        """
+        多点比色，一次数组运算完成
+
+        :param checks: ``[(x, y, color), ...]``
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9，每个颜色通道的差值不超过 ``(1 - similarity) * 255`` 视为相同
+        :return: 每个点是否匹配，不在截图范围内的坐标为 False
+        """
+        checks = list(checks)
+        if not checks:
+            return []
+        xs, ys, inside = self._local_points([(x, y) for x, y, _ in checks])
+        expected = np.stack([parse_color(color) for _, _, color in checks])
+        actual = self.image[np.where(inside, ys, 0), np.where(inside, xs, 0), :3].astype(np.int16)
+        matched = np.abs(actual - expected).max(axis=1) <= _tolerance(similarity)
+        return (matched & inside).tolist()
+
+    def compare_color(self, main_x: float, main_y: float, color: str, sub_colors: _SubColors = None,
+                      similarity: float = 0.9) -> bool:
+        """
+        比较指定坐标点的颜色值，语义同设备端 compareColor
+
+        :param main_x: 主颜色所在的 X 坐标
+        :param main_y: 主颜色所在的 Y 坐标
+        :param color: 颜色字符串，必须以 # 开头，例如：#008577
+        :param sub_colors: 辅助定位的其他颜色 ``[(offset_x, offset_y, color), ...]``，偏移相对于主颜色坐标
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :return: 所有点都匹配返回 True
+        """
+        checks = [(main_x, main_y, color)]
+        for offset_x, offset_y, sub_color in sub_colors or ():
+            checks.append((main_x + offset_x, main_y + offset_y, sub_color))
+        return all(self.check_colors(checks, similarity))
+
+    def find_color(self, color: str, sub_colors: _SubColors = None, region: _Region = None,
+                   similarity: float = 0.9) -> Optional[Point]:
+        """
+        查找指定色值的坐标点，按行从上到下、从左到右返回第一个匹配点，语义同设备端 findColor
+
+        :param color: 颜色字符串，必须以 # 开头，例如：#008577
+        :param sub_colors: 辅助定位的其他颜色 ``[(offset_x, offset_y, color), ...]``
+        :param region: 查找区域，默认整张截图
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :return: 坐标或者 None
+        """
+        left, top, right, bottom = self.local_region(region)
+        if left >= right or top >= bottom:
+            return None
+
+        tolerance = _tolerance(similarity)
+        area = self.image[top:bottom, left:right, :3].astype(np.int16)
+        mask = (np.abs(area - parse_color(color)).max(axis=2) <= tolerance)
+        ys, xs = np.nonzero(mask)
+        if xs.size == 0:
+            return None
+        xs = xs + left
+        ys = ys + top
+
+        # 在候选点上逐个校验辅助颜色，每个辅助颜色一次数组运算
+        for offset_x, offset_y, sub_color in sub_colors or ():
+            sub_xs = xs + int(offset_x * self.scale)
+            sub_ys = ys + int(offset_y * self.scale)
+            inside = (sub_xs >= 0) & (sub_xs < self.width) & (sub_ys >= 0) & (sub_ys < self.height)
+            pixels = self.image[np.where(inside, sub_ys, 0), np.where(inside, sub_xs, 0), :3].astype(np.int16)
+            keep = inside & (np.abs(pixels - parse_color(sub_color)).max(axis=1) <= tolerance)
+            xs, ys = xs[keep], ys[keep]
+            if xs.size == 0:
+                return None
+
+        return self.to_screen(int(xs[0]), int(ys[0]))
+
+    def find_images(self, template, region: _Region = None, algorithm: _Algorithm = None,
+                    similarity: float = 0.9, multi: int = 1) -> List[Point]:
+        """
+        本地找图，返回匹配区域中心点坐标列表，语义同设备端 findImage
+
+        :param template: 模板图片路径或 BGR/灰度数组
+        :param region: 查找区域，默认整张截图
+        :param algorithm: 处理截图和模板所用的算法
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :param multi: 最多返回的数量，默认 1
+        :return:
+        """
+        from ._matcher import find_images
+        return find_images(self, template, region, algorithm, similarity, multi)
+
+    def match_images(self, templates: Dict[str, object], region: _Region = None, algorithm: _Algorithm = None,
+                     similarity: float = 0.9, multi: int = 1) -> Dict[str, List[Point]]:
+        """
+        一帧截图同时匹配多个模板，截图只预处理一次
+
+        :param templates: {名称: 模板图片路径或数组}
+        :param region: 查找区域，默认整张截图
+        :param algorithm: 处理截图和模板所用的算法
+        :param similarity: 相似度，0-1 的浮点数，默认 0.9
+        :param multi: 每个模板最多返回的数量，默认 1
+        :return: {名称: 中心点坐标列表}
+        """
+        from ._matcher import find_images_many
+        return find_images_many(self, templates, region, algorithm, similarity, multi)
+
+    def crop(self, region: _Region) -> "np.ndarray":
+        """
+        截取屏幕区域对应的图像，返回视图，不复制像素
+
+        :param region: 屏幕区域
+        :return:
+        """
+        left, top, right, bottom = self.local_region(region)
+        return self.image[top:bottom, left:right]
+
+    def sub_frame(self, region: _Region) -> "Frame":
+        """
+        截取屏幕区域为新的 Frame，与原截图共用像素，坐标仍是屏幕坐标
+
+        :param region: 屏幕区域
+        :return:
+        """
+        left, top, right, bottom = self.local_region(region)
+        origin = (left / self.scale + self.origin[0], top / self.scale + self.origin[1])
+        frame = Frame(self.image[top:bottom, left:right], origin, self.scale, self._point_factory)
+        frame.captured_at = self.captured_at
+        return frame
+
+    def __repr__(self):
+        return f"Frame(width={self.width}, height={self.height}, origin={self.origin}, scale={self.scale})"
+
+
+class FrameCache:
+    """
+    每个连接一份的截图缓存：有效期内的取色、找色、找图共用一次截图，输入命令后立即失效
+
+    按 key 分别缓存，WinBot 中 key 为 ``(hwnd, mode)``，AndroidBot 只有一个全屏截图。
+    截图期间如果发生了失效，截到的图不会写入缓存，避免点击之前的截图在点击之后被使用。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames: Dict[Any, Frame] = {}
+        # 每次失效加 1
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ttl: float, capture: Callable[[], Optional[Frame]], key: Any = None) -> Optional[Frame]:
+        """
+        取有效期内的截图，没有则调用 capture 截图
+
+        :param ttl: 有效期(秒)
+        :param capture: 截图函数
+        :param key: 缓存键
+        :return: Frame 或者 None
+        """
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None and frame.age < ttl:
+                self.hits += 1
+                return frame
+            self.misses += 1
+            generation = self._generation
+
+        frame = capture()
+        if frame is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._frames[key] = frame
+        return frame
+
+    def invalidate(self) -> None:
+        """使所有缓存的截图失效"""
+        with self._lock:
+            self._generation += 1
+            self._frames.clear()
@@ -0,0 +1,156 @@
+"""
+日志配置：每个进程只配置一次 loguru 的输出，连接建立时不再重新配置
+
+- 只配置一次：:func:`configure_logging` 参数不变时直接返回，只移除自己添加的输出，不影响用户添加的输出；
+- 连接上下文：每个连接使用 ``logger.bind(session=地址, kind=设备类型)`` 绑定的日志对象，日志格式中的 ``{extra[session]}`` 显示设备地址；
+- 延迟格式化：收发数据用 :func:`payload` 包装后作为参数传入，日志级别未启用时不会转换为字符串；
+- 截断和采样：数据最多显示 ``payload_limit`` 个字节，收发数据日志按 ``payload_sample`` 比例采样；
+- 异步输出：默认 ``enqueue=True``，日志在后台线程写入，不阻塞命令的收发。
+
+>>> class CustomWinScript(WinBotMain):
+...     log_level = "DEBUG"
+...     log_payload_limit = 128  # 收发数据最多显示 128 个字节
+...     log_payload_sample = 0.1  # 只记录 10% 的收发数据日志
+"""
+import random
+import sys
+import threading
+from typing import Any, Callable, List, Optional
+
+from loguru import logger
+
+# 收发数据日志默认显示的最大字节数
+PAYLOAD_LIMIT = 256
+
+_lock = threading.Lock()
+_config: Optional[tuple] = None
+_handler_ids: List[int] = []
+_default_removed = False
+_payload_limit = PAYLOAD_LIMIT
+
+
+class _Payload:
+    """收发数据，格式化时才截断并转换为字符串"""
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __str__(self):
+        return _preview(self.data, _payload_limit)
+
+
+def _preview(data: Any, limit: int) -> str:
+    if isinstance(data, (list, tuple)):
+        return "[" + ", ".join(_preview(item, limit) for item in data) + "]"
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    if isinstance(data, (bytes, bytearray, str)) and len(data) > limit:
+        return f"{data[:limit]!r}...<{len(data)} bytes>"
+    return repr(data) if isinstance(data, (bytes, bytearray, str)) else str(data)
+
+
+def payload(data: Any) -> _Payload:
+    """
+    包装收发数据，日志级别未启用时不做任何格式化
+
+    :param data: 请求、响应数据或响应列表
+    :return:
+    """
+    return _Payload(data)
+
+
+def _formatter(fmt: str) -> Callable[[dict], str]:
+    # 没有绑定连接的日志（例如启动服务时的日志）去掉格式中的连接地址
+    plain = fmt.replace("<magenta>{extra[session]}</magenta> | ", "").replace("{extra[session]} | ", "")
+    fmt += "\n{exception}"
+    plain += "\n{exception}"
+
+    def format_record(record: dict) -> str:
+        return fmt if "session" in record["extra"] else plain
+
+    return format_record
+
+
+def _sampler(rate: float) -> Callable[[dict], bool]:
+    def sample(record: dict) -> bool:
+        return "payload" not in record["extra"] or random.random() < rate
+
+    return sample
+
+
+def configure_logging(level: str = "INFO", fmt: str = None, path: str = "", rotation: str = "5 MB",
+                      retention: str = "2 days", payload_limit: int = PAYLOAD_LIMIT, payload_sample: float = 1.0,
+                      enqueue: bool = True) -> None:
+    """
+    配置日志输出到标准输出和日志文件，参数与上一次相同时不做任何操作
+
+    :param level: 日志级别
+    :param fmt: 日志格式，可以包含 ``{extra[session]}`` 显示连接地址
+    :param path: 日志文件路径，为空不保存文件
+    :param rotation: 日志文件分割条件
+    :param retention: 日志文件保留时间
+    :param payload_limit: 收发数据最多显示的字节数
+    :param payload_sample: 收发数据日志的采样比例，0-1
+    :param enqueue: 是否在后台线程写入日志
+    :return:
+    """
+    global _config, _default_removed, _payload_limit
+    config = (level.upper(), fmt, path, rotation, retention, payload_limit, payload_sample, enqueue)
+    if config == _config:
+        return
+    with _lock:
+        if config == _config:
+            return
+        # 移除 loguru 默认的 stderr 输出和上一次添加的输出，用户自己添加的输出保持不变
+        if not _default_removed:
+            _default_removed = True
+            try:
+                logger.remove(0)
+            except ValueError:
+                pass
+        for handler_id in _handler_ids:
+            try:
+                logger.remove(handler_id)
+            except ValueError:
+                pass
+        _handler_ids.clear()
+
+        _payload_limit = payload_limit
+        options = dict(level=config[0], filter=_sampler(payload_sample) if payload_sample < 1 else None,
+                       enqueue=enqueue)
+        if fmt:
+            options["format"] = _formatter(fmt)
+        _handler_ids.append(logger.add(sys.stdout, **options))
+        if path:
+            _handler_ids.append(logger.add(path, rotation=rotation, retention=retention, **options))
+        _config = config
+
+
+
+def configure_bot_logging(bot_class: type) -> None:
+    """
+    按脚本类的 ``log_*`` 属性配置日志输出，启动服务时调用一次，连接建立时只绑定自己的地址
+
+    日志文件：Android 脚本类为 ``log_storage`` 和 ``log_size``(MB)，保存到 ``./runtime.log``；
+    Windows / Web 脚本类为 ``log_path``，为空不保存文件
+
+    :param bot_class: 脚本类
+    :return:
+    """
+    if getattr(bot_class, "log_storage", False):
+        files = dict(path="./runtime.log", rotation=f"{bot_class.log_size} MB", retention="0 days")
+    else:
+        files = dict(path=getattr(bot_class, "log_path", ""))
+    configure_logging(bot_class.log_level, bot_class.log_format, payload_limit=bot_class.log_payload_limit,
+                      payload_sample=bot_class.log_payload_sample, enqueue=bot_class.log_enqueue, **files)
+
+def session_logger(kind: str, address: str):
+    """
+    绑定连接上下文的日志对象
+
+    :param kind: 设备类型，android / win / web
+    :param address: 客户端地址
+    :return:
+    """
+    return logger.bind(session=address, kind=kind)
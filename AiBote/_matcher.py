@@ -0,0 +1,328 @@
+"""
+本地找图：在截图帧上做归一化互相关(NCC)模板匹配，不再依赖设备端 findImage
+
+安装了 opencv 时使用 ``cv2.matchTemplate``，否则使用 numpy FFT 实现；同一帧匹配多个模板时，截图的预处理、
+FFT 和积分图只计算一次。
+"""
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import cv2
+except ImportError:  # pragma: no cover
+    cv2 = None
+
+from ._frame import Frame, _require_numpy, decode_image
+from ._utils import Point, _Algorithm, _Region
+
+# 自适应阈值算法的邻域大小和常数
+ADAPTIVE_BLOCK_SIZE = 11
+ADAPTIVE_C = 2
+
+# 模板图片路径、BGR/灰度数组或者模板库中的 Template
+_Template = Union[str, "np.ndarray", "Template"]
+
+
+class Match(NamedTuple):
+    """
+    一个匹配结果，坐标为屏幕坐标
+
+    :param x: 匹配区域左上角 x
+    :param y: 匹配区域左上角 y
+    :param width: 匹配区域宽度
+    :param height: 匹配区域高度
+    :param similarity: 相似度
+    """
+    x: float
+    y: float
+    width: float
+    height: float
+    similarity: float
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return self.x + self.width / 2, self.y + self.height / 2
+
+
+def load_image(path: str) -> "np.ndarray":
+    """
+    读取本地图片为 BGR 格式的数组
+
+    :param path: 图片路径
+    :return:
+    """
+    _require_numpy()
+    with open(path, "rb") as file:
+        data = file.read()
+    return decode_image(data)
+
+
+def to_gray(image: "np.ndarray") -> "np.ndarray":
+    """BGR 图像转灰度，已是灰度图则原样返回"""
+    if image.ndim == 2:
+        return image
+    if cv2 is not None:
+        return cv2.cvtColor(image[:, :, :3], cv2.COLOR_BGR2GRAY)
+    weights = np.array([0.114, 0.587, 0.299], dtype=np.float32)
+    return np.rint(image[:, :, :3] @ weights).astype(np.uint8)
+
+
+def _box_mean(image: "np.ndarray", size: int) -> "np.ndarray":
+    pad = size // 2
+    padded = np.pad(image.astype(np.float64), pad, mode="edge")
+    integral = np.pad(padded.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    total = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return total / (size * size)
+
+
+def _gaussian_mean(image: "np.ndarray", size: int) -> "np.ndarray":
+    # 与 OpenCV 相同的默认 sigma
+    sigma = 0.3 * ((size - 1) * 0.5 - 1) + 0.8
+    offsets = np.arange(size) - size // 2
+    kernel = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    kernel /= kernel.sum()
+    pad = size // 2
+    padded = np.pad(image.astype(np.float64), pad, mode="edge")
+    rows = sum(kernel[i] * padded[:, i:i + image.shape[1]] for i in range(size))
+    return sum(kernel[i] * rows[i:i + image.shape[0], :] for i in range(size))
+
+
+def apply_algorithm(gray: "np.ndarray", algorithm: _Algorithm = None) -> "np.ndarray":
+    """
+    按设备端的算法参数处理灰度图
+
+    ``algorithm`` 为空或全 0 时不处理；``threshold`` 和 ``max_val`` 同为 255 时只做灰度处理。
+
+    :param gray: 灰度图
+    :param algorithm: ``(algorithm_type, threshold, max_val)``，算法说明见 :meth:`AndroidBotMain.take_screenshot`
+    :return: uint8 灰度图
+    """
+    if not algorithm or not any(algorithm):
+        return gray
+    algorithm_type, threshold, max_val = algorithm
+    if algorithm_type in (5, 6):
+        threshold, max_val = 127, 255
+    if threshold == 255 and max_val == 255:
+        return gray
+
+    if algorithm_type in (5, 6):
+        if cv2 is not None:
+            method = cv2.ADAPTIVE_THRESH_MEAN_C if algorithm_type == 5 else cv2.ADAPTIVE_THRESH_GAUSSIAN_C
+            return cv2.adaptiveThreshold(gray, max_val, method, cv2.THRESH_BINARY, ADAPTIVE_BLOCK_SIZE, ADAPTIVE_C)
+        mean = _box_mean(gray, ADAPTIVE_BLOCK_SIZE) if algorithm_type == 5 else \
+            _gaussian_mean(gray, ADAPTIVE_BLOCK_SIZE)
+        return np.where(gray > mean - ADAPTIVE_C, max_val, 0).astype(np.uint8)
+
+    above = gray > threshold
+    if algorithm_type == 0:
+        return np.where(above, max_val, 0).astype(np.uint8)
+    if algorithm_type == 1:
+        return np.where(above, 0, max_val).astype(np.uint8)
+    if algorithm_type == 2:
+        return np.where(above, gray, 0).astype(np.uint8)
+    if algorithm_type == 3:
+        return np.where(above, 0, gray).astype(np.uint8)
+    if algorithm_type == 4:
+        return np.where(above, threshold, gray).astype(np.uint8)
+    raise ValueError(f"不支持的算法类型: {algorithm_type}")
+
+
+def _resize(image: "np.ndarray", scale: float) -> "np.ndarray":
+    if scale == 1:
+        return image
+    height = max(1, round(image.shape[0] * scale))
+    width = max(1, round(image.shape[1] * scale))
+    if cv2 is not None:
+        return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    rows = np.minimum((np.arange(height) / scale).astype(np.intp), image.shape[0] - 1)
+    cols = np.minimum((np.arange(width) / scale).astype(np.intp), image.shape[1] - 1)
+    return image[rows][:, cols]
+
+
+class _SearchImage:
+    """
+    预处理后的待搜索图像，缓存 FFT 和积分图，供多个模板复用
+    """
+
+    def __init__(self, image: "np.ndarray"):
+        self.image = image
+        self._data = image.astype(np.float64)
+        self._float32 = None
+        self._spectrum = {}
+        integral = np.pad(self._data.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        integral_sq = np.pad((self._data ** 2).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+        self._integrals = (integral, integral_sq)
+
+    def _window_sums(self, height: int, width: int):
+        def window(integral):
+            return integral[height:, width:] - integral[:-height, width:] - integral[height:, :-width] + \
+                   integral[:-height, :-width]
+
+        return window(self._integrals[0]), window(self._integrals[1])
+
+    def _fft(self):
+        if "image" not in self._spectrum:
+            shape = self._data.shape
+            self._spectrum["shape"] = (int(2 ** np.ceil(np.log2(shape[0]))) if shape[0] > 1 else 1,
+                                       int(2 ** np.ceil(np.log2(shape[1]))) if shape[1] > 1 else 1)
+            self._spectrum["image"] = np.fft.rfft2(self._data, self._spectrum["shape"])
+        return self._spectrum["image"], self._spectrum["shape"]
+
+    def correlate(self, template: "np.ndarray") -> "np.ndarray":
+        """
+        归一化互相关，结果同 ``cv2.TM_CCOEFF_NORMED``
+
+        :param template: 预处理后的模板
+        :return: (H - h + 1, W - w + 1) 的相似度矩阵
+        """
+        height, width = template.shape
+        count = height * width
+        template = template.astype(np.float64)
+        centered = template - template.mean()
+        template_norm = np.sqrt((centered ** 2).sum())
+
+        sums, sums_sq = self._window_sums(height, width)
+        variance = np.maximum(sums_sq - sums ** 2 / count, 0)
+
+        if template_norm < 1e-6:
+            # 纯色模板无法计算相关系数，按窗口是否为同一颜色比较均值
+            flat = variance < 1e-6 * count
+            return np.where(flat, 1 - np.abs(sums / count - template.mean()) / 255, 0)
+
+        if cv2 is not None:
+            if self._float32 is None:
+                self._float32 = self.image.astype(np.float32)
+            result = cv2.matchTemplate(self._float32, template.astype(np.float32),
+                                       cv2.TM_CCOEFF_NORMED).astype(np.float64)
+        else:
+            spectrum, shape = self._fft()
+            correlation = np.fft.irfft2(spectrum * np.conj(np.fft.rfft2(centered, shape)), shape)
+            numerator = correlation[:self._data.shape[0] - height + 1, :self._data.shape[1] - width + 1]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                result = numerator / (np.sqrt(variance) * template_norm)
+        # 纯色窗口与非纯色模板不相关
+        result[variance < 1e-6 * count] = 0
+        return np.clip(np.nan_to_num(result, nan=0.0, posinf=0.0, neginf=0.0), -1, 1)
+
+
+def _prepare(template: _Template, scale: float, algorithm: _Algorithm) -> "np.ndarray":
+    """模板缩放到截图的缩放率并按算法处理；模板库中的模板直接取预处理结果"""
+    if hasattr(template, "prepare"):
+        return template.prepare(scale, algorithm)
+    if isinstance(template, str):
+        template = load_image(template)
+    return apply_algorithm(_resize(to_gray(template), scale), algorithm)
+
+
+def _peaks(result: "np.ndarray", height: int, width: int, similarity: float, multi: int) -> List[Tuple[int, int, float]]:
+    """取相似度最高的 multi 个位置，已选位置附近模板大小的范围内不再重复选取"""
+    peaks = []
+    result = result.copy()
+    while len(peaks) < multi:
+        index = int(np.argmax(result))
+        y, x = divmod(index, result.shape[1])
+        score = float(result[y, x])
+        if score < similarity:
+            break
+        peaks.append((x, y, score))
+        result[max(0, y - height + 1):y + height, max(0, x - width + 1):x + width] = -np.inf
+    return peaks
+
+
+def _match(frame: Frame, templates: Iterable[_Template], region: _Region, algorithm: _Algorithm,
+           similarity: float, multi: int) -> List[List[Tuple[int, int, int, int, float]]]:
+    """匹配多个模板，返回截图中的像素坐标 (x, y, 宽, 高, 相似度)"""
+    _require_numpy()
+    left, top, right, bottom = frame.local_region(region)
+    search = _SearchImage(apply_algorithm(frame.gray[top:bottom, left:right], algorithm))
+
+    results = []
+    for template in templates:
+        template = _prepare(template, frame.scale, algorithm)
+        height, width = template.shape
+        if height > search.image.shape[0] or width > search.image.shape[1]:
+            results.append([])
+            continue
+        peaks = _peaks(search.correlate(template), height, width, similarity, multi)
+        results.append([(left + x, top + y, width, height, score) for x, y, score in peaks])
+    return results
+
+
+def match_templates(frame: Frame, templates: Iterable[_Template], region: _Region = None,
+                    algorithm: _Algorithm = None, similarity: float = 0.9, multi: int = 1) -> List[List[Match]]:
+    """
+    在一帧截图中同时匹配多个模板，截图只做一次预处理
+
+    :param frame: 截图帧
+    :param templates: 模板图片路径、BGR/灰度数组或 :class:`Template`，模板应与屏幕原始分辨率一致
+    :param region: 查找区域，默认整张截图
+    :param algorithm: 处理截图和模板所用的算法，同设备端 findImage
+    :param similarity: 相似度，0-1 的浮点数，默认 0.9
+    :param multi: 每个模板最多返回的匹配数量，默认 1
+    :return: 与 templates 顺序一致的匹配结果列表，按相似度从高到低排序
+    """
+    results = []
+    for matches in _match(frame, templates, region, algorithm, similarity, multi):
+        screen_matches = []
+        for x, y, width, height, score in matches:
+            point = frame.to_screen(x, y)
+            screen_matches.append(Match(point.x, point.y, width / frame.scale, height / frame.scale, score))
+        results.append(screen_matches)
+    return results
+
+
+def find_images(frame: Frame, template: _Template, region: _Region = None, algorithm: _Algorithm = None,
+                similarity: float = 0.9, multi: int = 1) -> List[Point]:
+    """
+    在截图帧中查找模板，返回匹配区域中心点坐标列表，语义同设备端 findImage
+
+    :param frame: 截图帧
+    :param template: 模板图片路径或数组
+    :param region: 查找区域，默认整张截图
+    :param algorithm: 处理截图和模板所用的算法
+    :param similarity: 相似度，0-1 的浮点数，默认 0.9
+    :param multi: 最多返回的数量，默认 1
+    :return:
+    """
+    return find_images_many(frame, {"": template}, region, algorithm, similarity, multi)[""]
+
+
+def find_images_many(frame: Frame, templates: Dict[str, _Template], region: _Region = None,
+                     algorithm: _Algorithm = None, similarity: float = 0.9,
+                     multi: int = 1) -> Dict[str, List[Point]]:
+    """
+    一帧截图同时回答多个找图请求
+
+    :param frame: 截图帧
+    :param templates: {名称: 模板图片路径或数组}
+    :param region: 查找区域，默认整张截图
+    :param algorithm: 处理截图和模板所用的算法
+    :param similarity: 相似度，0-1 的浮点数，默认 0.9
+    :param multi: 每个模板最多返回的数量，默认 1
+    :return: {名称: 中心点坐标列表}
+    """
+    names = list(templates)
+    results = _match(frame, [templates[name] for name in names], region, algorithm, similarity, multi)
+    return {
+        name: [frame.to_screen(x + width / 2, y + height / 2) for x, y, width, height, _ in matches]
+        for name, matches in zip(names, results)
+    }
+
+
+def best_match(frame: Frame, template: _Template, region: _Region = None,
+               algorithm: _Algorithm = None) -> Optional[Match]:
+    """
+    返回相似度最高的位置，不设阈值，用于调试相似度参数
+
+    :param frame: 截图帧
+    :param template: 模板图片路径或数组
+    :param region: 查找区域
+    :param algorithm: 处理截图和模板所用的算法
+    :return:
+    """
+    matches = match_templates(frame, [template], region, algorithm, similarity=-1, multi=1)[0]
+    return matches[0] if matches else None
@@ -0,0 +1,401 @@
+"""
+命令指标：按命令名称统计调用次数、发送/接收字节数、错误次数和耗时分布
+
+每个连接在收发路径中记录自己的指标，不需要全局锁；全服务的指标在导出时合并所有连接（包括已断开的连接）得到。
+耗时使用 HDR 风格的对数线性直方图记录，每个 2 的幂区间分为 16 个桶，相对误差不超过 1/16，记录一次只需要几次整数运算。
+
+>>> from AiBote import metrics_registry
+>>> metrics_registry.serve_http(9464)  # Prometheus 从 http://127.0.0.1:9464/metrics 拉取
+>>> metrics_registry.server()["click"].latency.percentile(0.99)
+"""
+import abc
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# 每个 2 的幂区间的子桶位数
+_SUB_BITS = 4
+_SUB_COUNT = 1 << _SUB_BITS
+# 导出的分位数
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _bucket(value: int) -> int:
+    if value < _SUB_COUNT:
+        return value
+    shift = value.bit_length() - _SUB_BITS - 1
+    return ((shift + 1) << _SUB_BITS) + (value >> shift) - _SUB_COUNT
+
+
+def _bucket_range(index: int) -> Tuple[int, int]:
+    if index < _SUB_COUNT:
+        return index, index
+    shift = (index >> _SUB_BITS) - 1
+    base = (index & (_SUB_COUNT - 1)) + _SUB_COUNT
+    return base << shift, ((base + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    耗时直方图，以微秒为单位记录
+    """
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0.0
+        self.min = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        """
+        记录一次耗时
+
+        :param seconds: 耗时(秒)
+        :return:
+        """
+        index = _bucket(int(seconds * 1e6))
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        if not self.count or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.count += 1
+        self.total += seconds
+
+    def merge(self, other: "Histogram") -> None:
+        """合并另一个直方图"""
+        if not other.count:
+            return
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+
+    def percentile(self, quantile: float) -> float:
+        """
+        分位数耗时(秒)，取所在桶的中点
+
+        :param quantile: 0-1 的分位数，例如 0.99
+        :return:
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, round(quantile * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                low, high = _bucket_range(index)
+                return min(max((low + high) / 2e6, self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self):
+        return f"Histogram(count={self.count}, mean={self.mean:.6f}, p99={self.percentile(0.99):.6f}, " \
+               f"max={self.max:.6f})"
+
+
+class CommandStats:
+    """
+    一个命令的统计
+
+    :ivar count: 调用次数
+    :ivar errors: 出错次数
+    :ivar sent: 发送字节数
+    :ivar received: 接收字节数
+    :ivar latency: 耗时直方图
+    """
+    __slots__ = ("count", "errors", "sent", "received", "latency")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.sent = 0
+        self.received = 0
+        self.latency = Histogram()
+
+    def merge(self, other: "CommandStats") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        self.sent += other.sent
+        self.received += other.received
+        self.latency.merge(other.latency)
+
+    def to_dict(self) -> dict:
+        result = {"count": self.count, "errors": self.errors, "sent": self.sent, "received": self.received,
+                  "mean": self.latency.mean, "max": self.latency.max}
+        for quantile in QUANTILES:
+            result[f"p{round(quantile * 100)}"] = self.latency.percentile(quantile)
+        return result
+
+    def __repr__(self):
+        return f"CommandStats(count={self.count}, errors={self.errors}, sent={self.sent}, " \
+               f"received={self.received}, latency={self.latency!r})"
+
+
+def _merge(target: Dict[str, CommandStats], source: Dict[str, CommandStats]) -> None:
+    for command, stats in list(source.items()):
+        merged = target.get(command)
+        if merged is None:
+            merged = target[command] = CommandStats()
+        merged.merge(stats)
+
+
+class DeviceMetrics:
+    """
+    一个连接的指标，只由该连接的收发路径写入
+
+    :param kind: 设备类型，android / win / web
+    :param address: 客户端地址
+    """
+    __slots__ = ("kind", "address", "commands")
+
+    def __init__(self, kind: str, address: str):
+        self.kind = kind
+        self.address = address
+        self.commands: Dict[str, CommandStats] = {}
+
+    def record(self, command: str, start: float, sent: int, received: int, error: bool = False) -> None:
+        """
+        记录一次命令
+
+        :param command: 命令名称
+        :param start: 开始时间，``time.perf_counter()``
+        :param sent: 发送字节数
+        :param received: 接收字节数
+        :param error: 是否出错
+        :return:
+        """
+        elapsed = time.perf_counter() - start
+        stats = self.commands.get(command)
+        if stats is None:
+            stats = self.commands[command] = CommandStats()
+        stats.count += 1
+        stats.sent += sent
+        stats.received += received
+        if error:
+            stats.errors += 1
+        stats.latency.record(elapsed)
+
+    def __repr__(self):
+        return f"DeviceMetrics(kind={self.kind!r}, address={self.address!r}, commands={len(self.commands)})"
+
+
+class MetricsExporter(abc.ABC):
+    """
+    指标导出接口，通过 :meth:`MetricsRegistry.add_exporter` 定时调用
+    """
+
+    @abc.abstractmethod
+    def export(self, registry: "MetricsRegistry") -> None:
+        """
+        导出一次指标
+
+        :param registry: 指标注册表，通过 ``server()`` / ``devices()`` / ``to_dict()`` 读取
+        :return:
+        """
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    进程内所有连接的命令指标
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices: Dict[DeviceMetrics, None] = {}
+        # 已断开连接的指标合并到这里，保证全服务的累计值不减少
+        self._closed: Dict[str, CommandStats] = {}
+        self._exporters: Dict[MetricsExporter, threading.Event] = {}
+        self._http: Optional[ThreadingHTTPServer] = None
+
+    def device(self, kind: str, address: str) -> DeviceMetrics:
+        """
+        登记一个连接，由脚本类在连接建立时调用
+
+        :param kind: 设备类型
+        :param address: 客户端地址
+        :return:
+        """
+        device = DeviceMetrics(kind, address)
+        with self._lock:
+            self._devices[device] = None
+        return device
+
+    def release(self, device: DeviceMetrics) -> None:
+        """
+        注销连接，指标合并到全服务的累计值
+
+        :param device: 连接的指标
+        :return:
+        """
+        with self._lock:
+            if self._devices.pop(device, 0) is None:
+                _merge(self._closed, device.commands)
+
+    def devices(self) -> List[DeviceMetrics]:
+        """在线连接的指标"""
+        with self._lock:
+            return list(self._devices)
+
+    def server(self) -> Dict[str, CommandStats]:
+        """
+        全服务按命令合并的指标，包括已断开的连接
+
+        :return: {命令名称: 统计}
+        """
+        with self._lock:
+            result: Dict[str, CommandStats] = {}
+            _merge(result, self._closed)
+            for device in self._devices:
+                _merge(result, device.commands)
+        return result
+
+    def reset(self) -> None:
+        """清空所有指标"""
+        with self._lock:
+            self._closed.clear()
+            for device in self._devices:
+                device.commands.clear()
+
+    def to_dict(self) -> dict:
+        """全服务和每个连接的指标，耗时单位为秒"""
+        return {
+            "server": {command: stats.to_dict() for command, stats in self.server().items()},
+            "devices": {device.address: {"kind": device.kind,
+                                         "commands": {command: stats.to_dict()
+                                                      for command, stats in list(device.commands.items())}}
+                        for device in self.devices()},
+        }
+
+    def prometheus(self) -> str:
+        """
+        Prometheus 文本格式，全服务的指标 ``device="all"``
+
+        :return:
+        """
+        series: List[Tuple[str, str, Dict[str, CommandStats]]] = [("server", "all", self.server())]
+        series += [(device.kind, device.address, dict(device.commands)) for device in self.devices()]
+
+        lines = []
+        for name, kind, help_text, field in (
+                ("aibote_commands_total", "counter", "命令调用次数", "count"),
+                ("aibote_command_errors_total", "counter", "命令出错次数", "errors"),
+                ("aibote_command_sent_bytes_total", "counter", "命令发送字节数", "sent"),
+                ("aibote_command_received_bytes_total", "counter", "命令接收字节数", "received")):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for device_kind, address, commands in series:
+                for command, stats in commands.items():
+                    labels = f'kind="{device_kind}",device="{_escape(address)}",command="{_escape(command)}"'
+                    lines.append(f"{name}{{{labels}}} {getattr(stats, field)}")
+
+        name = "aibote_command_latency_seconds"
+        lines.append(f"# HELP {name} 命令耗时")
+        lines.append(f"# TYPE {name} summary")
+        for device_kind, address, commands in series:
+            for command, stats in commands.items():
+                labels = f'kind="{device_kind}",device="{_escape(address)}",command="{_escape(command)}"'
+                for quantile in QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{quantile}"}} {stats.latency.percentile(quantile):.6f}')
+                lines.append(f"{name}_sum{{{labels}}} {stats.latency.total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {stats.latency.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve_http(self, port: int = 9464, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """
+        在后台线程启动 HTTP 服务，``GET /metrics`` 返回 Prometheus 文本格式的指标
+
+        :param port: 监听端口，0 为随机端口
+        :param host: 监听地址，默认只允许本机访问
+        :return: HTTP 服务，``server_address`` 为实际监听的地址
+        """
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode("utf8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="aibote-metrics", daemon=True).start()
+        self._http = server
+        return server
+
+    def add_exporter(self, exporter: MetricsExporter, interval: float = 10.0) -> None:
+        """
+        每隔 interval 秒在后台线程调用一次导出器
+
+        :param exporter: 导出器
+        :param interval: 导出间隔(秒)
+        :return:
+        """
+        stopped = threading.Event()
+        with self._lock:
+            self._exporters[exporter] = stopped
+
+        def run():
+            while not stopped.wait(interval):
+                exporter.export(self)
+
+        threading.Thread(target=run, name="aibote-metrics-exporter", daemon=True).start()
+
+    def remove_exporter(self, exporter: MetricsExporter, flush: bool = True) -> None:
+        """
+        停止导出器
+
+        :param exporter: 导出器
+        :param flush: 停止前是否再导出一次
+        :return:
+        """
+        with self._lock:
+            stopped = self._exporters.pop(exporter, None)
+        if stopped is None:
+            return
+        stopped.set()
+        if flush:
+            exporter.export(self)
+
+    def close(self) -> None:
+        """停止 HTTP 服务和所有导出器"""
+        for exporter in list(self._exporters):
+            self.remove_exporter(exporter)
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+            self._http = None
+
+    def __repr__(self):
+        return f"MetricsRegistry(devices={len(self._devices)})"
+
+
+# 进程内全局的指标注册表
+metrics_registry = MetricsRegistry()
@@ -1,6 +1,11 @@
+import asyncio
+import contextlib
 import os
 import signal
+import socket
+import socketserver
 import threading
+import time
 from multiprocessing.context import SpawnProcess
 from typing import Callable
 
@@ -8,9 +13,104 @@ import click
 
 from loguru import logger
 
+from ._registry import device_registry
+
+# 子进程中可以读取的工作进程数量，例如 ProcessPoolOcr 按此平分 CPU 核数
+WORKERS_ENV = "AIBOTE_WORKERS"
+# 停止服务时等待连接完成清理的最长时间(秒)
+SHUTDOWN_TIMEOUT = 5.0
+
+# 父进程停止子进程时发送的信号
+_TERM_SIGNAL = signal.SIGTERM if os.name != "nt" else signal.SIGBREAK
+
+
+@contextlib.contextmanager
+def stop_on_signals(server: socketserver.BaseServer):
+    """
+    收到 SIGINT / SIGTERM（Windows 为 SIGBREAK）时在辅助线程中停止 ``server.serve_forever``，而不是直接结束进程，
+    调用方的 finally 清理（关闭连接、输出性能分析结果）可以完整执行；开始停止后再收到的信号被忽略。
+    多进程模式下父进程用 SIGTERM 停止子进程。只能在主线程中安装信号处理，其他线程中调用时不做任何操作
+
+    :param server: socket 服务
+    :return:
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if stopping.is_set():
+            return
+        stopping.set()
+        # shutdown 会等待 serve_forever 退出，不能在运行 serve_forever 的主线程中调用
+        threading.Thread(target=server.shutdown, name="aibote-shutdown", daemon=True).start()
+
+    signals = (signal.SIGINT, _TERM_SIGNAL)
+    previous = [signal.signal(sig, stop) for sig in signals]
+    try:
+        yield
+    finally:
+        for sig, handler in zip(signals, previous):
+            signal.signal(sig, handler)
+
+
+@contextlib.contextmanager
+def stop_loop_on_signals(loop: asyncio.AbstractEventLoop, stop: Callable[[], None]):
+    """
+    asyncio 版本的 :func:`stop_on_signals`，收到 SIGINT / SIGTERM 时在事件循环中调用 stop，开始停止后再收到的信号被忽略。
+    Windows 的事件循环和非主线程不支持 ``add_signal_handler``，此时不做任何操作
+
+    :param loop: 事件循环
+    :param stop: 停止服务的函数
+    :return:
+    """
+    stopping = False
+
+    def on_signal():
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        stop()
+
+    installed = []
+    for sig in (signal.SIGINT, _TERM_SIGNAL):
+        with contextlib.suppress(NotImplementedError, RuntimeError, ValueError):
+            loop.add_signal_handler(sig, on_signal)
+            installed.append(sig)
+    try:
+        yield
+    finally:
+        for sig in installed:
+            loop.remove_signal_handler(sig)
+
+
+def close_connections(server: socketserver.BaseServer, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+    """
+    断开服务中所有在线的连接，等待它们完成清理（关闭录制文件、注销指标、写入追踪），最多等待 timeout 秒
+
+    :param server: socket 服务
+    :param timeout: 最长等待时间(秒)
+    :return:
+    """
+    handlers = [session.handler for session in device_registry.sessions()
+                if getattr(session.handler, "server", None) is server]
+    # 主动断开引起的脚本异常是预期的，不再打印 socketserver 的异常信息
+    server.handle_error = lambda request, client_address: None
+    for handler in handlers:
+        with contextlib.suppress(OSError):
+            handler.request.shutdown(socket.SHUT_RDWR)
+    end = time.monotonic() + timeout
+    while any(handler in device_registry for handler in handlers) and time.monotonic() < end:
+        time.sleep(0.05)
+
 
 def multiprocess(workers_num: int, create_process: Callable[[], SpawnProcess]) -> None:
     should_exit = threading.Event()
+    # spawn 创建的子进程继承父进程的环境变量
+    os.environ[WORKERS_ENV] = str(workers_num)
 
     logger.info(
         "Started parent process [{}]".format(
@@ -0,0 +1,596 @@
+"""
+OCR 结果解析
+
+驱动返回的 OCR 结果是 Python 字面量格式的文本::
+
+    [[[[x1, y1], [x2, y2], [x3, y3], [x4, y4]], ('文字', 0.98)], ...]
+
+:func:`parse_ocr` 用一个预编译的正则一次扫描整段文本，坐标和置信度直接存入紧凑的 ``array('d')``，
+不再用 ``ast.literal_eval`` 为每个文本框构建嵌套的列表、元组和浮点对象，全屏识别上百个文本框时更快、占用内存更少。
+
+:class:`OcrResult` 保存一次识别的全部结果，之后的子串、正则、模糊匹配、最近文字等查询都不再重新识别：
+
+>>> result = self.get_text(as_result=True)
+>>> result.find("确定"), result.find_regex(r"\\d+元"), result.find_fuzzy("登陆"), result.nearest((500, 800))
+
+:class:`OcrCache` 按截图区域的感知哈希缓存识别结果，区域内容未变化时不再请求 OCR 服务；
+:class:`IncrementalOcr` 将区域分块比较前后两次截图，只识别变化的部分并与之前的结果合并。
+"""
+import hashlib
+import math
+import re
+import threading
+from array import array
+from ast import literal_eval
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from itertools import chain
+from typing import Any, Callable, Dict, Hashable, Iterator, List, NamedTuple, Optional, Pattern, Tuple, Union
+
+from ._utils import Point, _Point_Tuple, _Region
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+_NUMBER = r"\s*(-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?)\s*"
+_CORNER = rf"\[{_NUMBER},{_NUMBER}\]"
+_STRING = r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")"""
+
+# 一个文本框：四个角的坐标，(文字, 置信度)，文字和置信度也兼容列表形式
+_OCR_ITEM = re.compile(
+    rf"\[\s*\[\s*{_CORNER}\s*,\s*{_CORNER}\s*,\s*{_CORNER}\s*,\s*{_CORNER}\s*\]\s*,"
+    rf"\s*[(\[]\s*{_STRING}\s*,{_NUMBER}[)\]]\s*\]"
+)
+
+_Box = Tuple[Tuple[float, float], Tuple[float, float], Tuple[float, float], Tuple[float, float]]
+
+
+def _unquote(literal: str) -> str:
+    # 没有转义字符时直接去掉引号，有转义时只对这一个字符串求值
+    if "\\" not in literal:
+        return literal[1:-1]
+    return literal_eval(literal)
+
+
+class OcrData:
+    """
+    解析后的 OCR 结果，第 i 个文本框的坐标、文字、置信度分别存放在三个序列中
+
+    :param coords: 所有文本框四个角的坐标，每个文本框 8 个数 ``x1, y1, ..., x4, y4``
+    :param texts: 文字列表
+    :param confidences: 置信度
+    """
+    __slots__ = ("coords", "texts", "confidences")
+
+    def __init__(self, coords: array = None, texts: List[str] = None, confidences: array = None):
+        self.coords = coords if coords is not None else array("d")
+        self.texts = texts if texts is not None else []
+        self.confidences = confidences if confidences is not None else array("d")
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def box(self, index: int) -> _Box:
+        """
+        第 index 个文本框四个角的坐标，依次为左上、右上、右下、左下
+
+        :param index: 下标
+        :return:
+        """
+        x1, y1, x2, y2, x3, y3, x4, y4 = self.coords[index * 8:index * 8 + 8]
+        return (x1, y1), (x2, y2), (x3, y3), (x4, y4)
+
+    @property
+    def boxes(self) -> "np.ndarray":
+        """(N, 4, 2) 的坐标数组，与 coords 共享内存，需要安装 numpy"""
+        if np is None:
+            raise ImportError("`boxes` 需要 numpy，请执行 `pip install AiBote.py[image]`")
+        return np.frombuffer(self.coords, dtype=np.float64).reshape(-1, 4, 2)
+
+    def __iter__(self) -> Iterator[list]:
+        """按 ``literal_eval`` 的结构逐个生成 ``[[左上, 右上, 右下, 左下], (文字, 置信度)]``"""
+        for index, text in enumerate(self.texts):
+            yield [[list(corner) for corner in self.box(index)], (text, self.confidences[index])]
+
+    def to_list(self) -> list:
+        """转换为与 ``literal_eval`` 结果相同的嵌套列表"""
+        return list(self)
+
+    def __repr__(self):
+        return f"OcrData({self.texts!r})"
+
+
+def _from_list(items: list) -> OcrData:
+    coords = array("d", (float(value) for points, _ in items for corner in points for value in corner))
+    return OcrData(coords, [str(words[0]) for _, words in items], array("d", (float(words[1]) for _, words in items)))
+
+
+def _match_items(response: str) -> Optional[List[tuple]]:
+    """
+    逐个匹配文本框，匹配结果必须覆盖整段响应（文本框之间只有逗号和空白），否则返回 None
+
+    :param response: 去掉首尾空白的响应文本
+    :return: 每个文本框的正则分组
+    """
+    if not (response.startswith("[") and response.endswith("]")):
+        return None
+    items = []
+    pos = 1
+    for match in _OCR_ITEM.finditer(response, 1, len(response) - 1):
+        if response[pos:match.start()].strip() != ("," if items else ""):
+            return None
+        items.append(match.groups())
+        pos = match.end()
+    if not items or response[pos:-1].strip() not in ("", ","):
+        return None
+    return items
+
+
+def parse_ocr(response: str) -> OcrData:
+    """
+    解析 OCR 识别出来的信息
+
+    :param response: 响应文本
+    :return: OcrData，没有识别到文字时为空
+    """
+    response = response.strip()
+    if not response or response == "null" or response == "[]":
+        return OcrData()
+
+    items = _match_items(response)
+    if items is None:
+        # 有文本框不符合预期格式时退回逐字面量求值，不丢弃任何文字
+        return _from_list(literal_eval(response))
+
+    coords = array("d", map(float, chain.from_iterable(item[:8] for item in items)))
+    texts = [_unquote(item[8]) for item in items]
+    confidences = array("d", [float(item[9]) for item in items])
+    return OcrData(coords, texts, confidences)
+
+
+class OcrMatch(NamedTuple):
+    """
+    OcrResult 的查询结果
+
+    :param index: 文本框下标
+    :param text: 文本框的完整文字
+    :param point: 匹配部分的中心坐标(屏幕坐标)
+    :param confidence: 识别置信度
+    :param score: 相似度，模糊匹配时为 0-1，其他查询为 1
+    """
+    index: int
+    text: str
+    point: Point
+    confidence: float
+    score: float = 1.0
+
+
+class OcrResult:
+    """
+    一次 OCR 的结果，保留文本框、文字和置信度，可以多次查询
+
+    子串查询使用字符 n-gram 倒排索引，第一次查询时建立。
+
+    :param data: 解析后的 OCR 结果
+    :param region: 识别区域，坐标换算为屏幕坐标时使用
+    :param scale: 识别时的图片缩放率
+    :param point_factory: 创建返回坐标的函数，默认创建 :class:`Point`
+    """
+
+    def __init__(self, data: OcrData, region: _Region = None, scale: float = 1.0,
+                 point_factory: Callable[[float, float], Point] = None):
+        self.data = data
+        self.region = region or (0, 0, 0, 0)
+        self.scale = scale
+        self._point_factory = point_factory or Point
+        self._index: Optional[Dict[str, List[int]]] = None
+
+    @property
+    def texts(self) -> List[str]:
+        return self.data.texts
+
+    @property
+    def confidences(self) -> array:
+        return self.data.confidences
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data.texts)
+
+    # #############
+    #   坐标换算   #
+    # #############
+    def _to_screen(self, x: float, y: float) -> Point:
+        return self._point_factory(float(self.region[0] + x / self.scale), float(self.region[1] + y / self.scale))
+
+    def text_point(self, index: int, pos: int = 0, length: int = None) -> Point:
+        """
+        文本框中一段文字的中心坐标，按字符数平分文本框宽度估算
+
+        :param index: 文本框下标
+        :param pos: 文字在文本框中的起始位置
+        :param length: 文字长度，默认到文本框末尾
+        :return: 屏幕坐标
+        """
+        words = self.data.texts[index]
+        if length is None:
+            length = len(words) - pos
+        left, _, right, _ = self.data.box(index)
+        # 单字符宽度
+        single_word_width = (right[0] - left[0]) / max(len(words), 1)
+        offset_x = single_word_width * (pos + length / 2)
+        offset_y = (right[1] - left[1]) / 2
+        return self._to_screen(left[0] + offset_x, left[1] + offset_y)
+
+    def _match(self, index: int, pos: int = 0, length: int = None, score: float = 1.0) -> OcrMatch:
+        return OcrMatch(index, self.data.texts[index], self.text_point(index, pos, length),
+                        self.data.confidences[index], score)
+
+    # #############
+    #   索引相关   #
+    # #############
+    def _postings(self) -> Dict[str, List[int]]:
+        """单字和双字 -> 包含它的文本框下标(升序)"""
+        if self._index is None:
+            index: Dict[str, List[int]] = {}
+            for number, words in enumerate(self.data.texts):
+                grams = set(words)
+                grams.update(words[i:i + 2] for i in range(len(words) - 1))
+                for gram in grams:
+                    index.setdefault(gram, []).append(number)
+            self._index = index
+        return self._index
+
+    def _candidates(self, text: str) -> List[int]:
+        """可能包含 text 的文本框，仍需逐个确认"""
+        if not text:
+            return list(range(len(self)))
+        postings = self._postings()
+        grams = {text} if len(text) == 1 else {text[i:i + 2] for i in range(len(text) - 1)}
+        lists = sorted((postings.get(gram, ()) for gram in grams), key=len)
+        if not lists[0]:
+            return []
+        candidates = set(lists[0])
+        for other in lists[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                return []
+        return sorted(candidates)
+
+    # #############
+    #   查询相关   #
+    # #############
+    def find(self, text: str) -> List[Point]:
+        """
+        查找包含 text 的文本框，返回 text 部分的中心坐标，语义同 ``find_text``
+
+        :param text: 要查找的文字
+        :return: 坐标列表
+        """
+        return [match.point for match in self.find_matches(text)]
+
+    def find_matches(self, text: str) -> List[OcrMatch]:
+        """
+        查找包含 text 的文本框
+
+        :param text: 要查找的文字
+        :return: 匹配结果列表
+        """
+        texts = self.data.texts
+        return [self._match(index, texts[index].find(text), len(text))
+                for index in self._candidates(text) if text in texts[index]]
+
+    def find_regex(self, pattern: Union[str, Pattern], flags: int = 0) -> List[OcrMatch]:
+        """
+        在每个文本框中查找正则表达式的所有匹配
+
+        :param pattern: 正则表达式
+        :param flags: 正则标志
+        :return: 匹配结果列表，坐标为匹配部分的中心
+        """
+        regex = re.compile(pattern, flags) if isinstance(pattern, str) else pattern
+        matches = []
+        for index, words in enumerate(self.data.texts):
+            for match in regex.finditer(words):
+                if match.end() > match.start():
+                    matches.append(self._match(index, match.start(), match.end() - match.start()))
+        return matches
+
+    def find_fuzzy(self, text: str, threshold: float = 0.8) -> List[OcrMatch]:
+        """
+        模糊查找，容忍识别错字；文本框中与 text 等长的片段的最高相似度不低于 threshold 即匹配
+
+        :param text: 要查找的文字
+        :param threshold: 相似度阈值，0-1
+        :return: 匹配结果列表，按相似度从高到低排列
+        """
+        if not text:
+            return []
+        postings = self._postings()
+        # 至少有一个相同的字才可能相似
+        candidates = sorted({index for char in set(text) for index in postings.get(char, ())})
+
+        matcher = SequenceMatcher(autojunk=False)
+        matcher.set_seq2(text)
+        matches = []
+        for index in candidates:
+            words = self.data.texts[index]
+            width = min(len(text), len(words))
+            best_score, best_pos = 0.0, 0
+            for pos in range(max(1, len(words) - width + 1)):
+                matcher.set_seq1(words[pos:pos + len(text)])
+                if matcher.real_quick_ratio() <= best_score or matcher.quick_ratio() <= best_score:
+                    continue
+                score = matcher.ratio()
+                if score > best_score:
+                    best_score, best_pos = score, pos
+            if best_score >= threshold:
+                matches.append(self._match(index, best_pos, width, best_score))
+        matches.sort(key=lambda match: -match.score)
+        return matches
+
+    def nearest(self, point: _Point_Tuple, text: str = None) -> Optional[OcrMatch]:
+        """
+        离指定坐标最近的文本框
+
+        :param point: 屏幕坐标
+        :param text: 只在包含该文字的文本框中查找，默认全部
+        :return: 匹配结果，坐标为文本框中心(指定 text 时为 text 部分的中心)；没有文本框时返回 None
+        """
+        matches = self.find_matches(text) if text else [self._match(index) for index in range(len(self))]
+        if not matches:
+            return None
+        return min(matches, key=lambda match: math.hypot(match.point[0] - point[0], match.point[1] - point[1]))
+
+    def __repr__(self):
+        return f"OcrResult({self.data.texts!r})"
+
+
+def fingerprint(image: "np.ndarray", block: int = 4, levels: int = 16) -> bytes:
+    """
+    图像的感知哈希：灰度后按 block x block 求均值缩小，再量化为 levels 级后取摘要
+
+    缩小和量化可以忽略压缩噪声和轻微的亮度抖动，block 足够小，文字的变化仍会改变哈希。
+
+    :param image: BGR 或灰度图像
+    :param block: 缩小的块大小(像素)
+    :param levels: 量化级数
+    :return: 16 字节摘要，包含图像尺寸
+    """
+    if np is None:
+        raise ImportError("OCR 缓存需要 numpy，请执行 `pip install AiBote.py[image]`")
+    gray = image.astype(np.uint16).sum(axis=2) // image.shape[2] if image.ndim == 3 else image
+    height, width = gray.shape[0] // block * block, gray.shape[1] // block * block
+    small = gray[:height, :width].reshape(height // block, block, width // block, block).mean(axis=(1, 3))
+    quantized = (small * levels // 256).astype(np.uint8)
+    digest = hashlib.blake2b(quantized.tobytes(), digest_size=16)
+    digest.update(np.array(image.shape, dtype=np.int64).tobytes())
+    return digest.digest()
+
+
+class OcrCache:
+    """
+    OCR 结果缓存，键为识别参数和区域截图的感知哈希，区域内容未变化时直接返回之前的结果
+
+    缓存的结果只与像素内容有关，可以在多个连接、多台设备之间共享；超过 max_entries 后按最近最少使用淘汰。
+
+    :param max_entries: 最多缓存的结果数量
+
+    >>> class CustomAndroidScript(AndroidBotMain):
+    ...     ocr_cache = OcrCache(max_entries=512)
+    """
+
+    def __init__(self, max_entries: int = 256):
+        if max_entries < 1:
+            raise ValueError("`max_entries` must be >= 1.")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[Hashable, bytes], OcrData]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, image: "np.ndarray", key: Hashable, recognize: Callable[[], OcrData]) -> OcrData:
+        """
+        获取区域截图的识别结果，未命中时调用 recognize 识别并缓存
+
+        :param image: 识别区域的截图
+        :param key: 识别参数，例如算法和缩放率
+        :param recognize: 请求 OCR 服务的函数
+        :return:
+        """
+        cache_key = (key, fingerprint(image))
+        with self._lock:
+            data = self._entries.get(cache_key)
+            if data is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        data = recognize()
+        with self._lock:
+            self._entries[cache_key] = data
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return data
+
+    def clear(self) -> None:
+        """清空缓存，计数保留"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        缓存统计，用于监控
+
+        :return: {"size", "max_entries", "hits", "misses", "evictions", "hit_rate"}
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def __repr__(self):
+        return f"OcrCache(size={len(self._entries)}, hits={self.hits}, misses={self.misses})"
+
+
+_Rect = Tuple[int, int, int, int]
+
+
+def _box_rect(data: OcrData, index: int) -> _Rect:
+    xs = data.coords[index * 8:index * 8 + 8:2]
+    ys = data.coords[index * 8 + 1:index * 8 + 8:2]
+    return int(math.floor(min(xs))), int(math.floor(min(ys))), int(math.ceil(max(xs))), int(math.ceil(max(ys)))
+
+
+def _overlaps(a: _Rect, b: _Rect) -> bool:
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _union(a: _Rect, b: _Rect) -> _Rect:
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+class IncrementalOcr:
+    """
+    增量 OCR：将识别区域分成小块，与上一次的截图逐块比较，只识别变化的块，再与上一次的识别结果合并
+
+    变化的块合并为矩形，并扩展到覆盖与之相交的旧文本框，旧文本框被整体重新识别，不会被截断；
+    变化的面积超过 full_ratio 时直接识别整个区域。
+
+    :param tile_size: 分块大小 (宽, 高)，默认 (128, 64)
+    :param full_ratio: 变化面积超过该比例时整体识别，默认 0.5
+    """
+
+    def __init__(self, tile_size: Tuple[int, int] = (128, 64), full_ratio: float = 0.5):
+        self.tile_size = tile_size
+        self.full_ratio = full_ratio
+        self._shape = None
+        self._tiles: Dict[Tuple[int, int], bytes] = {}
+        self._data = OcrData()
+        self.full_runs = 0
+        self.partial_runs = 0
+        self.unchanged_runs = 0
+        self.recognized_area = 0
+
+    def reset(self) -> None:
+        """丢弃上一次的结果，下一次整体识别"""
+        self._shape = None
+        self._tiles = {}
+        self._data = OcrData()
+
+    def _fingerprints(self, image: "np.ndarray") -> Dict[Tuple[int, int], bytes]:
+        tile_width, tile_height = self.tile_size
+        height, width = image.shape[:2]
+        return {(row, col): fingerprint(image[top:top + tile_height, left:left + tile_width], block=2)
+                for row, top in enumerate(range(0, height, tile_height))
+                for col, left in enumerate(range(0, width, tile_width))}
+
+    def _changed_rects(self, changed: List[Tuple[int, int]], width: int, height: int) -> List[_Rect]:
+        """相邻的变化块合并为矩形，再扩展到覆盖相交的旧文本框"""
+        tile_width, tile_height = self.tile_size
+        rects = [(col * tile_width, row * tile_height, min(width, (col + 1) * tile_width),
+                  min(height, (row + 1) * tile_height)) for row, col in changed]
+        old_boxes = [_box_rect(self._data, index) for index in range(len(self._data))]
+
+        merged = True
+        while merged:
+            merged = False
+            result: List[_Rect] = []
+            for rect in rects:
+                for box in old_boxes:
+                    if _overlaps(rect, box):
+                        union = _union(rect, box)
+                        if union != rect:
+                            rect, merged = union, True
+                for index, other in enumerate(result):
+                    # 相邻或重叠的矩形合并
+                    if _overlaps((rect[0] - 1, rect[1] - 1, rect[2] + 1, rect[3] + 1), other):
+                        result[index] = _union(rect, other)
+                        merged = True
+                        break
+                else:
+                    result.append(rect)
+            rects = result
+        return [(max(0, left), max(0, top), min(width, right), min(height, bottom))
+                for left, top, right, bottom in rects]
+
+    def update(self, image: "np.ndarray", recognize: Callable[[Optional[_Rect]], OcrData]) -> OcrData:
+        """
+        用新的区域截图更新识别结果
+
+        :param image: 识别区域的截图
+        :param recognize: 识别函数，参数为区域内的矩形 (left, top, right, bottom)，None 表示整个区域；
+            返回的坐标相对于该矩形
+        :return: 整个区域的识别结果，坐标相对于区域左上角
+        """
+        height, width = image.shape[:2]
+        tiles = self._fingerprints(image)
+        changed = [key for key, value in tiles.items() if self._tiles.get(key) != value]
+
+        if self._shape != image.shape or len(changed) * self.tile_size[0] * self.tile_size[1] > \
+                self.full_ratio * width * height:
+            self._data = recognize(None)
+            self.full_runs += 1
+            self.recognized_area += width * height
+        elif not changed:
+            self.unchanged_runs += 1
+        else:
+            self._data = self._merge(self._changed_rects(changed, width, height), recognize)
+            self.partial_runs += 1
+
+        self._shape = image.shape
+        self._tiles = tiles
+        return self._data
+
+    def _merge(self, rects: List[_Rect], recognize: Callable[[Optional[_Rect]], OcrData]) -> OcrData:
+        items = []
+        # 保留不与变化矩形相交的旧文本框
+        for index in range(len(self._data)):
+            box = _box_rect(self._data, index)
+            if not any(_overlaps(box, rect) for rect in rects):
+                items.append((box[1], box[0], self._data.coords[index * 8:index * 8 + 8], self._data.texts[index],
+                              self._data.confidences[index]))
+
+        for rect in rects:
+            self.recognized_area += (rect[2] - rect[0]) * (rect[3] - rect[1])
+            data = recognize(rect)
+            for index in range(len(data)):
+                coords = array("d", (value + rect[position % 2]
+                                     for position, value in enumerate(data.coords[index * 8:index * 8 + 8])))
+                items.append((min(coords[1::2]), min(coords[0::2]), coords, data.texts[index],
+                              data.confidences[index]))
+
+        # 按从上到下、从左到右的阅读顺序排列
+        items.sort(key=lambda item: (item[0], item[1]))
+        return OcrData(array("d", chain.from_iterable(item[2] for item in items)), [item[3] for item in items],
+                       array("d", (item[4] for item in items)))
+
+    def stats(self) -> Dict[str, int]:
+        """
+        识别统计
+
+        :return: {"full_runs", "partial_runs", "unchanged_runs", "recognized_area"}
+        """
+        return {
+            "full_runs": self.full_runs,
+            "partial_runs": self.partial_runs,
+            "unchanged_runs": self.unchanged_runs,
+            "recognized_area": self.recognized_area,
+        }
@@ -0,0 +1,227 @@
+"""
+脚本端 OCR 后端：截图传到脚本端后在本地识别，不再经过设备连接的 OCR 服务
+
+设置 ``ocr_backend`` 后，``get_text`` / ``find_text`` 先截取识别区域（按 ``algorithm`` 和 ``scale`` 处理），再交给后端识别：
+
+>>> class CustomAndroidScript(AndroidBotMain):
+...     ocr_backend = ProcessPoolOcr(RapidOcrBackend, processes=4)
+
+:class:`ProcessPoolOcr` 在进程池中运行识别模型，多个连接（多台设备）同时发起的识别请求在短时间窗口内合并为一批，
+一次交给模型识别，提高吞吐量。自定义模型实现 :class:`OcrBackend` 即可，支持批量推理的模型重写 ``recognize_batch``。
+
+进程池在第一次识别时才启动，作为类属性定义不会在导入模块时创建子进程。``execute(multi=N)`` 的每个工作进程各有一个进程池，
+请求只在同一个工作进程内合并，默认子进程数量为 CPU 核数除以工作进程数量；需要所有设备的请求合并为一批时使用单进程服务。
+"""
+import abc
+import atexit
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from ._frame import _require_numpy
+from ._multiprocess import WORKERS_ENV
+from ._ocr import OcrData, _from_list
+
+spawn = multiprocessing.get_context("spawn")
+
+
+class OcrBackend(abc.ABC):
+    """
+    OCR 后端接口
+
+    识别结果的坐标相对于传入图像的左上角，由调用方换算为屏幕坐标。
+    """
+
+    @abc.abstractmethod
+    def recognize(self, image: "np.ndarray") -> OcrData:
+        """
+        识别一张图像
+
+        :param image: BGR 或灰度图像
+        :return:
+        """
+
+    def recognize_batch(self, images: List["np.ndarray"]) -> List[OcrData]:
+        """
+        批量识别，默认逐张识别；支持批量推理的模型重写此方法
+
+        :param images: 图像列表
+        :return: 与 images 顺序相同的识别结果
+        """
+        return [self.recognize(image) for image in images]
+
+    def close(self) -> None:
+        """释放后端占用的资源"""
+
+
+class RapidOcrBackend(OcrBackend):
+    """
+    基于 RapidOCR（PaddleOCR 模型的 ONNX Runtime 版本）的 CPU 识别
+
+    需要安装 ``rapidocr_onnxruntime``：``pip install rapidocr_onnxruntime``
+
+    :param kwargs: 传给 ``RapidOCR`` 的参数
+    """
+
+    def __init__(self, **kwargs):
+        try:
+            from rapidocr_onnxruntime import RapidOCR
+        except ImportError:
+            raise ImportError("RapidOcrBackend 需要 rapidocr_onnxruntime，请执行 `pip install rapidocr_onnxruntime`") \
+                from None
+        self._engine = RapidOCR(**kwargs)
+
+    def recognize(self, image: "np.ndarray") -> OcrData:
+        result, _ = self._engine(image)
+        return _from_list([(box, (text, score)) for box, text, score in result or ()])
+
+
+# 进程池子进程中的识别模型，每个子进程创建一次
+_worker_backend: Optional[OcrBackend] = None
+
+
+def _init_worker(factory: Callable[[], OcrBackend]) -> None:
+    global _worker_backend
+    _worker_backend = factory()
+
+
+def _recognize_batch(images: List["np.ndarray"]) -> List[OcrData]:
+    return _worker_backend.recognize_batch(images)
+
+
+def _default_processes() -> int:
+    # execute(multi=N) 的工作进程各自创建进程池，按工作进程数量平分 CPU 核数
+    workers = int(os.environ.get(WORKERS_ENV) or 1)
+    return max(1, multiprocessing.cpu_count() // workers)
+
+
+class ProcessPoolOcr(OcrBackend):
+    """
+    在进程池中运行 OCR 模型，合并多个线程（多台设备的连接）同时发起的识别请求为一批
+
+    收集线程取到第一个请求后最多再等待 max_delay 秒，凑满 max_batch 个请求或超时后把这一批提交给进程池；
+    进程池忙时请求继续排队，负载越高批量越大。进程池和收集线程在第一次提交识别请求时启动。
+
+    :param factory: 在子进程中创建模型的函数或类，必须可以被 pickle（模块顶层定义），默认 :class:`RapidOcrBackend`
+    :param processes: 子进程数量，默认 CPU 核数；``execute(multi=N)`` 时默认 CPU 核数除以 N
+    :param max_batch: 一批最多的图像数量
+    :param max_delay: 收集一批请求的最长等待时间(秒)
+    """
+
+    def __init__(self, factory: Callable[[], OcrBackend] = RapidOcrBackend, processes: int = None,
+                 max_batch: int = 8, max_delay: float = 0.005):
+        _require_numpy()
+        self.factory = factory
+        self.processes = processes
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._queue: "queue.Queue[Optional[Tuple[np.ndarray, Future]]]" = queue.Queue()
+        self._slots: Optional[threading.Semaphore] = None
+        self._collector: Optional[threading.Thread] = None
+        self._closed = False
+        self.batches = 0
+        self.images = 0
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._collector is not None:
+                return
+            # 在工作进程中第一次使用时才确定数量，此时已能读取到工作进程数量
+            if self.processes is None:
+                self.processes = _default_processes()
+            self._executor = ProcessPoolExecutor(self.processes, mp_context=spawn, initializer=_init_worker,
+                                                 initargs=(self.factory,))
+            # 进行中的批次不超过子进程数量，多出的请求留在队列中合并为更大的批次
+            self._slots = threading.Semaphore(self.processes)
+            self._collector = threading.Thread(target=self._collect, name="aibote-ocr-batcher", daemon=True)
+            self._collector.start()
+            atexit.register(self.close)
+
+    def recognize(self, image: "np.ndarray") -> OcrData:
+        return self.submit(image).result()
+
+    def recognize_batch(self, images: List["np.ndarray"]) -> List[OcrData]:
+        futures = [self.submit(image) for image in images]
+        return [future.result() for future in futures]
+
+    def submit(self, image: "np.ndarray") -> "Future[OcrData]":
+        """
+        提交一张图像，返回识别结果的 Future
+
+        :param image: BGR 或灰度图像
+        :return:
+        """
+        if self._closed:
+            raise RuntimeError("ProcessPoolOcr 已关闭")
+        if self._collector is None:
+            self._start()
+        future: "Future[OcrData]" = Future()
+        self._queue.put((image, future))
+        return future
+
+    def _collect(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            end = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = end - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+
+            self._slots.acquire()
+            self.batches += 1
+            self.images += len(batch)
+            try:
+                task = self._executor.submit(_recognize_batch, [image for image, _ in batch])
+            except Exception as e:
+                self._slots.release()
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            task.add_done_callback(lambda done, batch=batch: self._resolve(done, batch))
+
+    def _resolve(self, task: Future, batch: list) -> None:
+        self._slots.release()
+        error = task.exception()
+        if error is not None:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), data in zip(batch, task.result()):
+            future.set_result(data)
+
+    def close(self) -> None:
+        """停止收集线程并关闭进程池，等待进行中的批次完成"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._collector is None:
+            return
+        self._queue.put(None)
+        self._collector.join()
+        self._executor.shutdown(wait=True)
+        atexit.unregister(self.close)
+
+    def __repr__(self):
+        return f"ProcessPoolOcr(processes={self.processes}, batches={self.batches}, images={self.images})"
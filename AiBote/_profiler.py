@@ -0,0 +1,271 @@
+"""
+采样分析：定时采样每个连接执行 ``script_main`` 的线程的调用栈，统计时间花在网络等待、本地 CPU 还是休眠上
+
+采样线程每隔 ``interval`` 秒读取一次所有被分析线程的调用栈，按最内层的函数和线程 CPU 时间分类：
+
+- network：正在收发数据（``__send_data`` 等收发方法、``FrameReader`` 读取响应）；
+- sleep：等待循环的休眠、``threading`` 的等待，或者线程在这段时间内几乎没有消耗 CPU（例如脚本中的 ``time.sleep``）；
+- cpu：其他情况，即线程在执行脚本端的 Python 代码。
+
+停止时每台设备输出一个折叠格式的调用栈文件（``flamegraph.pl`` / speedscope 可以直接打开，计数单位为微秒），最内层是分类，
+另外输出各分类耗时的汇总 ``summary.json``。
+
+>>> CustomAndroidScript.execute(16678, profile="./profile")
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set, Tuple
+
+from loguru import logger
+
+from ._codec import FrameReader
+from ._trace import sleep as _traced_sleep
+from ._wait import Notifier, wait_until
+
+# 默认采样间隔(秒)
+PROFILE_INTERVAL = 0.01
+# 采样间隔内线程 CPU 时间占比低于此值时视为阻塞
+_BLOCKED_RATIO = 0.1
+# 收发方法的名称（类中的名称经过改写，例如 _AndroidBotMain__send_data）
+_SEND_METHODS = ("__send_data", "__send_data_return_bytes", "__push_file", "__pull_file")
+
+_SLEEP_CODES = {threading.Condition.wait.__code__, threading.Event.wait.__code__, Notifier.wait.__code__,
+                wait_until.__code__, _traced_sleep.__code__}
+_READER_CODES = {value.__code__ for value in vars(FrameReader).values() if callable(value) and
+                 hasattr(value, "__code__")}
+
+_STATES = ("network", "cpu", "sleep")
+
+
+def _send_codes(cls: type) -> Set:
+    codes = set()
+    for klass in cls.__mro__:
+        for name, value in vars(klass).items():
+            if not hasattr(value, "__code__"):
+                continue
+            if name == "_send_batch" or any(name == f"_{klass.__name__}{method}" for method in _SEND_METHODS):
+                codes.add(value.__code__)
+    return codes
+
+
+def _cpu_clock(ident: int) -> Optional[int]:
+    try:
+        return time.pthread_getcpuclockid(ident)
+    except (AttributeError, OSError):
+        # Windows 不支持线程 CPU 时钟，只按调用栈分类
+        return None
+
+
+class _Target:
+    __slots__ = ("device", "clock", "cpu", "wall", "network_codes")
+
+    def __init__(self, device: str, clock: Optional[int], network_codes: Set):
+        self.device = device
+        self.clock = clock
+        self.cpu = time.clock_gettime(clock) if clock is not None else 0.0
+        self.wall = time.monotonic()
+        self.network_codes = network_codes
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    :param interval: 采样间隔(秒)
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets: Dict[int, _Target] = {}
+        # (设备, 分类, 调用栈) -> 秒
+        self._samples: Counter = Counter()
+        self._network_codes: Dict[type, Set] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """启动采样线程"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="aibote-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止采样线程"""
+        if self._thread is None:
+            return
+        self._stopped.set()
+        self._thread.join()
+        self._thread = None
+
+    def profile(self, bot, device: str) -> "_Profiling":
+        """
+        在当前线程中分析一段代码，由脚本类在执行 ``script_main`` 时使用
+
+        :param bot: 脚本实例
+        :param device: 设备地址
+        :return: 上下文管理器
+        """
+        return _Profiling(self, bot, device)
+
+    def _register(self, bot, device: str) -> None:
+        cls = type(bot)
+        codes = self._network_codes.get(cls)
+        if codes is None:
+            codes = self._network_codes[cls] = _send_codes(cls) | _READER_CODES
+        ident = threading.get_ident()
+        with self._lock:
+            self._targets[ident] = _Target(device, _cpu_clock(ident), codes)
+
+    def _unregister(self) -> None:
+        with self._lock:
+            self._targets.pop(threading.get_ident(), None)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        """采样一次所有被分析的线程"""
+        with self._lock:
+            targets = list(self._targets.items())
+        if not targets:
+            return
+        frames = sys._current_frames()
+        now = time.monotonic()
+        for ident, target in targets:
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            codes.reverse()
+            # 从 script_main 开始，去掉 socketserver 的调用层
+            for index, code in enumerate(codes):
+                if code.co_name == "script_main":
+                    codes = codes[index:]
+                    break
+
+            innermost = codes[-1]
+            if innermost in target.network_codes:
+                state = "network"
+            elif innermost in _SLEEP_CODES:
+                state = "sleep"
+            else:
+                state = "cpu"
+                if target.clock is not None:
+                    cpu = time.clock_gettime(target.clock)
+                    if cpu - target.cpu < (now - target.wall) * _BLOCKED_RATIO:
+                        state = "sleep"
+            if target.clock is not None:
+                target.cpu = time.clock_gettime(target.clock)
+            # 按距离上一次采样的实际时间计数，采样线程被 GIL 延迟时不会低估忙碌的线程
+            self._samples[(target.device, state, tuple(codes))] += now - target.wall
+            target.wall = now
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        每台设备各分类的时间(秒)
+
+        :return: {设备地址: {"network": 秒, "cpu": 秒, "sleep": 秒}}
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        for (device, state, _), seconds in list(self._samples.items()):
+            states = result.setdefault(device, dict.fromkeys(_STATES, 0.0))
+            states[state] += seconds
+        return result
+
+    def folded(self) -> Dict[str, Dict[str, int]]:
+        """
+        每台设备折叠格式的调用栈，计数单位为微秒
+
+        :return: {设备地址: {"script_main (x.py:10);click (y.py:20);network": 微秒}}
+        """
+        result: Dict[str, Dict[str, int]] = {}
+        labels: Dict[object, str] = {}
+        for (device, state, codes), seconds in list(self._samples.items()):
+            frames = []
+            for code in codes:
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = \
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                frames.append(label)
+            frames.append(state)
+            stacks = result.setdefault(device, {})
+            key = ";".join(frames)
+            stacks[key] = stacks.get(key, 0) + round(seconds * 1e6)
+        return result
+
+    def dump(self, directory: str) -> None:
+        """
+        输出每台设备的折叠调用栈文件和汇总
+
+        :param directory: 输出目录，不存在时自动创建
+        :return:
+        """
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        for device, stacks in self.folded().items():
+            name = device.replace(":", "_").replace("/", "_") or "script"
+            with open(os.path.join(directory, f"{name}.{pid}.folded"), "w", encoding="utf8") as file:
+                for stack, count in sorted(stacks.items()):
+                    file.write(f"{stack} {count}\n")
+        with open(os.path.join(directory, f"summary.{pid}.json"), "w", encoding="utf8") as file:
+            json.dump({"interval": self.interval, "devices": self.summary()}, file, ensure_ascii=False, indent=2)
+
+    def __repr__(self):
+        return f"SamplingProfiler(interval={self.interval}, threads={len(self._targets)}, " \
+               f"stacks={len(self._samples)})"
+
+
+class _Profiling:
+    __slots__ = ("profiler", "bot", "device")
+
+    def __init__(self, profiler: SamplingProfiler, bot, device: str):
+        self.profiler = profiler
+        self.bot = bot
+        self.device = device
+
+    def __enter__(self):
+        self.profiler._register(self.bot, self.device)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._unregister()
+
+
+def start_profiling(handler_class: type, directory: Optional[str], interval: float = PROFILE_INTERVAL) \
+        -> Optional[Tuple[SamplingProfiler, str]]:
+    """
+    为脚本类启动采样分析，``execute(profile=...)`` 使用
+
+    :param handler_class: 脚本类
+    :param directory: 输出目录，为空时不分析
+    :param interval: 采样间隔(秒)
+    :return:
+    """
+    if not directory:
+        return None
+    profiler = SamplingProfiler(interval)
+    handler_class.profiler = profiler
+    profiler.start()
+    return profiler, directory
+
+
+def stop_profiling(profiling: Optional[Tuple[SamplingProfiler, str]]) -> None:
+    """停止采样并输出结果"""
+    if profiling is None:
+        return
+    profiler, directory = profiling
+    profiler.stop()
+    profiler.dump(directory)
+    logger.info("性能分析结果已保存到 {}", directory)
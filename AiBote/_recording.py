@@ -0,0 +1,306 @@
+"""
+会话录制与回放：把真实设备连接的每个请求帧和响应数据连同时间戳写入二进制日志，之后用模拟设备按原速或加速回放，
+不需要手机或 Windows 电脑也能得到真实、可重复的负载
+
+录制：设置脚本类的 ``record_dir``，每个连接写入一个 ``.aibrec`` 文件：
+
+>>> class CustomAndroidScript(AndroidBotMain):
+...     record_dir = "./records"
+
+回放：模拟设备连接脚本服务，按录制的顺序返回响应，响应延迟按 ``speed`` 缩放，``speed=0`` 时不等待：
+
+>>> ReplaySimulator("127.0.0.1", 16678, ["./records"], speed=2).run()
+
+命令行：``python -m AiBote._recording 16678 ./records --speed 2``
+
+文件格式（小端）：文件头 ``b"AIBREC"``、版本(u8)、设备类型长度(u8)、设备类型、开始时间(f64, Unix 秒)；
+之后每条记录为标志(u8)、请求时间(f64)、响应时间(f64)、请求长度(u32)、响应长度(u32)、请求帧、响应数据，时间为相对开始时间的秒数。
+"""
+import argparse
+import asyncio
+import os
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterable, Iterator, List, NamedTuple, Optional
+
+from loguru import logger
+
+from ._codec import encode_response
+from ._simulator import DeviceSimulator, FakeDevice, _payload
+
+MAGIC = b"AIBREC"
+VERSION = 1
+SUFFIX = ".aibrec"
+
+# 响应数据没有保存（例如下载的文件内容），只记录长度，回放时用同样长度的数据代替
+FLAG_RESPONSE_OMITTED = 1
+# 请求只保存了帧头，没有保存上传的文件内容
+FLAG_REQUEST_TRUNCATED = 2
+
+_HEADER = struct.Struct("<BB")
+_START = struct.Struct("<d")
+_ENTRY = struct.Struct("<BddII")
+
+# 录制的设备类型与模拟器设备类型的对应关系
+_SIMULATOR_KINDS = {"android": "android", "win": "windows", "web": "web"}
+
+
+class Entry(NamedTuple):
+    """
+    一次请求和响应
+
+    :param flags: 标志位
+    :param request_time: 发送请求的时间(秒，相对开始时间)
+    :param response_time: 收到响应的时间(秒，相对开始时间)
+    :param request: 请求帧
+    :param response: 响应数据，不含长度头
+    :param response_size: 响应数据长度
+    """
+    flags: int
+    request_time: float
+    response_time: float
+    request: bytes
+    response: bytes
+    response_size: int
+
+    @property
+    def command(self) -> str:
+        """请求的命令名称"""
+        header, _, body = self.request.partition(b"\n")
+        length = int(header.split(b"/", 1)[0] or 0)
+        return body[:length].decode("utf8", "replace")
+
+
+class SessionRecorder:
+    """
+    录制一个连接，由脚本类在连接建立时创建
+
+    :param path: 录制文件路径
+    :param kind: 设备类型，android / win / web
+    """
+
+    def __init__(self, path: str, kind: str):
+        self.path = path
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._file: Optional[BinaryIO] = open(path, "wb")
+        kind_bytes = kind.encode("utf8")
+        self._file.write(MAGIC + _HEADER.pack(VERSION, len(kind_bytes)) + kind_bytes + _START.pack(time.time()))
+
+    @classmethod
+    def create(cls, directory: str, kind: str, address: str) -> "SessionRecorder":
+        """
+        在目录中创建录制文件，文件名包含设备类型、地址和时间
+
+        :param directory: 录制目录，不存在时自动创建
+        :param kind: 设备类型
+        :param address: 客户端地址
+        :return:
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = f"{kind}_{address.replace(':', '_')}_{int(time.time() * 1000)}{SUFFIX}"
+        return cls(os.path.join(directory, name), kind)
+
+    def record(self, request: bytes, response: Optional[bytes], start: float, end: float, flags: int = 0,
+               response_size: int = None) -> None:
+        """
+        写入一次请求和响应
+
+        :param request: 请求帧
+        :param response: 响应数据，None 时只记录 response_size
+        :param start: 发送请求的时间，``time.perf_counter()``
+        :param end: 收到响应的时间，``time.perf_counter()``
+        :param flags: 标志位
+        :param response_size: 响应数据长度，response 为 None 时使用
+        :return:
+        """
+        if response is None:
+            flags |= FLAG_RESPONSE_OMITTED
+            response = b""
+        else:
+            response_size = len(response)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(_ENTRY.pack(flags, start - self._start, end - self._start, len(request),
+                                         response_size))
+            self._file.write(request)
+            if response:
+                self._file.write(response)
+
+    def close(self) -> None:
+        """关闭录制文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __repr__(self):
+        return f"SessionRecorder(path={self.path!r}, kind={self.kind!r})"
+
+
+class Recording:
+    """
+    读取录制文件
+
+    :param path: 录制文件路径
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是录制文件: {path}")
+            version, kind_length = _HEADER.unpack(file.read(_HEADER.size))
+            if version != VERSION:
+                raise ValueError(f"不支持的录制文件版本: {version}")
+            self.kind = file.read(kind_length).decode("utf8")
+            self.started_at = _START.unpack(file.read(_START.size))[0]
+            self._offset = file.tell()
+
+    def __iter__(self) -> Iterator[Entry]:
+        with open(self.path, "rb") as file:
+            file.seek(self._offset)
+            while True:
+                head = file.read(_ENTRY.size)
+                if len(head) < _ENTRY.size:
+                    # 录制中途退出时最后一条记录可能不完整
+                    return
+                flags, request_time, response_time, request_size, response_size = _ENTRY.unpack(head)
+                stored = 0 if flags & FLAG_RESPONSE_OMITTED else response_size
+                request = file.read(request_size)
+                response = file.read(stored)
+                if len(request) < request_size or len(response) < stored:
+                    return
+                yield Entry(flags, request_time, response_time, request, response, response_size)
+
+    def __repr__(self):
+        return f"Recording(path={self.path!r}, kind={self.kind!r})"
+
+
+def find_recordings(paths: Iterable[str]) -> List[Recording]:
+    """
+    读取文件或目录中的所有录制文件，按开始时间排序
+
+    :param paths: 录制文件或目录
+    :return:
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(SUFFIX)]
+        else:
+            files.append(path)
+    return sorted((Recording(file) for file in files), key=lambda recording: recording.started_at)
+
+
+class ReplayDevice(FakeDevice):
+    """
+    按录制文件响应请求的模拟设备
+    """
+
+    def __init__(self, simulator: "ReplaySimulator", index: int, recording: Recording):
+        super().__init__(simulator, index)
+        self.recording = recording
+        self.mismatches = 0
+        self._entries = iter(recording)
+        self._current: Optional[Entry] = None
+
+    def latency(self, command: str) -> float:
+        self._current = next(self._entries, None)
+        if self._current is None:
+            return super().latency(command)
+        if self._current.command != command:
+            self.mismatches += 1
+            if self.mismatches == 1:
+                logger.warning(f"replay {self.recording.path}: 请求 {command} 与录制的 {self._current.command} 不一致")
+        speed = self.simulator.speed
+        if speed <= 0:
+            return 0.0
+        return max(0.0, self._current.response_time - self._current.request_time) / speed
+
+    def response(self, args: List[bytes]) -> bytes:
+        entry = self._current
+        if entry is None:
+            # 录制的请求已回放完，按默认 fixtures 响应
+            return super().response(args)
+        if entry.flags & FLAG_RESPONSE_OMITTED:
+            return encode_response(_payload(entry.response_size))
+        return encode_response(entry.response)
+
+
+class ReplaySimulator(DeviceSimulator):
+    """
+    回放录制的会话，每个录制文件对应一个模拟设备
+
+    :param host: 脚本服务地址
+    :param port: 脚本服务端口
+    :param paths: 录制文件或目录
+    :param speed: 回放速度，1 为原速，2 为两倍速；连接时间和响应延迟都按此缩放，0 表示不等待
+    """
+
+    def __init__(self, host: str, port: int, paths: Iterable[str], speed: float = 1.0):
+        self.recordings = find_recordings(paths)
+        if not self.recordings:
+            raise ValueError("没有找到录制文件")
+        super().__init__(host, port, kind=_SIMULATOR_KINDS.get(self.recordings[0].kind, "android"))
+        self.speed = speed
+
+    async def start(self, count: int = None, connect_rate: Optional[float] = None) -> None:
+        """
+        按录制的相对时间依次连接所有设备，等待它们全部断开
+
+        :param count: 回放的录制文件数量，默认全部
+        :param connect_rate: 忽略，连接时间由录制决定
+        :return:
+        """
+        recordings = self.recordings[:count] if count else self.recordings
+        first = recordings[0].started_at
+        begin = time.monotonic()
+        tasks = []
+        for recording in recordings:
+            if self.speed > 0:
+                delay = (recording.started_at - first) / self.speed - (time.monotonic() - begin)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            device = ReplayDevice(self, len(self.devices), recording)
+            self.devices.append(device)
+            tasks.append(asyncio.create_task(device.run()))
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for device, result in zip(self.devices[-len(recordings):], results):
+            if isinstance(result, Exception):
+                logger.warning(f"replay device {device.index} error: {result!r}")
+
+    def run(self, count: int = None, connect_rate: Optional[float] = None) -> None:
+        asyncio.run(self.start(count, connect_rate))
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["mismatches"] = sum([device.mismatches for device in self.devices])
+        return stats
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m AiBote._recording", description="Aibote 会话回放")
+    parser.add_argument("port", type=int, help="脚本服务端口")
+    parser.add_argument("paths", nargs="+", help="录制文件或目录")
+    parser.add_argument("--host", default="127.0.0.1", help="脚本服务地址")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度，0 表示不等待")
+    args = parser.parse_args(argv)
+
+    simulator = ReplaySimulator(args.host, args.port, args.paths, args.speed)
+    start = time.perf_counter()
+    try:
+        simulator.run()
+    except KeyboardInterrupt:
+        pass
+    stats = simulator.stats()
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
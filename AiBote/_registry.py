@@ -0,0 +1,275 @@
+"""
+设备注册表：登记进程内所有在线的 AndroidBotMain / WinBotMain / WebBotMain 连接
+
+按客户端地址、android_id、投屏组号、投屏编号建立索引，O(1) 查找，并支持把命令并发分发到多台设备。
+
+>>> from AiBote import device_registry
+>>> bot = device_registry.get(android_id="8a2f0c1e9b7d6a53")
+>>> results = device_registry.dispatch(device_registry.group("1"), "show_toast", ("开始任务",))
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+# 支持索引的设备标识
+_KEYS = ("android_id", "group_id", "identifier")
+
+
+class Session:
+    """
+    一个设备连接的登记信息
+
+    :param handler: 连接对应的脚本实例
+    :param kind: 设备类型，android / win / web
+    :param address: 客户端地址
+    """
+    __slots__ = ("handler", "kind", "address", "connected_at", "last_active", "alive",
+                 "android_id", "group_id", "identifier")
+
+    def __init__(self, handler, kind: str, address: Tuple[str, int]):
+        self.handler = handler
+        self.kind = kind
+        self.address = _address_key(address)
+        self.connected_at = time.time()
+        self.last_active = time.monotonic()
+        self.alive = True
+        self.android_id: Optional[str] = None
+        self.group_id: Optional[str] = None
+        self.identifier: Optional[str] = None
+
+    def touch(self) -> None:
+        """记录一次成功的通信"""
+        self.last_active = time.monotonic()
+
+    @property
+    def idle(self) -> float:
+        """距离上一次成功通信的秒数"""
+        return time.monotonic() - self.last_active
+
+    def __repr__(self):
+        return f"Session(kind={self.kind!r}, address={self.address!r}, android_id={self.android_id!r}, " \
+               f"group_id={self.group_id!r}, identifier={self.identifier!r}, alive={self.alive})"
+
+
+class DispatchResult(NamedTuple):
+    """
+    dispatch 单台设备的执行结果
+
+    :param device: 设备对应的脚本实例
+    :param result: 返回值，异常时为 None
+    :param error: 执行异常，成功时为 None
+    :param elapsed: 耗时(秒)
+    """
+    device: Any
+    result: Any
+    error: Optional[Exception]
+    elapsed: float
+
+
+def _address_key(address: Union[str, Tuple[str, int]]) -> str:
+    if isinstance(address, str):
+        return address
+    return f"{address[0]}:{address[1]}"
+
+
+class DeviceRegistry:
+    """
+    线程安全的设备注册表，连接建立时自动登记，断开时自动注销
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 脚本实例 -> 登记信息
+        self._sessions: Dict[Any, Session] = {}
+        self._by_address: Dict[str, Session] = {}
+        # 标识名 -> 标识值 -> 登记信息(dict 作为有序集合)
+        self._indexes: Dict[str, Dict[str, Dict[Session, None]]] = {key: {} for key in _KEYS}
+
+    def register(self, handler, kind: str, address: Tuple[str, int]) -> Session:
+        """
+        登记连接，由脚本类在连接建立时调用
+
+        :param handler: 脚本实例
+        :param kind: 设备类型
+        :param address: 客户端地址
+        :return:
+        """
+        session = Session(handler, kind, address)
+        with self._lock:
+            self._sessions[handler] = session
+            self._by_address[session.address] = session
+        return session
+
+    def unregister(self, handler) -> None:
+        """
+        注销连接，由脚本类在连接断开时调用
+
+        :param handler: 脚本实例
+        :return:
+        """
+        with self._lock:
+            session = self._sessions.pop(handler, None)
+            if session is None:
+                return
+            session.alive = False
+            if self._by_address.get(session.address) is session:
+                del self._by_address[session.address]
+            for key in _KEYS:
+                self._unindex(session, key)
+
+    def _unindex(self, session: Session, key: str) -> None:
+        value = getattr(session, key)
+        if value is None:
+            return
+        sessions = self._indexes[key].get(value)
+        if sessions is not None:
+            sessions.pop(session, None)
+            if not sessions:
+                del self._indexes[key][value]
+
+    def update(self, handler, **keys: Optional[str]) -> None:
+        """
+        更新连接的设备标识并重建索引
+
+        :param handler: 脚本实例
+        :param keys: android_id / group_id / identifier
+        :return:
+        """
+        with self._lock:
+            session = self._sessions.get(handler)
+            if session is None:
+                return
+            for key, value in keys.items():
+                if key not in _KEYS:
+                    raise KeyError(f"unknown device key `{key}`, must be one of {_KEYS}")
+                self._unindex(session, key)
+                setattr(session, key, value)
+                if value is not None:
+                    self._indexes[key].setdefault(value, {})[session] = None
+
+    def session(self, handler) -> Optional[Session]:
+        """脚本实例对应的登记信息，已断开返回 None"""
+        with self._lock:
+            return self._sessions.get(handler)
+
+    def sessions(self, kind: str = None) -> List[Session]:
+        """
+        所有在线连接的登记信息
+
+        :param kind: 设备类型，默认全部
+        :return:
+        """
+        with self._lock:
+            return [session for session in self._sessions.values() if kind is None or session.kind == kind]
+
+    def devices(self, kind: str = None) -> list:
+        """
+        所有在线连接的脚本实例
+
+        :param kind: 设备类型，默认全部
+        :return:
+        """
+        return [session.handler for session in self.sessions(kind)]
+
+    def find(self, address: Union[str, Tuple[str, int]] = None, **keys: str) -> list:
+        """
+        按地址或设备标识查找在线连接，多个条件同时满足
+
+        :param address: 客户端地址，``"ip:port"`` 或 ``(ip, port)``
+        :param keys: android_id / group_id / identifier
+        :return: 脚本实例列表
+        """
+        with self._lock:
+            candidates = None
+            if address is not None:
+                session = self._by_address.get(_address_key(address))
+                candidates = [session] if session else []
+            for key, value in keys.items():
+                if key not in _KEYS:
+                    raise KeyError(f"unknown device key `{key}`, must be one of {_KEYS}")
+                matched = self._indexes[key].get(value, {})
+                if candidates is None:
+                    candidates = list(matched)
+                else:
+                    candidates = [session for session in candidates if session in matched]
+            if candidates is None:
+                candidates = list(self._sessions.values())
+            return [session.handler for session in candidates]
+
+    def get(self, address: Union[str, Tuple[str, int]] = None, **keys: str):
+        """
+        按地址或设备标识查找一个在线连接
+
+        :param address: 客户端地址，``"ip:port"`` 或 ``(ip, port)``
+        :param keys: android_id / group_id / identifier
+        :return: 脚本实例或者 None
+        """
+        devices = self.find(address, **keys)
+        return devices[0] if devices else None
+
+    def group(self, group_id: str) -> list:
+        """
+        投屏组内的所有在线设备
+
+        :param group_id: 投屏组号
+        :return: 脚本实例列表
+        """
+        return self.find(group_id=str(group_id))
+
+    def idle_sessions(self, seconds: float) -> List[Session]:
+        """
+        超过 seconds 秒没有成功通信的连接，用于发现卡死或掉线的设备
+
+        :param seconds: 空闲秒数
+        :return:
+        """
+        return [session for session in self.sessions() if session.idle > seconds]
+
+    def dispatch(self, devices: Iterable, method: Union[str, Callable], args: tuple = (), kwargs: dict = None,
+                 concurrency: int = 8) -> List[DispatchResult]:
+        """
+        把命令并发分发到多台设备
+
+        :param devices: 脚本实例或 Session 列表
+        :param method: 方法名，或者 ``callable(device, *args, **kwargs)``
+        :param args: 位置参数
+        :param kwargs: 关键字参数
+        :param concurrency: 最大并发数量，默认 8
+        :return: 每台设备的执行结果，顺序与 devices 一致，单台设备异常不影响其他设备
+        """
+        if concurrency < 1:
+            raise ValueError("`concurrency` must be >= 1.")
+
+        devices = [device.handler if isinstance(device, Session) else device for device in devices]
+        if not devices:
+            return []
+        kwargs = kwargs or {}
+
+        def call(device) -> DispatchResult:
+            start = time.perf_counter()
+            try:
+                if callable(method):
+                    result = method(device, *args, **kwargs)
+                else:
+                    result = getattr(device, method)(*args, **kwargs)
+            except Exception as e:
+                return DispatchResult(device, None, e, time.perf_counter() - start)
+            return DispatchResult(device, result, None, time.perf_counter() - start)
+
+        if len(devices) == 1:
+            return [call(devices[0])]
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(devices))) as pool:
+            return list(pool.map(call, devices))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def __contains__(self, handler) -> bool:
+        with self._lock:
+            return handler in self._sessions
+
+
+# 进程内全局注册表
+device_registry = DeviceRegistry()
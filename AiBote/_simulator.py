@@ -0,0 +1,341 @@
+"""
+设备模拟器，模拟 AiboteClient / WindowsDriver / WebDriver 连接脚本服务，用于压测和回归测试
+
+>>> simulator = DeviceSimulator("127.0.0.1", 3333, kind="android", latency=(0.005, 0.02))
+>>> simulator.run(count=1000)
+
+命令行：``python -m AiBote._simulator 3333 --count 1000 --kind android``
+
+大量设备同时连接时，需要调大脚本类的 ``request_queue_size``，否则超出监听队列的连接可能一直得不到处理。
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import random
+import struct
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from loguru import logger
+
+from ._codec import encode_response, read_request_async
+
+_Payload = Union[str, bytes, bytearray]
+_Fixture = Union[_Payload, List[_Payload], Callable[["FakeDevice", List[bytes]], _Payload]]
+_Latency = Union[float, Tuple[float, float]]
+
+_OCR_RESULT = "[[[[10.0, 20.0], [210.0, 20.0], [210.0, 60.0], [10.0, 60.0]], ('Aibote 模拟文字', 0.98)], " \
+              "[[[10.0, 80.0], [130.0, 80.0], [130.0, 120.0], [10.0, 120.0]], ('确定', 0.99)]]"
+
+
+def _png(width: int, height: int, color: Tuple[int, int, int]) -> bytes:
+    """
+    生成纯色的 RGB PNG 图片，不依赖图像处理库
+
+    :param width: 宽
+    :param height: 高
+    :param color: (r, g, b)
+    :return: PNG 字节
+    """
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    # 每行开头的 0 为过滤类型
+    rows = (b"\x00" + bytes(color) * width) * height
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+
+# 截图响应：与 getColor 一致的 #008577 纯色图片
+SCREENSHOT_PNG = _png(108, 234, (0x00, 0x85, 0x77))
+
+
+def _save_screenshot(device: "FakeDevice", args: List[bytes]) -> str:
+    # WindowsDriver 与脚本在同一台电脑上，截图写入请求中的文件路径
+    with open(args[2].decode("utf8"), "wb") as file:
+        file.write(SCREENSHOT_PNG)
+    return "true"
+
+
+# 安卓端 AiboteClient 默认响应
+ANDROID_FIXTURES: Dict[str, _Fixture] = {
+    "getColor": "#008577",
+    "findColor": "540|960",
+    "compareColor": "true",
+    "findImage": "540|960",
+    "findAnimation": "540|960",
+    "getElementRect": "100|200|300|400",
+    "getElementDescription": "描述",
+    "getElementText": "文本",
+    "existsElement": "true",
+    "isSelectedElement": "false",
+    "ocr": _OCR_RESULT,
+    "getAndroidId": lambda device, args: f"simulator-{device.index}",
+    "getGroup": "0",
+    "get_identifier": lambda device, args: str(device.index),
+    "getTitle": lambda device, args: f"simulator-{device.index}",
+    "getWindowSize": "1080|2340",
+    "getImageSize": "100|100",
+    "getInstalledPackages": "com.aibot.client|com.android.settings",
+    "getActivity": "com.aibot.client.MainActivity",
+    "getPackage": "com.aibot.client",
+    "getClipboardText": "",
+    "getScriptParam": "{}",
+    "getRotationAngle": "0",
+    "readAndroidFile": "null",
+    "takeScreenshot": SCREENSHOT_PNG,
+}
+
+# Windows 端 WindowsDriver 默认响应
+WINDOWS_FIXTURES: Dict[str, _Fixture] = {
+    "findWindow": "1050010",
+    "findWindows": "1050010|1050011",
+    "findSubWindow": "1050012",
+    "getWindowName": "Aibote",
+    "getWindowPos": "0|0|1920|1080",
+    "getColor": "#008577",
+    "findColor": "540|960",
+    "compareColor": "true",
+    "findImage": "540|960",
+    "findAnimation": "540|960",
+    "ocr": _OCR_RESULT,
+    "ocrByFile": _OCR_RESULT,
+    "getElementName": "名称",
+    "getElementValue": "文本",
+    "getElementRect": "100|200|300|400",
+    "getElementWindow": "1050013",
+    "getClipboardText": "",
+    "executeCommand": "",
+    "getExtendParam": "",
+    "getHidData": "null",
+    "saveScreenshot": _save_screenshot,
+}
+
+# WebDriver 默认响应
+WEB_FIXTURES: Dict[str, _Fixture] = {
+    "takeScreenshot": base64.b64encode(SCREENSHOT_PNG).decode("ascii"),
+    "getCurrentPageId": "page-1",
+    "getAllPageId": "page-1|page-2",
+    "getCurrentUrl": "https://www.aibote.net",
+    "getCurrentTitle": "Aibote",
+    "getElementText": "文本",
+    "getElementRect": "100|200|300|400",
+    "getElementAttr": "value",
+    "getElementOuterHTML": "<div></div>",
+    "getElementInnerHTML": "",
+    "getAlertText": "null",
+    "getWindowPos": '{"left": 0, "top": 0, "width": 1920, "height": 1080}',
+    "getCookies": "[]",
+    "getAllCookies": "[]",
+    "executeScript": "null",
+    "getExtendParam": "",
+}
+
+_KIND_FIXTURES = {
+    "android": ANDROID_FIXTURES,
+    "windows": WINDOWS_FIXTURES,
+    "web": WEB_FIXTURES,
+}
+
+
+def _payload(size: int) -> bytes:
+    """生成指定大小的二进制数据"""
+    pattern = bytes(range(256))
+    return (pattern * (size // len(pattern) + 1))[:size]
+
+
+class FakeDevice:
+    """
+    模拟单个设备：连接脚本服务，读取请求帧，按 fixtures 返回响应
+    """
+
+    def __init__(self, simulator: "DeviceSimulator", index: int):
+        self.simulator = simulator
+        self.index = index
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.commands = Counter()
+        # 列表类型 fixtures 的迭代器，按设备独立循环
+        self._cycles = {}
+
+    def response(self, args: List[bytes]) -> bytes:
+        """
+        计算请求对应的响应帧
+
+        :param args: 请求参数
+        :return: 响应帧
+        """
+        command = args[0].decode("utf8") if args else ""
+        simulator = self.simulator
+        fixture = simulator.fixtures.get(command, simulator.default_response)
+
+        if isinstance(fixture, (list, tuple)):
+            cycle = self._cycles.get(command)
+            if cycle is None:
+                cycle = self._cycles[command] = itertools.cycle(fixture)
+            fixture = next(cycle)
+        elif callable(fixture):
+            fixture = fixture(self, args)
+        else:
+            # 静态响应的帧只编码一次
+            return simulator.encoded(command, fixture)
+        return encode_response(fixture)
+
+    def latency(self, command: str) -> float:
+        latency = self.simulator.command_latency.get(command, self.simulator.latency)
+        if isinstance(latency, (list, tuple)):
+            return random.uniform(*latency)
+        return latency
+
+    async def run(self) -> None:
+        """连接脚本服务并持续响应请求，直到连接断开或收到 closeDriver"""
+        simulator = self.simulator
+        reader, writer = await asyncio.open_connection(simulator.host, simulator.port, limit=2 ** 20)
+        try:
+            while True:
+                try:
+                    args = await read_request_async(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                command = args[0].decode("utf8") if args else ""
+                self.requests += 1
+                self.commands[command] += 1
+                self.bytes_in += sum([len(arg) for arg in args])
+
+                latency = self.latency(command)
+                if latency > 0:
+                    await asyncio.sleep(latency)
+
+                data = self.response(args)
+                self.bytes_out += len(data)
+                writer.write(data)
+                await writer.drain()
+
+                if command == "closeDriver":
+                    break
+        finally:
+            writer.close()
+
+
+class DeviceSimulator:
+    """
+    批量模拟设备
+
+    :param host: 脚本服务地址
+    :param port: 脚本服务端口
+    :param kind: 设备类型，android / windows / web，决定默认 fixtures
+    :param fixtures: 自定义响应，覆盖默认值；值可以是字符串/字节、列表(按顺序循环返回)或 ``callable(device, args)``
+    :param latency: 响应延迟(秒)，可以是固定值或 (最小值, 最大值) 随机区间
+    :param command_latency: 指定命令的响应延迟，覆盖 latency
+    :param payload_sizes: 指定命令返回的二进制数据大小(字节)，如 ``{"takeScreenshot": 2 * 1024 * 1024}``
+    :param default_response: 未配置命令的默认响应
+    """
+
+    def __init__(self, host: str, port: int, kind: str = "android", fixtures: Dict[str, _Fixture] = None,
+                 latency: _Latency = 0, command_latency: Dict[str, _Latency] = None,
+                 payload_sizes: Dict[str, int] = None, default_response: _Payload = "true"):
+        if kind not in _KIND_FIXTURES:
+            raise ValueError(f"`kind` must be one of {list(_KIND_FIXTURES)}.")
+
+        self.host = host
+        self.port = port
+        self.kind = kind
+        self.fixtures = dict(_KIND_FIXTURES[kind])
+        for command, size in (payload_sizes or {}).items():
+            self.fixtures[command] = _payload(size)
+        if fixtures:
+            self.fixtures.update(fixtures)
+        self.latency = latency
+        self.command_latency = command_latency or {}
+        self.default_response = default_response
+        self.devices: List[FakeDevice] = []
+        self._encoded = {}
+
+    def encoded(self, command: str, payload: _Payload) -> bytes:
+        """静态响应编码后缓存，避免大数据每次请求重复编码"""
+        frame = self._encoded.get(command)
+        if frame is None or frame[0] is not payload:
+            frame = self._encoded[command] = (payload, bytes(encode_response(payload)))
+        return frame[1]
+
+    async def start(self, count: int = 1, connect_rate: Optional[float] = None) -> None:
+        """
+        启动 count 个设备并等待它们全部断开
+
+        :param count: 设备数量
+        :param connect_rate: 每秒建立的连接数，None 表示同时连接
+        :return:
+        """
+        tasks = []
+        for _ in range(count):
+            device = FakeDevice(self, len(self.devices))
+            self.devices.append(device)
+            tasks.append(asyncio.create_task(device.run()))
+            if connect_rate:
+                await asyncio.sleep(1 / connect_rate)
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for device, result in zip(self.devices[-count:], results):
+            if isinstance(result, Exception):
+                logger.warning(f"simulator device {device.index} error: {result!r}")
+
+    def run(self, count: int = 1, connect_rate: Optional[float] = None) -> None:
+        """
+        同步启动 count 个设备，阻塞直到全部断开
+
+        .. seealso::
+            :meth:`start`
+        """
+        asyncio.run(self.start(count, connect_rate))
+
+    def stats(self) -> dict:
+        """
+        汇总所有设备的请求统计
+
+        :return: 请求数、收发字节数和各命令调用次数
+        """
+        commands = Counter()
+        for device in self.devices:
+            commands.update(device.commands)
+        return {
+            "devices": len(self.devices),
+            "requests": sum([device.requests for device in self.devices]),
+            "bytes_in": sum([device.bytes_in for device in self.devices]),
+            "bytes_out": sum([device.bytes_out for device in self.devices]),
+            "commands": dict(commands),
+        }
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m AiBote._simulator", description="Aibote 设备模拟器")
+    parser.add_argument("port", type=int, help="脚本服务端口")
+    parser.add_argument("--host", default="127.0.0.1", help="脚本服务地址")
+    parser.add_argument("--kind", default="android", choices=list(_KIND_FIXTURES), help="设备类型")
+    parser.add_argument("--count", type=int, default=1, help="设备数量")
+    parser.add_argument("--connect-rate", type=float, default=None, help="每秒建立的连接数")
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0], help="响应延迟(秒)，传两个值时为随机区间")
+    parser.add_argument("--screenshot-size", type=int, default=None, help="takeScreenshot 返回数据大小(字节)")
+    args = parser.parse_args(argv)
+
+    latency = args.latency[0] if len(args.latency) == 1 else tuple(args.latency[:2])
+    payload_sizes = {"takeScreenshot": args.screenshot_size} if args.screenshot_size else None
+    simulator = DeviceSimulator(args.host, args.port, kind=args.kind, latency=latency, payload_sizes=payload_sizes)
+
+    start = time.perf_counter()
+    try:
+        simulator.run(args.count, args.connect_rate)
+    except KeyboardInterrupt:
+        pass
+    stats = simulator.stats()
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+模板库：索引一个目录下的模板图片，灰度、阈值处理和金字塔缩放只计算一次
+
+预处理结果以 ``.npy`` 文件缓存在磁盘上（按文件哈希和算法参数命名），之后以内存映射方式加载，
+内存中按 LRU 淘汰，适合成千上万张模板的本地找图。模板的文件哈希记录在索引文件中，新计算的哈希在预加载、
+重新扫描结束时或 :meth:`TemplateLibrary.close`（进程退出时自动调用）时一次写入。
+
+>>> library = TemplateLibrary("img")
+>>> self.find_local_images(library["buttons/ok.png"], algorithm=(0, 127, 255))
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from ._frame import _require_numpy
+from ._matcher import _resize, apply_algorithm, load_image, to_gray
+from ._utils import _Algorithm
+
+# 默认索引的图片格式
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".bmp")
+
+# 磁盘缓存目录名和索引文件名
+CACHE_DIR_NAME = ".aibote_cache"
+INDEX_FILE_NAME = "index.json"
+
+_Algorithm_Key = Tuple[int, int, int]
+
+
+def _algorithm_key(algorithm: _Algorithm = None) -> _Algorithm_Key:
+    """算法参数归一化，等价的参数得到同一个缓存键"""
+    if not algorithm or not any(algorithm):
+        return 0, 0, 0
+    algorithm_type, threshold, max_val = (int(value) for value in algorithm)
+    if algorithm_type in (5, 6):
+        threshold, max_val = 127, 255
+    if threshold == 255 and max_val == 255:
+        # 只做灰度处理，与原图相同
+        return 0, 0, 0
+    return algorithm_type, threshold, max_val
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_npy(path: str, array: "np.ndarray") -> None:
+    """先写临时文件再改名，多个进程同时预处理同一张模板也不会读到写了一半的文件"""
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.save(file, array)
+    os.replace(temp_path, path)
+
+
+class Template:
+    """
+    模板库中的一张模板，传给找图方法时按截图的缩放率和算法取用预处理结果
+
+    :param library: 所属模板库
+    :param name: 模板名称，即相对模板目录的路径
+    """
+    __slots__ = ("library", "name")
+
+    def __init__(self, library: "TemplateLibrary", name: str):
+        self.library = library
+        self.name = name
+
+    def pyramid(self, algorithm: _Algorithm = None) -> List["np.ndarray"]:
+        """
+        按算法处理后的图像金字塔，第 i 层的边长为原图的 ``1 / 2 ** i``
+
+        :param algorithm: 处理模板所用的算法
+        :return:
+        """
+        return self.library.pyramid(self.name, algorithm)
+
+    def prepare(self, scale: float, algorithm: _Algorithm = None) -> "np.ndarray":
+        """
+        取与截图缩放率最接近的金字塔层，缩放率不是 2 的整数次幂分之一时再从该层缩放
+
+        :param scale: 截图缩放率
+        :param algorithm: 处理模板所用的算法
+        :return: uint8 灰度图
+        """
+        levels = self.pyramid(algorithm)
+        level = 0
+        while level + 1 < len(levels) and scale <= 0.5 ** (level + 1):
+            level += 1
+        rest = scale * 2 ** level
+        if abs(rest - 1) < 1e-6:
+            return levels[level]
+        return apply_algorithm(_resize(self.library.gray_level(self.name, level), rest), algorithm)
+
+    def __repr__(self):
+        return f"Template({self.name!r})"
+
+
+class _Entry:
+    __slots__ = ("path", "mtime_ns", "size", "digest")
+
+    def __init__(self, path: str, mtime_ns: int, size: int, digest: Optional[str] = None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.digest = digest
+
+
+class TemplateLibrary:
+    """
+    模板库
+
+    :param directory: 模板目录，递归索引其中的图片
+    :param cache_dir: 预处理结果的缓存目录，默认 ``<directory>/.aibote_cache``
+    :param memory_budget: 内存中保留的预处理结果的最大字节数，超出后按最近最少使用淘汰，默认 256MB
+    :param levels: 金字塔层数，默认 4 层（原图、1/2、1/4、1/8）
+    """
+
+    def __init__(self, directory: str, cache_dir: str = None, memory_budget: int = 256 * 2 ** 20, levels: int = 4):
+        _require_numpy()
+        if levels < 1:
+            raise ValueError("`levels` must be >= 1.")
+        self.directory = os.path.abspath(directory)
+        self.cache_dir = cache_dir or os.path.join(self.directory, CACHE_DIR_NAME)
+        self.memory_budget = memory_budget
+        self.levels = levels
+
+        self._lock = threading.RLock()
+        self._entries: Dict[str, _Entry] = {}
+        # 有新计算的哈希尚未写入索引文件
+        self._dirty = False
+        # (文件哈希, 算法键) -> 金字塔，按使用顺序排列
+        self._cache: "OrderedDict[Tuple[str, _Algorithm_Key], List[np.ndarray]]" = OrderedDict()
+        self._memory = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refresh()
+        atexit.register(self.close)
+
+    # #############
+    #   索引相关   #
+    # #############
+    def refresh(self) -> None:
+        """重新扫描模板目录，文件大小和修改时间未变的模板沿用磁盘索引中的哈希"""
+        stored = self._load_index()
+        entries = {}
+        for root, dirs, files in os.walk(self.directory):
+            dirs[:] = [name for name in dirs if os.path.join(root, name) != self.cache_dir]
+            for file_name in files:
+                if not file_name.lower().endswith(IMAGE_SUFFIXES):
+                    continue
+                path = os.path.join(root, file_name)
+                stat = os.stat(path)
+                name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                digest = None
+                record = stored.get(name)
+                if record and record[0] == stat.st_mtime_ns and record[1] == stat.st_size:
+                    digest = record[2]
+                entries[name] = _Entry(path, stat.st_mtime_ns, stat.st_size, digest)
+        with self._lock:
+            # 之前计算的哈希在文件未变时保留，不必重新计算
+            for name, entry in entries.items():
+                previous = self._entries.get(name)
+                if entry.digest is None and previous is not None and previous.digest and \
+                        (previous.mtime_ns, previous.size) == (entry.mtime_ns, entry.size):
+                    entry.digest = previous.digest
+            self._entries = entries
+        self.save_index()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME)
+
+    def _load_index(self) -> Dict[str, list]:
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self) -> None:
+        """
+        把新计算的哈希写入索引文件，没有新哈希时不做任何操作
+
+        与磁盘上的索引合并后写入，多个进程共用一个模板目录时不会覆盖其他进程记录的哈希。
+
+        :return:
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            records = {name: [entry.mtime_ns, entry.size, entry.digest]
+                       for name, entry in self._entries.items() if entry.digest}
+            names = set(self._entries)
+        stored = self._load_index()
+        merged = {name: record for name, record in stored.items() if name in names and name not in records}
+        merged.update(records)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{self._index_path()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(merged, file)
+        os.replace(temp_path, self._index_path())
+
+    def _entry(self, name: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"模板不存在: {name}")
+        if entry.digest is None:
+            digest = _file_hash(entry.path)
+            with self._lock:
+                entry.digest = digest
+                self._dirty = True
+        return entry
+
+    def names(self) -> List[str]:
+        """所有模板名称"""
+        with self._lock:
+            return sorted(self._entries)
+
+    def __getitem__(self, name: str) -> Template:
+        if name not in self:
+            raise KeyError(f"模板不存在: {name}")
+        return Template(self, name)
+
+    def __contains__(self, name: str) -> bool:
+        with self._lock:
+            return name in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    # ###############
+    #   预处理相关   #
+    # ###############
+    def _cache_paths(self, digest: str, key: _Algorithm_Key) -> List[str]:
+        prefix = os.path.join(self.cache_dir, f"{digest}_{key[0]}_{key[1]}_{key[2]}")
+        return [f"{prefix}_{level}.npy" for level in range(self.levels)]
+
+    def _build(self, entry: _Entry, key: _Algorithm_Key) -> List["np.ndarray"]:
+        gray = to_gray(load_image(entry.path))
+        algorithm = key if any(key) else None
+        return [apply_algorithm(_resize(gray, 0.5 ** level), algorithm) for level in range(self.levels)]
+
+    def pyramid(self, name: str, algorithm: _Algorithm = None) -> List["np.ndarray"]:
+        """
+        模板按算法处理后的图像金字塔，依次从内存、磁盘缓存、原图获取
+
+        :param name: 模板名称
+        :param algorithm: 处理模板所用的算法
+        :return:
+        """
+        entry = self._entry(name)
+        cache_key = (entry.digest, _algorithm_key(algorithm))
+        with self._lock:
+            levels = self._cache.get(cache_key)
+            if levels is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return levels
+            self.misses += 1
+
+        paths = self._cache_paths(*cache_key)
+        try:
+            levels = [np.load(path, mmap_mode="r") for path in paths]
+        except (OSError, ValueError):
+            levels = self._build(entry, cache_key[1])
+            os.makedirs(self.cache_dir, exist_ok=True)
+            for path, level in zip(paths, levels):
+                _save_npy(path, level)
+
+        with self._lock:
+            if cache_key not in self._cache:
+                self._cache[cache_key] = levels
+                self._memory += sum(level.nbytes for level in levels)
+                self._evict()
+        return levels
+
+    def gray_level(self, name: str, level: int) -> "np.ndarray":
+        """模板灰度金字塔的第 level 层"""
+        return self.pyramid(name)[level]
+
+    def _evict(self) -> None:
+        # 至少保留最近使用的一项
+        while self._memory > self.memory_budget and len(self._cache) > 1:
+            _, levels = self._cache.popitem(last=False)
+            self._memory -= sum(level.nbytes for level in levels)
+            self.evictions += 1
+
+    def preload(self, names: Iterable[str] = None, algorithm: _Algorithm = None) -> None:
+        """
+        预先生成磁盘缓存，避免首次找图时的解码开销
+
+        :param names: 模板名称，默认全部
+        :param algorithm: 处理模板所用的算法
+        :return:
+        """
+        for name in names if names is not None else self.names():
+            self.pyramid(name, algorithm)
+        self.save_index()
+
+    @property
+    def memory(self) -> int:
+        """内存中预处理结果的字节数"""
+        return self._memory
+
+    def clear(self) -> None:
+        """清空内存中的预处理结果，磁盘缓存保留"""
+        with self._lock:
+            self._cache.clear()
+            self._memory = 0
+
+    def close(self) -> None:
+        """写入尚未保存的哈希，进程退出时自动调用"""
+        self.save_index()
+        atexit.unregister(self.close)
+
+    def __repr__(self):
+        return f"TemplateLibrary({self.directory!r}, templates={len(self)}, memory={self._memory})"
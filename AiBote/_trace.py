@@ -0,0 +1,247 @@
+"""
+命令追踪：记录脚本运行期间每个公开方法调用、收发数据和等待休眠的耗时，写入 Chrome trace 或 OTLP-JSON 文件
+
+默认关闭，关闭时不包装任何方法；设置 ``tracer`` 后每个连接建立时把实例的公开方法和收发方法替换为记录 span 的包装，
+方法中再调用的其他方法（包括 ``__send_data`` 和等待循环中的休眠）记录为子 span。
+
+>>> class CustomAndroidScript(AndroidBotMain):
+...     tracer = Tracer("trace.json")  # 在 chrome://tracing 或 https://ui.perfetto.dev 中打开
+...     tracer = Tracer("trace.jsonl", format="otlp")  # OTLP-JSON，每行一个 ExportTraceServiceRequest
+
+Chrome trace 使用 JSON 数组格式，span 结束后追加写入，结尾的 ``]`` 可以省略，脚本中途退出也能打开已写入的部分。
+"""
+import atexit
+import contextlib
+import functools
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from ._logging import _preview
+
+# 参数摘要中每个参数最多显示的字符数
+ARG_LIMIT = 64
+
+_local = threading.local()
+_NULL = contextlib.nullcontext()
+
+# 除公开方法外需要记录的收发方法
+_SEND_METHODS = ("__send_data", "__send_data_return_bytes", "__push_file", "__pull_file")
+_SKIP_METHODS = {"setup", "handle", "finish"}
+
+
+def _summary(args: tuple, kwargs: dict) -> Dict[str, str]:
+    result = {f"arg{index}": _preview(arg, ARG_LIMIT) for index, arg in enumerate(args)}
+    result.update((key, _preview(value, ARG_LIMIT)) for key, value in kwargs.items())
+    return result
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "device", "args", "span_id", "parent_id", "thread", "start", "error")
+
+    def __init__(self, tracer: "Tracer", name: str, device: str, args: Dict[str, str]):
+        self.tracer = tracer
+        self.name = name
+        self.device = device
+        self.args = args
+        self.error: Optional[str] = None
+
+    def __enter__(self) -> "_Span":
+        stack = _stack()
+        self.parent_id = stack[-1].span_id if stack else 0
+        self.span_id = next(self.tracer._ids)
+        self.thread = threading.get_ident()
+        stack.append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter_ns()
+        _stack().pop()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer._record(self, end)
+
+
+def _stack() -> List[_Span]:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def span(name: str, **args: Any):
+    """
+    当前线程正在追踪时记录一个 span，否则返回空的上下文管理器
+
+    :param name: span 名称
+    :param args: 参数摘要
+    :return:
+    """
+    stack = getattr(_local, "stack", None)
+    if not stack:
+        return _NULL
+    parent = stack[-1]
+    return _Span(parent.tracer, name, parent.device, _summary((), args))
+
+
+def sleep(seconds: float) -> None:
+    """``time.sleep``，正在追踪时记录为 sleep span"""
+    with span("sleep", seconds=seconds):
+        time.sleep(seconds)
+
+
+class Tracer:
+    """
+    把 span 写入追踪文件
+
+    :param path: 文件路径
+    :param format: ``chrome`` 为 Chrome trace 事件，``otlp`` 为 OTLP-JSON
+    :param flush_size: 缓存多少个 span 后写入文件
+    """
+
+    def __init__(self, path: str, format: str = "chrome", flush_size: int = 1000):
+        if format not in ("chrome", "otlp"):
+            raise ValueError(f"不支持的追踪格式: {format}")
+        self.path = path
+        self.format = format
+        self.flush_size = flush_size
+        self._lock = threading.Lock()
+        self._spans: List[Tuple[_Span, int]] = []
+        self._ids = itertools.count(1)
+        # (设备地址, 线程) -> Chrome trace 的 tid
+        self._threads: Dict[Tuple[str, int], int] = {}
+        self._pid = os.getpid()
+        # perf_counter 与 Unix 时间的差，OTLP 使用 Unix 纳秒时间戳
+        self._epoch = time.time_ns() - time.perf_counter_ns()
+        self._started = False
+        atexit.register(self.flush)
+
+    def _record(self, span_: _Span, end: int) -> None:
+        with self._lock:
+            self._spans.append((span_, end))
+            full = len(self._spans) >= self.flush_size
+        if full:
+            self.flush()
+
+    def instrument(self, bot, device: str) -> None:
+        """
+        把实例的公开方法和收发方法替换为记录 span 的包装，由脚本类在连接建立时调用
+
+        :param bot: 脚本实例
+        :param device: 设备地址
+        :return:
+        """
+        for cls in type(bot).__mro__:
+            for name, value in vars(cls).items():
+                if not inspect.isfunction(value) or name in _SKIP_METHODS or name in bot.__dict__:
+                    continue
+                if name.startswith("_"):
+                    # 私有的收发方法名称经过改写，例如 _AndroidBotMain__send_data
+                    label = name[len(cls.__name__) + 1:] if name.startswith(f"_{cls.__name__}__") else name
+                    if label not in _SEND_METHODS and name != "_send_batch":
+                        continue
+                    label = label.lstrip("_")
+                else:
+                    label = name
+                setattr(bot, name, self._wrap(getattr(bot, name), label, device))
+
+    def _wrap(self, method: Callable, name: str, device: str) -> Callable:
+        @functools.wraps(method)
+        def traced(*args, **kwargs):
+            with _Span(self, name, device, _summary(args, kwargs)):
+                return method(*args, **kwargs)
+
+        return traced
+
+    def span(self, name: str, device: str = "", **args: Any) -> _Span:
+        """
+        手动记录一个 span，例如脚本中的一个步骤
+
+        :param name: span 名称
+        :param device: 设备地址，默认与外层 span 相同
+        :param args: 参数摘要
+        :return:
+        """
+        stack = _stack()
+        return _Span(self, name, device or (stack[-1].device if stack else ""), _summary((), args))
+
+    def flush(self) -> None:
+        """把缓存的 span 写入文件"""
+        with self._lock:
+            spans, self._spans = self._spans, []
+            if not spans and self._started:
+                return
+            if self.format == "chrome":
+                lines = self._chrome(spans)
+            else:
+                lines = [self._otlp(spans)] if spans else []
+            mode = "a" if self._started else "w"
+            self._started = True
+            with open(self.path, mode, encoding="utf8") as file:
+                if mode == "w" and self.format == "chrome":
+                    file.write("[\n")
+                for line in lines:
+                    file.write(line + ",\n" if self.format == "chrome" else line + "\n")
+
+    def _tid(self, device: str, thread: int, events: list) -> int:
+        key = (device, thread)
+        tid = self._threads.get(key)
+        if tid is None:
+            tid = self._threads[key] = len(self._threads) + 1
+            events.append({"name": "thread_name", "ph": "M", "pid": self._pid, "tid": tid,
+                           "args": {"name": f"{device or 'script'} #{tid}"}})
+        return tid
+
+    def _chrome(self, spans: List[Tuple[_Span, int]]) -> List[str]:
+        events = []
+        for span_, end in spans:
+            args = dict(span_.args)
+            if span_.error:
+                args["error"] = span_.error
+            events.append({"name": span_.name, "cat": "aibote", "ph": "X", "pid": self._pid,
+                           "tid": self._tid(span_.device, span_.thread, events),
+                           "ts": span_.start / 1000, "dur": (end - span_.start) / 1000, "args": args})
+        return [json.dumps(event, ensure_ascii=False, separators=(",", ":")) for event in events]
+
+    def _trace_id(self, device: str) -> str:
+        return hashlib.md5(f"{self._epoch}/{device}".encode("utf8")).hexdigest()
+
+    def _otlp(self, spans: List[Tuple[_Span, int]]) -> str:
+        otlp_spans = []
+        for span_, end in spans:
+            attributes = [{"key": "aibote.device", "value": {"stringValue": span_.device}}]
+            attributes += [{"key": f"aibote.{key}", "value": {"stringValue": value}}
+                           for key, value in span_.args.items()]
+            item = {
+                # 每个连接一个 trace
+                "traceId": self._trace_id(span_.device),
+                "spanId": f"{span_.span_id:016x}",
+                "name": span_.name,
+                "kind": 1,
+                "startTimeUnixNano": str(self._epoch + span_.start),
+                "endTimeUnixNano": str(self._epoch + end),
+                "attributes": attributes,
+                "status": {"code": 2, "message": span_.error} if span_.error else {},
+            }
+            if span_.parent_id:
+                item["parentSpanId"] = f"{span_.parent_id:016x}"
+            otlp_spans.append(item)
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "aibote"}}]},
+            "scopeSpans": [{"scope": {"name": "AiBote"}, "spans": otlp_spans}],
+        }]}
+        return json.dumps(request, ensure_ascii=False, separators=(",", ":"))
+
+    def close(self) -> None:
+        """写入剩余的 span"""
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def __repr__(self):
+        return f"Tracer(path={self.path!r}, format={self.format!r})"
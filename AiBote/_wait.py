@@ -0,0 +1,279 @@
+"""
+等待引擎：所有 ``wait_time`` / ``interval_time`` 类方法共用的轮询逻辑
+
+- 自适应退避：第一次立即检查，之后的间隔从 ``WAIT_FIRST_INTERVAL`` 开始按倍数增长，上限为
+  ``interval_time * WAIT_MAX_FACTOR``，并加入随机抖动，避免大量设备同步轮询；
+- 单调时钟：使用 ``time.monotonic``，不受系统时间调整影响；
+- 截止时间传递：在 :func:`deadline` 中或在等待的检查函数中再发起的等待，不会超过外层剩余的时间；
+- 推送唤醒：等待期间调用 :meth:`Notifier.notify`（例如其他线程执行了输入命令、设备推送了事件）会立即重新检查，
+  检查函数自己发出的通知不会唤醒本次等待。
+"""
+import asyncio
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from ._trace import span as trace_span
+
+# 第一次重试前的间隔(秒)
+WAIT_FIRST_INTERVAL = 0.05
+# 间隔增长倍数
+WAIT_BACKOFF_FACTOR = 2.0
+# 间隔上限为 interval_time 的倍数
+WAIT_MAX_FACTOR = 2.0
+# 随机抖动比例，间隔在 ±WAIT_JITTER 范围内浮动
+WAIT_JITTER = 0.2
+
+_T = TypeVar("_T")
+
+_current_deadline: "contextvars.ContextVar[Optional[Deadline]]" = contextvars.ContextVar("aibote_deadline",
+                                                                                         default=None)
+
+
+class Deadline:
+    """
+    截止时间，基于单调时钟
+
+    :param seconds: 从现在开始的秒数
+    """
+    __slots__ = ("end",)
+
+    def __init__(self, seconds: float):
+        self.end = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """剩余秒数，已超时返回 0"""
+        return max(0.0, self.end - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.end
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.3f})"
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前上下文中生效的截止时间"""
+    return _current_deadline.get()
+
+
+def bounded(seconds: float) -> Deadline:
+    """
+    从现在开始 seconds 秒的截止时间，不超过外层截止时间
+
+    :param seconds: 秒数
+    :return:
+    """
+    deadline_ = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.end < deadline_.end:
+        deadline_.end = outer.end
+    return deadline_
+
+
+@contextlib.contextmanager
+def deadline(seconds: float):
+    """
+    限定一组操作的总时长，其中每个等待类方法最多等待剩余的时间
+
+    :param seconds: 总时长(秒)
+    :return:
+
+    Examples:
+
+    >>> with deadline(10):
+    ...     self.click_element("//*[@text='登录']")
+    ...     self.find_image("ok.png", wait_time=30)  # 最多等待剩余的时间
+    """
+    token = _current_deadline.set(bounded(seconds))
+    try:
+        yield _current_deadline.get()
+    finally:
+        _current_deadline.reset(token)
+
+
+class Backoff:
+    """
+    轮询间隔序列：从 first 开始按 factor 倍增长到 maximum，每次加入 ±jitter 的随机抖动
+
+    :param maximum: 最大间隔
+    :param first: 第一次间隔
+    :param factor: 增长倍数
+    :param jitter: 抖动比例
+    """
+
+    def __init__(self, maximum: float, first: float = WAIT_FIRST_INTERVAL, factor: float = WAIT_BACKOFF_FACTOR,
+                 jitter: float = WAIT_JITTER):
+        self.maximum = max(0.0, maximum)
+        self.first = min(first, self.maximum)
+        self.factor = factor
+        self.jitter = jitter
+        self._next = self.first
+
+    def next(self) -> float:
+        """下一次的间隔"""
+        delay = self._next
+        self._next = min(self.maximum, self._next * self.factor)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return delay
+
+    def reset(self) -> None:
+        """收到通知后从最短间隔重新开始"""
+        self._next = self.first
+
+
+class Notifier:
+    """
+    等待唤醒器，每个连接一个；调用 :meth:`notify` 后正在等待的轮询立即重新检查
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self.version = 0
+        # 每个线程最近一次通知后的 version
+        self._own = threading.local()
+
+    def notify(self) -> None:
+        """唤醒所有等待中的轮询"""
+        with self._condition:
+            self.version += 1
+            self._own.version = self.version
+            self._condition.notify_all()
+
+    def own_version(self) -> int:
+        """当前线程最近一次通知后的 version，没有通知过时为 0"""
+        return getattr(self._own, "version", 0)
+
+    def wait(self, timeout: float, version: int) -> bool:
+        """
+        等待 timeout 秒或者被唤醒
+
+        :param timeout: 等待秒数
+        :param version: 检查前读取的 version，期间已有通知时立即返回
+        :return: 是否被唤醒
+        """
+        with self._condition:
+            if self.version == version:
+                self._condition.wait(timeout)
+            return self.version != version
+
+
+def _backoff(interval_time: float, adaptive: bool) -> Backoff:
+    if adaptive:
+        return Backoff(interval_time * WAIT_MAX_FACTOR)
+    return Backoff(interval_time, interval_time, 1.0, 0.0)
+
+
+def wait_until(check: Callable[[], _T], wait_time: float, interval_time: float, notifier: Notifier = None,
+               adaptive: bool = True, accept: Callable[[_T], bool] = bool) -> Optional[_T]:
+    """
+    轮询 check 直到结果被接受或超时，超时前最后再检查一次
+
+    :param check: 检查函数
+    :param wait_time: 等待时间(秒)，不超过外层截止时间
+    :param interval_time: 轮询间隔，自适应时为间隔上限的基准
+    :param notifier: 唤醒器
+    :param adaptive: 是否自适应退避，False 时按固定间隔轮询
+    :param accept: 判断结果是否成功，默认真值为成功
+    :return: 第一个成功的结果，超时返回最后一次的结果
+    """
+    deadline_ = bounded(wait_time)
+    backoff = _backoff(interval_time, adaptive)
+
+    token = _current_deadline.set(deadline_)
+    try:
+        while True:
+            version = notifier.version if notifier else 0
+            result = check()
+            if accept(result):
+                return result
+            if notifier is not None:
+                # 检查函数自己执行的输入命令（例如 clickElement）不唤醒本次等待，否则会不停地立即重试
+                version = max(version, notifier.own_version())
+            remaining = deadline_.remaining()
+            if remaining <= 0:
+                return result
+            delay = min(backoff.next(), remaining)
+            with trace_span("sleep", seconds=delay):
+                if notifier is not None:
+                    if notifier.wait(delay, version):
+                        backoff.reset()
+                else:
+                    time.sleep(delay)
+    finally:
+        _current_deadline.reset(token)
+
+
+
+class Waiter:
+    """
+    脚本类共用的等待方法，子类需要提供 ``wait_timeout``、``interval_timeout``、``adaptive_wait`` 属性和
+    :class:`Notifier` 类型的 ``_notifier``
+    """
+    wait_timeout: float
+    interval_timeout: float
+    adaptive_wait: bool
+    _notifier: Notifier
+
+    def wait_until(self, condition: Callable[[], _T], wait_time: float = None, interval_time: float = None,
+                   accept: Callable[[_T], bool] = bool) -> Optional[_T]:
+        """
+        轮询 condition 直到结果成功或超时，所有等待类方法都使用这一逻辑
+
+        第一次立即检查，之后的间隔从 0.05 秒开始倍增，上限为 ``interval_time`` 的 2 倍；
+        在 :func:`AiBote.deadline` 中调用时不超过剩余的时间；其他线程调用 :meth:`wake_waiters` 或执行输入命令时立即重新检查。
+
+        :param condition: 检查函数
+        :param wait_time: 等待时间，默认取 self.wait_timeout
+        :param interval_time: 轮询间隔，默认取 self.interval_timeout
+        :param accept: 判断结果是否成功，默认真值为成功
+        :return: 第一个成功的结果，超时返回最后一次的结果
+        """
+        if wait_time is None:
+            wait_time = self.wait_timeout
+
+        if interval_time is None:
+            interval_time = self.interval_timeout
+
+        return wait_until(condition, wait_time, interval_time, self._notifier, self.adaptive_wait, accept)
+
+    def wake_waiters(self) -> None:
+        """
+        唤醒本连接正在等待的方法立即重新检查，用于接入设备推送、回调等外部事件
+
+        :return:
+        """
+        self._notifier.notify()
+
+async def async_wait_until(check: Callable[[], Awaitable[_T]], wait_time: float, interval_time: float,
+                           adaptive: bool = True, accept: Callable[[_T], bool] = bool) -> Optional[_T]:
+    """
+    :func:`wait_until` 的协程版本，等待期间让出事件循环
+
+    :param check: 检查协程函数
+    :param wait_time: 等待时间(秒)
+    :param interval_time: 轮询间隔
+    :param adaptive: 是否自适应退避
+    :param accept: 判断结果是否成功，默认真值为成功
+    :return: 第一个成功的结果，超时返回最后一次的结果
+    """
+    deadline_ = bounded(wait_time)
+    backoff = _backoff(interval_time, adaptive)
+
+    token = _current_deadline.set(deadline_)
+    try:
+        while True:
+            result = await check()
+            if accept(result):
+                return result
+            remaining = deadline_.remaining()
+            if remaining <= 0:
+                return result
+            await asyncio.sleep(min(backoff.next(), remaining))
+    finally:
+        _current_deadline.reset(token)
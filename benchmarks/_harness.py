@@ -0,0 +1,193 @@
+"""
+基准测试公共部分：在本地启动脚本服务，用设备模拟器子进程作为客户端，在 script_main 中执行并统计测试场景
+"""
+import multiprocessing
+import socket
+import socketserver
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+from AiBote._simulator import DeviceSimulator
+
+spawn = multiprocessing.get_context("spawn")
+
+
+class Scenario(NamedTuple):
+    """
+    测试场景
+
+    :param name: 场景名称
+    :param call: ``call(bot)``，执行一次被测命令
+    :param iterations: 计时调用次数
+    :param size: 传输数据大小(字节)，非大数据场景为 None
+    """
+    name: str
+    call: Callable[[object], object]
+    iterations: int
+    size: Optional[int] = None
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _CountingSocket:
+    """
+    统计收发字节数的 socket 代理，只在单次探测调用时替换，不影响计时
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self.sent = 0
+        self.received = 0
+
+    def sendall(self, data) -> None:
+        self._sock.sendall(data)
+        self.sent += memoryview(data).nbytes
+
+    def sendfile(self, file, offset: int = 0, count: int = None) -> int:
+        size = self._sock.sendfile(file, offset, count)
+        self.sent += size
+        return size
+
+    def recv_into(self, buffer, nbytes: int = 0, flags: int = 0) -> int:
+        size = self._sock.recv_into(buffer, nbytes, flags)
+        self.received += size
+        return size
+
+    def recv(self, bufsize: int, flags: int = 0) -> bytes:
+        data = self._sock.recv(bufsize, flags)
+        self.received += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _probe(bot, scenario: Scenario) -> Dict[str, int]:
+    """
+    单次探测调用：统计线路字节数，并用 tracemalloc 统计调用期间的峰值内存分配，近似为复制的字节数
+    """
+    counting = _CountingSocket(bot.request)
+    reader_sock = bot._reader._sock
+    bot.request = counting
+    bot._reader._sock = counting
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        scenario.call(bot)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        bot.request = counting._sock
+        bot._reader._sock = reader_sock
+    return {
+        "bytes_sent": counting.sent,
+        "bytes_received": counting.received,
+        "bytes_copied": max(0, peak - baseline),
+    }
+
+
+def measure(bot, scenario: Scenario, warmup: int = 3) -> dict:
+    """
+    执行一个测试场景
+
+    :param bot: 脚本实例
+    :param scenario: 测试场景
+    :param warmup: 预热调用次数
+    :return: 场景统计结果
+    """
+    for _ in range(min(warmup, scenario.iterations)):
+        scenario.call(bot)
+
+    latencies = []
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for _ in range(scenario.iterations):
+        begin = perf_counter()
+        scenario.call(bot)
+        latencies.append(perf_counter() - begin)
+    elapsed = perf_counter() - start
+
+    latencies.sort()
+    result = {
+        "scenario": scenario.name,
+        "size": scenario.size,
+        "calls": scenario.iterations,
+        "calls_per_sec": round(scenario.iterations / elapsed, 2) if elapsed else None,
+        "mean_ms": round(elapsed / scenario.iterations * 1000, 4),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 4),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 4),
+    }
+    if scenario.size:
+        result["mb_per_sec"] = round(scenario.size * scenario.iterations / elapsed / 2 ** 20, 2)
+    result.update(_probe(bot, scenario))
+    return result
+
+
+def _run_simulator(port: int, kind: str, fixtures: dict, payload_sizes: dict) -> None:
+    logger.remove()
+    DeviceSimulator("127.0.0.1", port, kind=kind, fixtures=fixtures, payload_sizes=payload_sizes).run(1)
+
+
+def run_session(bot_class: type, kind: str, scenarios: List[Scenario], fixtures: dict = None,
+                payload_sizes: dict = None, timeout: float = 600) -> List[dict]:
+    """
+    启动脚本服务和一个模拟设备，在设备连接后依次执行测试场景
+
+    :param bot_class: AndroidBotMain / WinBotMain / WebBotMain
+    :param kind: 模拟设备类型
+    :param scenarios: 测试场景
+    :param fixtures: 模拟设备的自定义响应
+    :param payload_sizes: 模拟设备返回的二进制数据大小
+    :param timeout: 超时时间(秒)
+    :return: 各场景统计结果
+    """
+    results = []
+    errors = []
+    done = threading.Event()
+
+    class BenchScript(bot_class):
+        log_level = "WARNING"
+
+        def script_main(self):
+            try:
+                for scenario in scenarios:
+                    results.append(measure(self, scenario))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                done.set()
+
+    server = _ThreadingTCPServer(("127.0.0.1", 0), BenchScript)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    simulator = spawn.Process(target=_run_simulator,
+                              args=(server.server_address[1], kind, fixtures or {}, payload_sizes or {}),
+                              daemon=True)
+    simulator.start()
+    try:
+        if not done.wait(timeout):
+            raise TimeoutError(f"{bot_class.__name__} benchmark timed out after {timeout}s")
+    finally:
+        server.shutdown()
+        server.server_close()
+        simulator.join(10)
+        if simulator.is_alive():
+            simulator.terminate()
+
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,99 @@
+"""
+OCR 结果解析基准测试
+
+对比 ``ast.literal_eval`` 与 :func:`AiBote._ocr.parse_ocr` 解析不同数量文本框的 OCR 响应的耗时和内存分配峰值，
+结果输出为 JSON。
+
+python benchmarks/bench_ocr.py --boxes 100 500 2000 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from ast import literal_eval
+from typing import Callable, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from AiBote._ocr import parse_ocr  # noqa: E402
+from bench_protocol import _revision  # noqa: E402
+
+
+def _response(boxes: int) -> str:
+    """模拟全屏识别的响应，每行 10 个文本框"""
+    items = []
+    for i in range(boxes):
+        x, y = (i % 10) * 72.0, (i // 10) * 36.0
+        items.append(f"[[[{x}, {y}], [{x + 64.5}, {y}], [{x + 64.5}, {y + 28.25}], [{x}, {y + 28.25}]], "
+                     f"('文字{i} text', 0.9{i % 10}{i % 7})]")
+    return "[" + ", ".join(items) + "]"
+
+
+def _measure(parse: Callable[[str], object], response: str, iterations: int) -> dict:
+    parse(response)
+    times = []
+    for _ in range(iterations):
+        begin = time.perf_counter()
+        parse(response)
+        times.append(time.perf_counter() - begin)
+    times.sort()
+
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        result = parse(response)
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return {
+        "mean_ms": round(sum(times) / len(times) * 1000, 4),
+        "p50_ms": round(times[len(times) // 2] * 1000, 4),
+        # 解析结果保留的内存和解析过程中的峰值
+        "result_bytes": max(0, current - baseline),
+        "peak_bytes": max(0, peak - baseline),
+    }
+
+
+def main(argv: List[str] = None) -> dict:
+    parser = argparse.ArgumentParser(description="Aibote OCR 结果解析基准测试")
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 100, 500, 2000], help="文本框数量")
+    parser.add_argument("--iterations", type=int, default=50, help="每个场景的解析次数")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": [],
+    }
+    for boxes in args.boxes:
+        response = _response(boxes)
+        baseline = _measure(literal_eval, response, args.iterations)
+        compiled = _measure(parse_ocr, response, args.iterations)
+        report["results"].append({
+            "boxes": boxes,
+            "response_bytes": len(response.encode("utf8")),
+            "literal_eval": baseline,
+            "parse_ocr": compiled,
+            "speedup": round(baseline["mean_ms"] / compiled["mean_ms"], 2) if compiled["mean_ms"] else None,
+        })
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as file:
+            file.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
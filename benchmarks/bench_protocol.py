@@ -0,0 +1,145 @@
+"""
+通信协议吞吐量和延迟基准测试
+
+AndroidBotMain / WinBotMain / WebBotMain 分别连接本地设备模拟器，统计小命令、中等响应和大数据传输的
+calls/sec、p50/p99 延迟、线路字节数和调用期间的内存分配峰值(近似复制字节数)，结果输出为 JSON。
+
+python benchmarks/bench_protocol.py --sizes 1 10 50 --output result.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loguru import logger  # noqa: E402
+
+from AiBote import AndroidBotMain, WinBotMain, WebBotMain  # noqa: E402
+from _harness import Scenario, run_session  # noqa: E402
+
+MB = 1024 * 1024
+
+# 中等响应：100 个找图坐标、200 条 OCR 结果、64KB 的 JS 返回值
+_POINTS = "/".join([f"{x * 10}|{x * 20}" for x in range(100)])
+_OCR = "[" + ", ".join([
+    f"[[[{i}.0, {i}.0], [{i + 100}.0, {i}.0], [{i + 100}.0, {i + 30}.0], [{i}.0, {i + 30}.0]], ('文字{i}', 0.98)]"
+    for i in range(200)
+]) + "]"
+_SCRIPT_RESULT = json.dumps([{"id": i, "text": "aibote" * 8} for i in range(1000)])[:64 * 1024]
+
+
+def _android(args) -> List[dict]:
+    fixtures = {"findImage": _POINTS, "ocr": _OCR}
+    small = [
+        Scenario("click", lambda bot: bot.click((100, 200)), args.iterations),
+        Scenario("get_color", lambda bot: bot.get_color((100, 200)), args.iterations),
+        Scenario("find_images", lambda bot: bot.find_images("bench.png", multi=100), args.medium_iterations),
+        Scenario("get_text", lambda bot: bot.get_text(), args.medium_iterations),
+    ]
+    results = run_session(AndroidBotMain, "android", small, fixtures)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pull_path = os.path.join(tmp, "pull.bin")
+        for size in args.sizes:
+            push_path = os.path.join(tmp, f"push-{size}.bin")
+            with open(push_path, "wb") as file:
+                file.write(os.urandom(size))
+            bulk = [
+                Scenario("take_screenshot", lambda bot: bot.take_screenshot(), args.bulk_iterations, size),
+                Scenario("push_file", lambda bot, path=push_path: bot.push_file(path, "bench.bin"),
+                         args.bulk_iterations, size),
+                Scenario("pull_file", lambda bot: bot.pull_file("bench.bin", pull_path), args.bulk_iterations, size),
+            ]
+            results += run_session(AndroidBotMain, "android", bulk, fixtures,
+                                   payload_sizes={"takeScreenshot": size, "pullFile": size})
+            os.remove(push_path)
+    return results
+
+
+def _win(args) -> List[dict]:
+    # WindowsDriver 没有二进制大数据接口，只测小命令和中等响应
+    fixtures = {"findImage": _POINTS, "ocr": _OCR}
+    scenarios = [
+        Scenario("click_mouse", lambda bot: bot.click_mouse("1050010", 100, 200, 1), args.iterations),
+        Scenario("get_color", lambda bot: bot.get_color("1050010", 100, 200), args.iterations),
+        Scenario("find_images", lambda bot: bot.find_images("1050010", "bench.png", multi=100),
+                 args.medium_iterations),
+        Scenario("get_text", lambda bot: bot.get_text("1050010"), args.medium_iterations),
+    ]
+    return run_session(WinBotMain, "windows", scenarios, fixtures)
+
+
+def _web(args) -> List[dict]:
+    fixtures = {"executeScript": _SCRIPT_RESULT}
+    small = [
+        Scenario("click_element", lambda bot: bot.click_element("//button"), args.iterations),
+        Scenario("get_element_text", lambda bot: bot.get_element_text("//div"), args.iterations),
+        Scenario("execute_script", lambda bot: bot.execute_script("(()=>data)()"), args.medium_iterations),
+    ]
+    results = run_session(WebBotMain, "web", small, fixtures)
+
+    # WebDriver 截图返回 base64 文本
+    for size in args.sizes:
+        bulk = [Scenario("save_screenshot", lambda bot: bot.save_screenshot(), args.bulk_iterations, size)]
+        results += run_session(WebBotMain, "web", bulk, {"takeScreenshot": "A" * size})
+    return results
+
+
+_BOTS = {
+    "android": _android,
+    "win": _win,
+    "web": _web,
+}
+
+
+def _revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv: List[str] = None) -> dict:
+    parser = argparse.ArgumentParser(description="Aibote 通信协议基准测试")
+    parser.add_argument("--bots", nargs="+", default=list(_BOTS), choices=list(_BOTS), help="测试的脚本类")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="大数据传输大小(MB)")
+    parser.add_argument("--iterations", type=int, default=2000, help="小命令调用次数")
+    parser.add_argument("--medium-iterations", type=int, default=200, help="中等响应调用次数")
+    parser.add_argument("--bulk-iterations", type=int, default=5, help="大数据传输调用次数")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+    args.sizes = [int(size * MB) for size in args.sizes]
+
+    # 脚本类会以 DEBUG 级别输出每次收发的数据，基准测试中关闭
+    logger.remove()
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": _revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    for bot in args.bots:
+        report["results"][bot] = _BOTS[bot](args)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as file:
+            file.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,11 @@ install_requires = [
     "click==8.1.6",
 ]
 
+extras_require = {
+    # 本地图像处理：截图解码、取色、找图
+    "image": ["numpy", "opencv-python"],
+}
+
 setup_kwargs = {
     'name': 'AiBote.py',
     'version': '1.3.5',
@@ -24,6 +29,7 @@ setup_kwargs = {
     'packages': packages,
     'package_data': package_data,
     'install_requires': install_requires,
+    'extras_require': extras_require,
     'python_requires': '>=3.6,<4.0',
 }
 
@@ -0,0 +1,47 @@
+"""
+本地找图的单元测试
+"""
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from AiBote import _matcher
+from AiBote._frame import Frame
+from AiBote._matcher import _peaks, find_images, best_match
+
+
+def test_peaks_suppresses_neighbours():
+    result = np.zeros((6, 8))
+    result[1, 1] = 0.99
+    result[1, 2] = 0.98  # 与最高点相邻，在模板范围内被抑制
+    result[4, 6] = 0.95
+    result[5, 0] = 0.5  # 低于相似度
+    assert _peaks(result, 2, 2, 0.9, 5) == [(1, 1, 0.99), (6, 4, 0.95)]
+    assert _peaks(result, 2, 2, 0.9, 1) == [(1, 1, 0.99)]
+    # 模板大小为 1 时相邻位置不再被抑制
+    assert [peak[:2] for peak in _peaks(result, 1, 1, 0.9, 5)] == [(1, 1), (2, 1), (6, 4)]
+
+
+@pytest.mark.parametrize("use_cv2", [True, False])
+def test_find_images_locates_every_copy(monkeypatch, use_cv2):
+    if use_cv2:
+        pytest.importorskip("cv2")
+    else:
+        # 没有安装 opencv 时的 FFT 实现
+        monkeypatch.setattr(_matcher, "cv2", None)
+
+    rng = np.random.default_rng(0)
+    template = rng.integers(0, 256, (12, 16), dtype=np.uint8)
+    screen = np.full((120, 160), 30, dtype=np.uint8)
+    screen[10:22, 20:36] = template
+    screen[70:82, 100:116] = template
+    frame = Frame(np.dstack([screen] * 3))
+
+    points = find_images(frame, template, multi=3)
+    assert sorted((point.x, point.y) for point in points) == [(28, 16), (108, 76)]
+    # 查找区域只包含第二个位置
+    assert [(point.x, point.y) for point in find_images(frame, template, (60, 60, 160, 120), multi=3)] == [(108, 76)]
+
+    match = best_match(frame, template)
+    assert match.similarity == pytest.approx(1.0, abs=1e-4)
+    assert (match.width, match.height) == (16, 12)
@@ -0,0 +1,51 @@
+"""
+命令指标直方图的单元测试
+"""
+import pytest
+
+from AiBote._metrics import Histogram, _bucket, _bucket_range
+
+
+def test_bucket_ranges():
+    assert [_bucket(value) for value in (0, 5, 15, 16, 32, 33, 1000)] == [0, 5, 15, 16, 32, 32, 111]
+    assert _bucket_range(5) == (5, 5)
+    assert _bucket_range(32) == (32, 33)
+    assert _bucket_range(111) == (992, 1023)
+    # 每个值都落在自己的桶内，桶宽不超过下界的 1/16
+    for value in list(range(2000)) + [12345, 10 ** 6, 3 * 10 ** 7]:
+        low, high = _bucket_range(_bucket(value))
+        assert low <= value <= high
+        assert high - low + 1 <= max(1, low / 16)
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    assert histogram.percentile(0.99) == 0.0
+    for _ in range(98):
+        histogram.record(0.001)
+    histogram.record(0.1)
+    histogram.record(0.1)
+
+    assert histogram.count == 100
+    assert histogram.mean == pytest.approx(0.00298)
+    assert (histogram.min, histogram.max) == (0.001, 0.1)
+    # 1000 微秒所在的桶为 [992, 1023]，取中点
+    assert histogram.percentile(0.5) == pytest.approx(0.0010075)
+    assert histogram.percentile(0.9) == pytest.approx(0.0010075)
+    # 100000 微秒所在桶的中点超过最大值，取最大值
+    assert histogram.percentile(0.99) == 0.1
+
+
+def test_histogram_merge():
+    first, second = Histogram(), Histogram()
+    first.record(0.002)
+    second.record(0.0005)
+    second.record(0.004)
+    first.merge(second)
+    first.merge(Histogram())
+
+    assert first.count == 3
+    assert first.total == pytest.approx(0.0065)
+    assert (first.min, first.max) == (0.0005, 0.004)
+    assert sum(first.counts) == 3
+    assert first.percentile(0.5) == pytest.approx(0.0020155)
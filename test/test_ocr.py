@@ -0,0 +1,121 @@
+"""
+OCR 结果解析和查询的单元测试
+"""
+from ast import literal_eval
+
+import pytest
+
+from AiBote._ocr import OcrCache, OcrData, OcrResult, _match_items, fingerprint, parse_ocr
+
+_RESPONSES = [
+    "[[[[10.0, 20.0], [210.0, 20.0], [210.0, 60.0], [10.0, 60.0]], ('A', 0.98)], "
+    "[[[.5, 80.0], [130.0, 80.0], [130.0, 120.0], [10.0, 120.0]], ('B', 0.99)]]",
+    "[[[[1e-3, 2E+2], [3, 4], [5, 6], [7, 8]], ('指数', 1)], [[[1, 2], [3, 4], [5, 6], [7, 8]], ('整数', .5)]]",
+    "[[[[1, 2], [3, 4], [5, 6], [7, 8]], ('it\\'s', 0.9)], [[[1, 2], [3, 4], [5, 6], [7, 8]], (\"say \\\"hi\\\"\", 0.8)]]",
+    "[[[[-1.5, 2.], [3, 4], [5, 6], [7, 8]], ['列表', 0.7]],]",
+    # 正则不支持的写法：前导正号
+    "[[[[1, 2], [3, 4], [5, 6], [7, 8]], ('A', 0.9)], [[[+1, 2], [3, 4], [5, 6], [7, 8]], ('B', 0.9)]]",
+    # 文本框之间有多余内容
+    "[[[[1, 2], [3, 4], [5, 6], [7, 8]], ('A', 0.9)], [[[1, 2], [3, 4], [5, 6], [7, 8]], ('B', 0.9), None]]",
+]
+
+
+def _normalize(items: list) -> list:
+    return [[[[float(value) for value in corner] for corner in points], (words[0], float(words[1]))]
+            for points, words in items]
+
+
+@pytest.mark.parametrize("response", _RESPONSES)
+def test_parse_ocr_matches_literal_eval(response):
+    try:
+        expected = _normalize(literal_eval(response))
+    except ValueError:
+        # 结构不是 OCR 结果时与 literal_eval 一样报错，不能只返回其中一部分
+        with pytest.raises(Exception):
+            parse_ocr(response)
+        return
+    assert _normalize(parse_ocr(response).to_list()) == expected
+
+
+def test_parse_ocr_empty():
+    assert len(parse_ocr("null")) == 0
+    assert len(parse_ocr(" [] ")) == 0
+
+
+def test_match_items_covers_whole_response():
+    # 常规格式走正则解析；有一个文本框不匹配时整体退回 literal_eval
+    assert len(_match_items(_RESPONSES[0])) == 2
+    assert len(_match_items(_RESPONSES[2])) == 2
+    assert _match_items(_RESPONSES[4]) is None
+
+
+_SCREEN = ("[[[[0, 0], [80, 0], [80, 20], [0, 20]], ('确定按钮', 0.95)], "
+           "[[[100, 0], [140, 0], [140, 20], [100, 20]], ('取消', 0.9)], "
+           "[[[0, 40], [140, 40], [140, 60], [0, 60]], ('设置 123', 0.8)]]")
+
+
+def _result() -> OcrResult:
+    # 区域左上角 (10, 100)，图片缩放率 2
+    return OcrResult(parse_ocr(_SCREEN), (10, 100, 0, 0), 2.0)
+
+
+def test_ocr_result_find():
+    result = _result()
+    # "按钮" 是第 3-4 个字，每个字宽 20：中心 x = 60，换算为屏幕坐标 10 + 60 / 2
+    assert [(point.x, point.y) for point in result.find("按钮")] == [(40, 105)]
+    assert [match.index for match in result.find_matches("定按")] == [0]
+    # 两个字都存在但不相邻，倒排索引不会误判
+    assert result.find("按定") == []
+    assert result.find("确认") == []
+
+
+def test_ocr_result_find_regex():
+    matches = _result().find_regex(r"\d+")
+    assert [(match.index, match.text, match.score) for match in matches] == [(2, "设置 123", 1.0)]
+    # 数字是第 4-6 个字：中心 x = 140 / 6 * 4.5 = 105，y = 50
+    assert (matches[0].point.x, matches[0].point.y) == (62.5, 125)
+    assert matches[0].confidence == pytest.approx(0.8)
+
+
+def test_ocr_result_find_fuzzy():
+    result = _result()
+    # 识别错一个字，4 个字中 3 个相同
+    matches = result.find_fuzzy("确走按钮", threshold=0.7)
+    assert [(match.index, match.score) for match in matches] == [(0, 0.75)]
+    assert result.find_fuzzy("确走按钮", threshold=0.8) == []
+    assert [(match.index, match.score) for match in result.find_fuzzy("取消")] == [(1, 1.0)]
+    assert result.find_fuzzy("") == []
+
+
+def test_ocr_cache_hits_on_unchanged_region():
+    np = pytest.importorskip("numpy")
+    image = np.full((40, 80, 3), 100, dtype=np.uint8)
+    # 压缩噪声不跨越量化级
+    noisy = image + np.random.default_rng(0).integers(0, 4, image.shape, dtype=np.uint8)
+    changed = image.copy()
+    changed[10:20, 10:30] = 0
+
+    assert fingerprint(image) == fingerprint(noisy)
+    assert fingerprint(image) != fingerprint(changed)
+    # 尺寸不同的纯色图片哈希不同
+    assert fingerprint(image) != fingerprint(image[:, :40])
+
+    calls = []
+
+    def recognize(text: str):
+        def run() -> OcrData:
+            calls.append(text)
+            return parse_ocr(f"[[[[0, 0], [10, 0], [10, 10], [0, 10]], ('{text}', 0.9)]]")
+        return run
+
+    cache = OcrCache(max_entries=2)
+    assert cache.get(image, "key", recognize("a")).texts == ["a"]
+    assert cache.get(noisy, "key", recognize("b")).texts == ["a"]
+    assert cache.get(changed, "key", recognize("c")).texts == ["c"]
+    # 识别参数不同时不共用结果
+    assert cache.get(image, "other", recognize("d")).texts == ["d"]
+    assert calls == ["a", "c", "d"]
+    # 超过 2 条后最早的结果被淘汰
+    assert cache.get(image, "key", recognize("e")).texts == ["e"]
+    assert cache.stats() == {"size": 2, "max_entries": 2, "hits": 1, "misses": 4, "evictions": 2,
+                             "hit_rate": 0.2}
@@ -0,0 +1,309 @@
+"""
+使用设备模拟器的冒烟测试，不需要真实设备，可以在 CI 中运行
+"""
+import asyncio
+import io
+import mmap
+import os
+import signal
+import socket
+import socketserver
+import threading
+
+import pytest
+
+from AiBote import AndroidBotMain, AsyncAndroidBotMain, WinBotMain, WebBotMain, DeviceSimulator, Color, Text, \
+    WaitResult
+
+PULL_DATA = bytes(range(256)) * 64
+
+
+def run_script(bot_class: type, kind: str, script, **options) -> tuple:
+    """
+    启动脚本服务，用一个模拟设备连接并执行 script
+
+    :param bot_class: 脚本基类
+    :param kind: 模拟设备类型
+    :param script: script(bot) -> 结果
+    :param options: DeviceSimulator 参数
+    :return: (结果, 模拟器)
+    """
+    results = []
+
+    class Script(bot_class):
+        def script_main(self):
+            try:
+                results.append(script(self))
+            except Exception as e:
+                results.append(e)
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Script)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        simulator = DeviceSimulator("127.0.0.1", server.server_address[1], kind=kind, **options)
+        simulator.run()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(results) == 1
+    if isinstance(results[0], Exception):
+        raise results[0]
+    return results[0], simulator
+
+
+def test_android():
+    def script(bot: AndroidBotMain):
+        out = io.BytesIO()
+        with bot.batch() as batch:
+            package = batch.get_package()
+            activity = batch.get_activity()
+        return {
+            "android_id": bot.get_android_id(),
+            "click": bot.click((100, 200)),
+            "batch": (package.result(), activity.result()),
+            "push": bot.push_file(io.BytesIO(PULL_DATA), "a.bin"),
+            "pull": (bot.pull_file("/sdcard/a.bin", out), out.getvalue()),
+            "exists": bot.element_exists("//button", wait_time=2, interval_time=0.05),
+            "wait_any": bot.wait_any(["//missing", Color("#008577"), Text("确定")], wait_time=2),
+            "color": bot.capture().get_color((10, 10)),
+        }
+
+    result, simulator = run_script(AndroidBotMain, "android", script, fixtures={
+        "existsElement": ["false", "false", "true"],
+        "pullFile": PULL_DATA,
+    })
+    assert result["android_id"] == "simulator-0"
+    assert result["click"] is True
+    assert result["batch"] == ("com.aibot.client", "com.aibot.client.MainActivity")
+    assert result["push"] is True
+    assert result["pull"] == (True, PULL_DATA)
+    assert result["exists"] is True
+    assert isinstance(result["wait_any"], WaitResult) and result["wait_any"].index == 1
+    assert result["color"] == "#008577"
+
+    commands = simulator.stats()["commands"]
+    assert commands["pushFile"] == 1
+    # element_exists 轮询 3 次，wait_any 的元素条件检查 1 次
+    assert commands["existsElement"] == 4
+
+
+def test_async_android():
+    results = []
+
+    class Script(AsyncAndroidBotMain):
+        async def script_main(self):
+            try:
+                results.append({
+                    "android_id": await self.get_android_id(),
+                    "package": await self.get_package(),
+                    "push": await self.push_file(io.BytesIO(PULL_DATA), "a.bin"),
+                    "exists": await self.element_exists("//button", wait_time=2, interval_time=0.05),
+                    "color": (await self.capture()).get_color((10, 10)),
+                })
+            except Exception as e:
+                results.append(e)
+
+    async def main() -> DeviceSimulator:
+        server = await asyncio.start_server(lambda reader, writer: Script(reader, writer).handle(), "127.0.0.1", 0)
+        async with server:
+            simulator = DeviceSimulator("127.0.0.1", server.sockets[0].getsockname()[1], kind="android",
+                                        fixtures={"existsElement": ["false", "true"]})
+            await simulator.start()
+        return simulator
+
+    simulator = asyncio.run(main())
+    assert len(results) == 1
+    if isinstance(results[0], Exception):
+        raise results[0]
+    assert results[0] == {"android_id": "simulator-0", "package": "com.aibot.client", "push": True,
+                          "exists": True, "color": "#008577"}
+    assert simulator.stats()["commands"]["existsElement"] == 2
+
+
+
+
+def test_batch_splits_responses():
+    def script(bot: AndroidBotMain):
+        with bot.batch() as batch:
+            results = [
+                batch.get_element_text("//title"),
+                batch.get_element_text("//empty"),
+                batch.get_element_rect("//button"),
+                batch.find_color("#FFFFFF"),
+                batch.find_images("a.png", multi=2),
+                batch.element_exists("//button"),
+                batch.get_color((10, 10)),
+            ]
+        return [result.result() for result in results]
+
+    result, simulator = run_script(AndroidBotMain, "android", script, fixtures={
+        "getElementText": ["多行\n文本", "null"],
+        "getElementRect": "10|20|110|220",
+        "findColor": "-1.0|-1.0",
+        "findImage": "1.5|2.5/30|40",
+        "existsElement": "true",
+        "getColor": "null",
+    })
+    text, empty, rect, color, images, exists, pixel = result
+    # 每个响应按长度切分，不同长度、含换行和多字节字符的响应不会串到相邻命令
+    assert text == "多行\n文本"
+    assert empty is None
+    assert (rect.p1.x, rect.p1.y, rect.p2.x, rect.p2.y) == (10, 20, 110, 220)
+    assert color is None
+    assert [(point.x, point.y) for point in images] == [(1.5, 2.5), (30, 40)]
+    assert exists is True
+    assert pixel is None
+    assert sum(simulator.stats()["commands"].values()) == 7
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows 的事件循环不支持信号处理")
+def test_async_serve_stops_on_sigterm():
+    cleaned = []
+
+    class Script(AsyncAndroidBotMain):
+        async def script_main(self):
+            try:
+                while True:
+                    await self.get_android_id()
+                    await asyncio.sleep(0.05)
+            finally:
+                cleaned.append(True)
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    async def main():
+        serve = asyncio.create_task(Script.serve(port))
+        await asyncio.sleep(0.2)
+        simulator = DeviceSimulator("127.0.0.1", port, kind="android")
+        device = asyncio.create_task(simulator.start())
+        await asyncio.sleep(0.3)
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(serve, 10)
+        await asyncio.wait_for(device, 10)
+        return simulator
+
+    simulator = asyncio.run(main())
+    assert cleaned == [True]
+    assert simulator.stats()["commands"]["getAndroidId"] >= 1
+
+def test_win():
+    def script(bot: WinBotMain):
+        hwnd = bot.find_window("class", "name")
+        return {
+            "hwnd": hwnd,
+            "move": bot.move_mouse(hwnd, 10, 20),
+            "wait_any": bot.wait_any(hwnd, ["//missing", Color("#008577")], wait_time=2),
+            "text": bot.find_text(hwnd, "确定"),
+        }
+
+    result, simulator = run_script(WinBotMain, "windows", script, fixtures={"getElementRect": "-1|-1|-1|-1"})
+    assert result["hwnd"] == "1050010"
+    assert result["move"] is True
+    assert result["wait_any"].index == 1
+    assert len(result["text"]) == 1
+    assert simulator.stats()["commands"]["saveScreenshot"] == 1
+
+
+def test_web():
+    def script(bot: WebBotMain):
+        return {
+            "goto": bot.goto("https://www.aibote.net"),
+            "url": bot.get_current_url(),
+            "wait_any": bot.wait_any(["//missing", Color("#008577")], wait_time=2),
+        }
+
+    result, _ = run_script(WebBotMain, "web", script, fixtures={"getElementRect": "null"})
+    assert result["goto"] is True
+    assert result["url"] == "https://www.aibote.net"
+    assert result["wait_any"].index == 1
+
+
+def test_wait_does_not_wake_itself():
+    # 检查函数自己执行的输入命令不应唤醒本次等待，否则在 wait_time 内不停地请求设备
+    def script(bot: AndroidBotMain):
+        return {
+            "click_element": bot.click_element("//button", wait_time=1),
+            "wait_until": bot.wait_until(lambda: bot.click((100, 200)) and False, wait_time=1),
+        }
+
+    result, simulator = run_script(AndroidBotMain, "android", script, fixtures={"clickElement": "false"})
+    assert result == {"click_element": False, "wait_until": False}
+    commands = simulator.stats()["commands"]
+    assert commands["clickElement"] < 20
+    assert commands["click"] < 20
+
+    def win_script(bot: WinBotMain):
+        return bot.click_element("1050010", "//button", 1, wait_time=1)
+
+    result, simulator = run_script(WinBotMain, "windows", win_script, fixtures={"clickElement": "false"})
+    assert result is False
+    assert simulator.stats()["commands"]["clickElement"] < 20
+
+
+def test_compare_color_polls():
+    def script(bot: AndroidBotMain):
+        return bot.compare_color(10, 10, "#008577", wait_time=2), bot.compare_color(10, 10, "#008577", wait_time=0)
+
+    result, simulator = run_script(AndroidBotMain, "android", script,
+                                   fixtures={"compareColor": ["false", "true", "false"]})
+    assert result == (True, False)
+    # 第一次不一致后重试一次成功；wait_time=0 时仍然比较一次
+    assert simulator.stats()["commands"]["compareColor"] == 3
+
+
+def test_broadcast_push_closes_mmap(tmp_path, monkeypatch):
+    closed = []
+
+    class TrackedMmap(mmap.mmap):
+        def close(self):
+            super().close()
+            closed.append(True)
+
+    class BrokenDevice:
+        # 推送失败，异常的 traceback 引用着传入的内存视图
+        def _AndroidBotMain__push_file(self, func_name, to_path, source, progress=None):
+            raise ConnectionResetError(f"断开 {source.nbytes}")
+
+    monkeypatch.setattr(mmap, "mmap", TrackedMmap)
+    path = tmp_path / "a.bin"
+    path.write_bytes(PULL_DATA)
+
+    def script(bot: AndroidBotMain):
+        return bot.broadcast_push(str(path), "a.bin", [bot, BrokenDevice()])
+
+    results, _ = run_script(AndroidBotMain, "android", script)
+    assert [result.success for result in results] == [True, False]
+    assert isinstance(results[1].error, ConnectionResetError)
+    assert closed == [True]
+
+
+def test_frame_cache_region_and_color_fallback():
+    def script(bot: AndroidBotMain):
+        bot.frame_cache_ttl = 60
+        frame = bot.capture()
+        region = bot.capture((10, 20, 50, 80))
+        scaled = bot.capture(scale=0.5)
+        return {
+            "full": (frame.width, frame.height),
+            "region": (region.width, region.height, region.origin, region.get_color((10, 20))),
+            "outside_region": region.get_color((5, 5)),
+            "scaled": (scaled.width, scaled.scale),
+            "inside": bot.get_color((10, 10)),
+            "outside": bot.get_color((500, 500)),
+        }
+
+    result, simulator = run_script(AndroidBotMain, "android", script, fixtures={"getColor": "#FFFFFF"})
+    assert result["full"] == (108, 234)
+    assert result["region"] == (40, 60, (10, 20), "#008577")
+    assert result["outside_region"] is None
+    # 模拟器总是返回原图大小，缩放率沿用请求的值
+    assert result["scaled"] == (108, 0.5)
+    assert result["inside"] == "#008577"
+    assert result["outside"] == "#FFFFFF"
+    commands = simulator.stats()["commands"]
+    # 区域截图使用缓存，缩放截图重新请求；只有截图外的坐标请求 getColor
+    assert commands["takeScreenshot"] == 2
+    assert commands["getColor"] == 1
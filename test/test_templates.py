@@ -0,0 +1,39 @@
+"""
+模板库的单元测试
+"""
+import json
+import os
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from AiBote._templates import INDEX_FILE_NAME, TemplateLibrary
+
+
+def test_preload_writes_index_once(tmp_path, monkeypatch):
+    for index in range(20):
+        image = np.full((32, 32, 3), index * 10, dtype=np.uint8)
+        cv2.imwrite(str(tmp_path / f"t{index}.png"), image)
+
+    writes = []
+    replace = os.replace
+
+    def counting_replace(source, target):
+        if target.endswith(INDEX_FILE_NAME):
+            writes.append(target)
+        replace(source, target)
+
+    monkeypatch.setattr("AiBote._templates.os.replace", counting_replace)
+    library = TemplateLibrary(str(tmp_path))
+    library.preload()
+    assert len(writes) == 1
+
+    with open(os.path.join(library.cache_dir, INDEX_FILE_NAME), encoding="utf-8") as file:
+        assert len(json.load(file)) == 20
+
+    # 哈希已保存，新的模板库不再计算，也不再写索引
+    TemplateLibrary(str(tmp_path)).preload()
+    library.close()
+    assert len(writes) == 1